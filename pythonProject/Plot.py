@@ -1,24 +1,40 @@
 import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 
-# Ensure the save directory exists
-save_dir = 'plots'
-if not os.path.exists(save_dir):
-    os.makedirs(save_dir)
+# Default locations of the experiment results and the generated plots
+RESULTS_PATH = 'steel_production_experiment_results.xlsx'
+SAVE_DIR = 'plots'
 
-# Load the data
-df = pd.read_excel('steel_production_experiment_results.xlsx')
+# Input hash of every written figure, kept next to the PNG files
+CACHE_FILE = '.plot_cache.json'
 
-# Convert 'Storage Costs' from string to numpy array
-df['Storage Costs'] = df['Storage Costs'].apply(lambda x: np.array(eval(x)))
+# Bump when the drawing code changes so every figure is rendered again
+RENDER_VERSION = 1
 
-# Create new columns for each product's storage cost
-df['Storage Cost 18/10'] = df['Storage Costs'].apply(lambda x: x[0])
-df['Storage Cost 18/8'] = df['Storage Costs'].apply(lambda x: x[1])
-df['Storage Cost 18/0'] = df['Storage Costs'].apply(lambda x: x[2])
+# Products in heatmap order and the metrics shown for each of them
+PRODUCTS = ['18/10', '18/8', '18/0']
+HEATMAP_METRICS = ['Total Cost', 'Total Storage Cost', 'Total Procurement Cost']
+
+
+def load_results(results_path=RESULTS_PATH):
+    """Load the experiment results and split the storage costs into one column per product"""
+    df = pd.read_excel(results_path)
+
+    # Convert 'Storage Costs' from string to numpy array
+    df['Storage Costs'] = df['Storage Costs'].apply(lambda x: np.array(eval(x)))
+
+    # Create new columns for each product's storage cost
+    df['Storage Cost 18/10'] = df['Storage Costs'].apply(lambda x: x[0])
+    df['Storage Cost 18/8'] = df['Storage Costs'].apply(lambda x: x[1])
+    df['Storage Cost 18/0'] = df['Storage Costs'].apply(lambda x: x[2])
+    return df
 
 
 # Function to create a line plot for a specific metric across different max production values
@@ -52,41 +68,43 @@ def plot_metric_by_production(df, metric, title):
 #     plt.savefig(save_path)
 #     plt.close()
 
-# Function to create a heatmap for a specific metric and storage cost
-def plot_heatmap(ax, df, metric, storage_cost, title):
-    pivot = df.pivot_table(values=metric,
-                           index=storage_cost,
-                           columns='Max Production',
-                           aggfunc='mean')
+# Function to create a heatmap from a pivot table (storage cost x max production)
+def plot_heatmap(ax, pivot, title):
     sns.heatmap(pivot, annot=True, fmt='.0f', cmap='YlOrRd', ax=ax)
     ax.set_title(title)
 
-# Create a 3x3 subplot
-fig, axes = plt.subplots(3, 3, figsize=(18, 18))
 
-# Plot each heatmap in the corresponding subplot
-plot_heatmap(axes[0, 0], df, 'Total Cost', 'Storage Cost 18/10', 'Total Cost 18_10')
-plot_heatmap(axes[0, 1], df, 'Total Storage Cost', 'Storage Cost 18/10', 'Total Storage Cost 18_10')
-plot_heatmap(axes[0, 2], df, 'Total Procurement Cost', 'Storage Cost 18/10', 'Total Procurement Cost 18_10')
-
-plot_heatmap(axes[1, 0], df, 'Total Cost', 'Storage Cost 18/8', 'Total Cost 18_8')
-plot_heatmap(axes[1, 1], df, 'Total Storage Cost', 'Storage Cost 18/8', 'Total Storage Cost 18_8')
-plot_heatmap(axes[1, 2], df, 'Total Procurement Cost', 'Storage Cost 18/8', 'Total Procurement Cost 18_8')
-
-plot_heatmap(axes[2, 0], df, 'Total Cost', 'Storage Cost 18/0', 'Total Cost 18_0')
-plot_heatmap(axes[2, 1], df, 'Total Storage Cost', 'Storage Cost 18/0', 'Total Storage Cost 18_0')
-plot_heatmap(axes[2, 2], df, 'Total Procurement Cost', 'Storage Cost 18/0', 'Total Procurement Cost 18_0')
-
-# Adjust layout
-plt.tight_layout()
+def aggregate_heatmaps(df):
+    """
+    All nine heatmap tables from one grouped aggregation per product:
+    {(product, metric): pivot of the mean metric by storage cost and max production}
+    """
+    pivots = {}
+    for product in PRODUCTS:
+        storage_cost = f'Storage Cost {product}'
+        grouped = df.groupby([storage_cost, 'Max Production'])[HEATMAP_METRICS].mean()
+        for metric in HEATMAP_METRICS:
+            pivots[product, metric] = grouped[metric].unstack('Max Production')
+    return pivots
+
+
+def plot_combined_heatmaps(pivots, save_path):
+    # Create a 3x3 subplot: one row per product, one column per metric
+    fig, axes = plt.subplots(3, 3, figsize=(18, 18))
+
+    # Plot each heatmap in the corresponding subplot
+    for row, product in enumerate(PRODUCTS):
+        for col, metric in enumerate(HEATMAP_METRICS):
+            plot_heatmap(axes[row, col], pivots[product, metric], f'{metric} {product.replace("/", "_")}')
+
+    # Adjust layout
+    plt.tight_layout()
+    plt.savefig(save_path)
+    plt.close()
 
-# Save the combined plot to the specified directory
-save_path = os.path.join(save_dir, 'Combined_Heatmaps.png')
-plt.savefig(save_path)
-plt.close()
 
 # Function to create a scatter plot for two metrics
-def plot_scatter(df, x_metric, y_metric, title):
+def plot_scatter(df, x_metric, y_metric, title, save_path):
     plt.figure(figsize=(12, 8))
     scatter = plt.scatter(df[x_metric], df[y_metric],
                           c=df['Max Production'], cmap='viridis')
@@ -94,42 +112,131 @@ def plot_scatter(df, x_metric, y_metric, title):
     plt.xlabel(x_metric)
     plt.ylabel(y_metric)
     plt.title(title)
-
-    # Save the plot to the specified directory
-    save_path = os.path.join(save_dir, f'{title.replace(" ", "_")}.png')
-    plt.savefig(save_path)    
+    plt.savefig(save_path)
     plt.close()
 
 
-# Create various plots
-# plot_metric_by_production(df, 'Total Cost', 'Total Cost vs Storage Cost')
-# plot_metric_by_production(df, 'Total Storage Cost', 'Total Storage Cost vs Storage Cost')
-# plot_metric_by_production(df, 'Total Procurement Cost', 'Total Procurement Cost vs Storage Cost')
-
-# plot_heatmap_10(df, 'Total Cost', 'Heatmap of Total Cost 18_10')
-# plot_heatmap_10(df, 'Total Storage Cost', 'Heatmap of Total Storage Cost 18_10')
-# plot_heatmap_10(df, 'Total Procurement Cost', 'Heatmap of Total Procurement Cost 18_10')
-
-# plot_heatmap_8(df, 'Total Cost', 'Heatmap of Total Cost 18_8')
-# plot_heatmap_8(df, 'Total Storage Cost', 'Heatmap of Total Storage Cost 18_8')
-# plot_heatmap_8(df, 'Total Procurement Cost', 'Heatmap of Total Procurement Cost 18_8')
-
-# plot_heatmap_0(df, 'Total Cost', 'Heatmap of Total Cost 18_0')
-# plot_heatmap_0(df, 'Total Storage Cost', 'Heatmap of Total Storage Cost 18_0')
-# plot_heatmap_0(df, 'Total Procurement Cost', 'Heatmap of Total Procurement Cost 18_0')
-
-plot_scatter(df, 'Total Storage Cost', 'Total Procurement Cost', 'Storage Cost vs Procurement Cost')
-plot_scatter(df, 'Total Storage Cost', 'Total Cost', 'Total Storage Cost vs Total Cost')
-plot_scatter(df, 'Total Procurement Cost', 'Total Cost', 'Total Procurement Cost vs Total Cost')
-
 # Box plot to show distribution of Total Cost for each Max Production value
-plt.figure(figsize=(12, 6))
-sns.boxplot(x='Max Production', y='Total Cost', data=df)
-plt.title('Distribution of Total Cost for each Max Production Value')
+def plot_cost_distribution(df, save_path):
+    plt.figure(figsize=(12, 6))
+    sns.boxplot(x='Max Production', y='Total Cost', data=df)
+    plt.title('Distribution of Total Cost for each Max Production Value')
+    plt.savefig(save_path)
+    plt.close()
 
-# Save the plot to the specified directory
-save_path = os.path.join(save_dir, 'Total_Cost_Distribution_by_Max_Production.png')
-plt.savefig(save_path)
-plt.close()
 
-print("All plots have been generated and saved as PNG files.")
\ No newline at end of file
+def figure_specs(df):
+    """
+    Every figure as (file name, drawing function, input data). Inputs are reduced to the data the
+    figure shows, so a figure is only redrawn when its own data changes.
+    """
+    specs = [('Combined_Heatmaps.png', 'heatmaps', aggregate_heatmaps(df))]
+    for x_metric, y_metric, title in [
+        ('Total Storage Cost', 'Total Procurement Cost', 'Storage Cost vs Procurement Cost'),
+        ('Total Storage Cost', 'Total Cost', 'Total Storage Cost vs Total Cost'),
+        ('Total Procurement Cost', 'Total Cost', 'Total Procurement Cost vs Total Cost'),
+    ]:
+        specs.append((f'{title.replace(" ", "_")}.png', 'scatter',
+                      (df[[x_metric, y_metric, 'Max Production']], x_metric, y_metric, title)))
+    specs.append(('Total_Cost_Distribution_by_Max_Production.png', 'boxplot', df[['Max Production', 'Total Cost']]))
+    return specs
+
+
+def input_hash(kind, data):
+    """Hash of a figure's input data (and the drawing code version)"""
+    digest = hashlib.sha1(f'{RENDER_VERSION}|{kind}'.encode())
+
+    def update(value):
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+            digest.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+        elif isinstance(value, dict):
+            for key in sorted(value, key=str):
+                digest.update(repr(key).encode())
+                update(value[key])
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                update(item)
+        else:
+            digest.update(repr(value).encode())
+
+    update(data)
+    return digest.hexdigest()
+
+
+def _use_file_backend():
+    # Figures are only written to files, so no interactive backend is needed
+    matplotlib.use('Agg')
+
+
+def render_figure(kind, data, save_path):
+    """Draw one figure (runs in a worker process)"""
+    _use_file_backend()
+    if kind == 'heatmaps':
+        plot_combined_heatmaps(data, save_path)
+    elif kind == 'scatter':
+        frame, x_metric, y_metric, title = data
+        plot_scatter(frame, x_metric, y_metric, title, save_path)
+    elif kind == 'boxplot':
+        plot_cost_distribution(data, save_path)
+    return save_path
+
+
+def _load_cache(save_dir):
+    path = os.path.join(save_dir, CACHE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def _save_cache(save_dir, cache):
+    path = os.path.join(save_dir, CACHE_FILE)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(cache, file, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def generate_plots(results_path=RESULTS_PATH, save_dir=SAVE_DIR, workers=None, force=False):
+    """
+    Generate every figure of the experiment analysis into save_dir.
+    Figures whose input data is unchanged since their PNG was written are skipped (unless force);
+    the others are drawn in parallel worker processes.
+    """
+    # Ensure the save directory exists
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+
+    # Load the data
+    df = load_results(results_path)
+
+    cache = _load_cache(save_dir)
+    specs = figure_specs(df)
+    todo = []
+    for file_name, kind, data in specs:
+        save_path = os.path.join(save_dir, file_name)
+        digest = input_hash(kind, data)
+        if not force and cache.get(file_name) == digest and os.path.exists(save_path):
+            continue
+        todo.append((file_name, kind, data, save_path, digest))
+
+    if workers == 1 or len(todo) <= 1:
+        for file_name, kind, data, save_path, digest in todo:
+            render_figure(kind, data, save_path)
+            cache[file_name] = digest
+    else:
+        workers = min(workers or os.cpu_count() or 1, len(todo))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_use_file_backend) as executor:
+            futures = [(file_name, digest, executor.submit(render_figure, kind, data, save_path))
+                       for file_name, kind, data, save_path, digest in todo]
+            for file_name, digest, future in futures:
+                future.result()
+                cache[file_name] = digest
+
+    _save_cache(save_dir, cache)
+    print(f"{len(todo)} plots generated, {len(specs) - len(todo)} unchanged; PNG files are in '{save_dir}'.")
+    return [save_path for _, _, _, save_path, _ in todo]
+
+
+if __name__ == "__main__":
+    generate_plots()
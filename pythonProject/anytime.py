@@ -0,0 +1,87 @@
+import math
+
+from gurobipy import GRB
+
+# Statuses of a solve stopped by a limit; they are usable results when an incumbent exists
+LIMIT_STATUSES = {GRB.TIME_LIMIT, GRB.SUBOPTIMAL, GRB.NODE_LIMIT, GRB.SOLUTION_LIMIT,
+                  GRB.ITERATION_LIMIT, GRB.WORK_LIMIT, GRB.INTERRUPTED}
+
+STATUS_NAMES = {getattr(GRB.Status, name): name for name in dir(GRB.Status) if name.isupper()}
+
+# Objective values closer than this count as equal (as in the copper limit search)
+COST_TOLERANCE = 1e-8
+
+
+def apply_policy(model, policy):
+    """
+    Set the parameters of a sweep policy, e.g. {"TimeLimit": 5, "MIPGap": 1e-3}, on the model.
+    None keeps Gurobi's defaults (no time limit, MIPGap 1e-4).
+    """
+    for name, value in (policy or {}).items():
+        model.setParam(name, value)
+
+
+def escalate(policy, factor=4):
+    """The policy with a longer time limit, used to retry solves that ended undecided"""
+    policy = dict(policy or {})
+    if "TimeLimit" in policy:
+        policy["TimeLimit"] = policy["TimeLimit"] * factor
+    return policy
+
+
+def solve_outcome(model):
+    """
+    Summary of a finished solve: status name, incumbent objective, best bound and gap.
+    A limit status with an incumbent counts as a solution; without one the result is unknown,
+    which is different from a proven infeasible model.
+    """
+    status = model.status
+    outcome = {
+        "status": STATUS_NAMES.get(status, str(status)),
+        "optimal": status == GRB.OPTIMAL,
+        "infeasible": status in (GRB.INFEASIBLE, GRB.INF_OR_UNBD),
+        "has_solution": False,
+        "incumbent": math.inf,
+        "bound": -math.inf,
+        "gap": math.inf,
+    }
+    if status == GRB.OPTIMAL or (status in LIMIT_STATUSES and model.SolCount > 0):
+        outcome["has_solution"] = True
+        outcome["incumbent"] = model.ObjVal
+        outcome["bound"] = model.ObjBound if model.IsMIP else model.ObjVal
+        outcome["gap"] = model.MIPGap if model.IsMIP else 0.0
+    elif status in LIMIT_STATUSES and model.IsMIP:
+        try:
+            outcome["bound"] = model.ObjBound
+        except AttributeError:
+            pass
+    elif outcome["infeasible"]:
+        outcome["bound"] = math.inf
+    return outcome
+
+
+def decision_interval(outcome):
+    """
+    Interval known to contain the optimal objective. A proven optimum counts as exact (its
+    remaining gap is within the MIPGap the sweep asked for).
+    """
+    if outcome["optimal"] or outcome["infeasible"]:
+        return outcome["incumbent"], outcome["incumbent"]
+    return outcome["bound"], outcome["incumbent"]
+
+
+def compare_cost(outcome, reference, tolerance=COST_TOLERANCE):
+    """
+    Compare the optimal objective of a solve with a reference interval (low, high):
+    'equal' if they agree within tolerance for every value in both intervals, 'different' if the
+    intervals are more than tolerance apart, 'unknown' while the bounds still overlap.
+    """
+    low, high = decision_interval(outcome)
+    ref_low, ref_high = reference
+    if outcome["infeasible"]:
+        return "different"
+    if high - ref_low < tolerance and low - ref_high > -tolerance:
+        return "equal"
+    if low - ref_high >= tolerance or high - ref_low <= -tolerance:
+        return "different"
+    return "unknown"
@@ -0,0 +1,280 @@
+"""
+Solver backends working on the sparse matrix form of the models (see model_template.py).
+
+A problem is min c'x s.t. A x (sense) b, lb <= x <= ub, with integrality per column, built from the
+compiled template of model_b or model_e. Every backend takes a problem and an anytime policy
+({"TimeLimit": ..., "MIPGap": ...}) and returns the same result dictionary:
+    status     'OPTIMAL', 'INFEASIBLE', 'TIME_LIMIT', ... (Gurobi status names)
+    optimal    True for a proven optimum
+    objective  objective of the returned solution (None without one)
+    x          solution vector in template column order (None without one)
+    duals      constraint duals of LPs (None for MILPs)
+    bound, gap best bound and relative gap
+    runtime    seconds
+
+The HiGHS backend (scipy.optimize.linprog / milp) needs no Gurobi license, so sweeps can run one
+process per core regardless of license seats.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.optimize import linprog, milp, LinearConstraint, Bounds
+from gurobipy import GRB
+
+from model_template import compile_template, scenario_vectors, params_b, params_e, BIG_M
+
+# Relative objective difference accepted by the parity check (MILPs: their MIP gap on top)
+PARITY_TOLERANCE = 1e-6
+
+_backends = {}
+
+
+def register_backend(name, solve):
+    """Make solve(problem, policy) available as backend name"""
+    _backends[name] = solve
+
+
+def backend_names():
+    return list(_backends)
+
+
+def matrix_problem(template, vectors, columns=None):
+    """
+    Problem of one scenario: the template's CSR matrix with the scenario's coefficients.
+    With columns (sorted template column indices) the problem only has those columns; solve()
+    still returns x in template column order, with zeros in the left out columns.
+    """
+    A = sp.csr_matrix((vectors["coefficients"], template["indices"], template["indptr"]),
+                      shape=(template["num_rows"], template["num_vars"]), copy=True)
+    integrality = (template["vtype"] != GRB.CONTINUOUS).astype(int)
+    c, lb, ub = vectors["obj"], vectors["lb"], vectors["ub"]
+    if columns is not None:
+        columns = np.asarray(columns)
+        A = A[:, columns]
+        c, lb, ub, integrality = c[columns], lb[columns], ub[columns], integrality[columns]
+    A.eliminate_zeros()
+    return {
+        "template": template,
+        "vectors": vectors,
+        "columns": columns,
+        "c": c,
+        "A": A,
+        "sense": template["sense"],
+        "b": vectors["rhs"],
+        "lb": lb,
+        "ub": ub,
+        "integrality": integrality,
+    }
+
+
+def problem_b(data, presolve=False, **overrides):
+    """model_b problem from the tuple of data.get_supplier_data (reduced by presolve.py if presolve)"""
+    params = {**params_b(data), **overrides}
+    if presolve:
+        from presolve import presolved_problem
+        return presolved_problem(params, data[-2], data[0])
+    template = compile_template(data[-2], data[-1], data[0])
+    return matrix_problem(template, scenario_vectors(template, params))
+
+
+def problem_e(copper_limit, data, big_m=BIG_M, presolve=False, **overrides):
+    """model_e problem from the tuple of get_supplier_data_e and a copper limit (reduced by presolve.py if presolve)"""
+    params = {**params_e(copper_limit, data), "big_m": big_m, **overrides}
+    if presolve:
+        from presolve import presolved_problem
+        return presolved_problem(params, data[-2], data[0], electrolysis=True)
+    template = compile_template(data[-2], data[-1], data[0], electrolysis=True)
+    return matrix_problem(template, scenario_vectors(template, params))
+
+
+def plan_arrays(problem, x):
+    """
+    Solution vector split into arrays per variable family: P[i, t], S[i, t], X[i, j, t] (, B[t], m[i, t]).
+    For a presolved problem X is given for every supplier of the original catalog.
+    """
+    plan = {family: np.asarray(x)[index] for family, index in problem["template"]["index"].items()}
+    if "presolve" in problem:
+        report = problem["presolve"]
+        n_p, _, months = plan["X"].shape
+        X = np.zeros((n_p, report["num_suppliers"], months))
+        X[:, report["kept_suppliers"]] = plan["X"]
+        plan["X"] = X
+    return plan
+
+
+def _result(status, optimal, objective=None, x=None, duals=None, bound=-np.inf, gap=np.inf, runtime=0.0):
+    return {"status": status, "optimal": optimal, "objective": objective, "x": x, "duals": duals,
+            "bound": bound, "gap": gap, "runtime": runtime}
+
+
+def solve_gurobi(problem, policy=None):
+    """Gurobi backend: load the problem's matrices with addMVar/addMConstr and solve"""
+    from anytime import apply_policy, solve_outcome
+    from solver_env import new_model
+
+    model = new_model()
+    vtype = np.where(problem["integrality"] > 0, GRB.INTEGER, GRB.CONTINUOUS)
+    x = model.addMVar(len(problem["c"]), lb=problem["lb"], ub=problem["ub"], obj=problem["c"], vtype=vtype)
+    model.addMConstr(problem["A"], x, problem["sense"], problem["b"])
+    model.ModelSense = GRB.MINIMIZE
+    with model:
+        apply_policy(model, policy)
+        model.optimize()
+        outcome = solve_outcome(model)
+        x = duals = None
+        if outcome["has_solution"]:
+            x = np.array(model.getAttr("X", model.getVars()))
+            if not model.IsMIP:
+                duals = np.array(model.getAttr("Pi", model.getConstrs()))
+        return _result(outcome["status"], outcome["optimal"], outcome["incumbent"] if x is not None else None,
+                       x, duals, outcome["bound"], outcome["gap"], model.Runtime)
+
+
+# scipy (linprog / milp) status codes -> Gurobi status names
+_HIGHS_STATUS = {0: "OPTIMAL", 1: "TIME_LIMIT", 2: "INFEASIBLE", 3: "UNBOUNDED", 4: "NUMERIC"}
+
+
+def solve_highs(problem, policy=None):
+    """HiGHS backend: linprog for LPs (with duals), milp for MILPs"""
+    policy = policy or {}
+    options = {}
+    if "TimeLimit" in policy:
+        options["time_limit"] = policy["TimeLimit"]
+
+    A, sense, b = problem["A"], problem["sense"], problem["b"]
+    start = time.perf_counter()
+    if not problem["integrality"].any():
+        is_equality = sense == GRB.EQUAL
+        sign = np.where(sense == GRB.GREATER_EQUAL, -1.0, 1.0)[~is_equality]
+        inequality = A[~is_equality].multiply(sign[:, None]).tocsr()
+        res = linprog(problem["c"], A_ub=inequality, b_ub=sign * b[~is_equality],
+                      A_eq=A[is_equality], b_eq=b[is_equality],
+                      bounds=np.column_stack([problem["lb"], problem["ub"]]), method="highs", options=options)
+        runtime = time.perf_counter() - start
+        status = _HIGHS_STATUS.get(res.status, str(res.status))
+        if res.status != 0:
+            return _result(status, False, runtime=runtime, bound=np.inf if res.status == 2 else -np.inf)
+        duals = np.empty(len(b))
+        duals[is_equality] = res.eqlin.marginals
+        duals[~is_equality] = sign * res.ineqlin.marginals
+        return _result(status, True, res.fun, res.x, duals, res.fun, 0.0, runtime)
+
+    if "MIPGap" in policy:
+        options["mip_rel_gap"] = policy["MIPGap"]
+    row_lb = np.where(sense == GRB.LESS_EQUAL, -np.inf, b)
+    row_ub = np.where(sense == GRB.GREATER_EQUAL, np.inf, b)
+    res = milp(problem["c"], constraints=LinearConstraint(A, row_lb, row_ub), integrality=problem["integrality"],
+               bounds=Bounds(problem["lb"], problem["ub"]), options=options)
+    runtime = time.perf_counter() - start
+    status = _HIGHS_STATUS.get(res.status, str(res.status))
+    bound = res.mip_dual_bound if res.mip_dual_bound is not None else -np.inf
+    if res.x is None:
+        return _result(status, False, runtime=runtime, bound=np.inf if res.status == 2 else bound)
+    return _result(status, res.status == 0, res.fun, res.x, None, bound,
+                   res.mip_gap if res.mip_gap is not None else np.inf, runtime)
+
+
+register_backend("gurobi", solve_gurobi)
+register_backend("highs", solve_highs)
+
+
+def solve(problem, backend="gurobi", policy=None):
+    result = _backends[backend](problem, policy)
+    if problem.get("columns") is not None and result["x"] is not None:
+        # Back to template column order; left out columns are zero
+        x = np.zeros(problem["template"]["num_vars"])
+        x[problem["columns"]] = result["x"]
+        result["x"] = x
+    return result
+
+
+def _solve_job(job):
+    kind, args, backend, policy = job
+    problem = problem_b(*args) if kind == "model_b" else problem_e(*args)
+    return solve(problem, backend, policy)
+
+
+def solve_many(jobs, backend="highs", policy=None, workers=None):
+    """
+    Solve ("model_b", (data,)) / ("model_e", (copper_limit, data)) jobs in worker processes
+    (default: one per core). Problems are built in the workers; results come back in job order.
+    """
+    workers = workers or os.cpu_count()
+    jobs = [(kind, args, backend, policy) for kind, args in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_solve_job, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+
+def experiment_rows(scenarios, backend="highs", workers=None):
+    """Rows of d_test.iter_experiments, with every scenario solved by the backend in parallel processes"""
+    from data import get_supplier_data
+    from d_test import collect_results
+
+    supplier_data = [get_supplier_data(scenario) for scenario in scenarios]
+    results = solve_many([("model_b", (data,)) for data in supplier_data], backend, workers=workers)
+    for scenario, data, result in zip(scenarios, supplier_data, results):
+        storage_costs, procurement_costs = data[8], data[4]
+        if result["optimal"]:
+            plan = plan_arrays(problem_b(data), result["x"])
+            yield collect_results(scenario, result["objective"], plan["P"], plan["S"], plan["X"],
+                                  storage_costs, procurement_costs)
+        else:
+            yield collect_results(scenario, None, None, None, None, storage_costs, procurement_costs)
+
+
+def parity_instances(include_grid=False, copper_limits=(0.0, 0.01, 0.02, 0.03, 0.1)):
+    """
+    model_b on every scenario of data.py (data_b, data_exp, data_c1 - data_c7, data_e and optionally
+    the experiment grid), model_e on data_e at several copper limits
+    """
+    import data
+
+    names = ["data_b", "data_exp"] + [f"data_c{k}" for k in range(1, 8)] + ["data_e"]
+    instances = [(name, "model_b", (data.get_supplier_data(getattr(data, name)),)) for name in names]
+    if include_grid:
+        instances += [(f"grid[{k}]", "model_b", (data.get_supplier_data(scenario),))
+                      for k, scenario in enumerate(data.get_experimental_scenarios())]
+    base = data.get_supplier_data_e(data.data_e)
+    instances += [(f"data_e, copper {limit}", "model_e", (limit, base)) for limit in copper_limits]
+    return instances
+
+
+def objectives_agree(kind, reference, result, tolerance=PARITY_TOLERANCE):
+    """
+    Whether two solve results of one instance agree: same status if either has no objective, else
+    objectives within tolerance (relative), for MILPs (model_e) plus the MIP gap of both solves
+    """
+    if reference["objective"] is None or result["objective"] is None:
+        return reference["status"] == result["status"]
+    allowed = tolerance + (reference["gap"] + result["gap"] if kind == "model_e" else 0.0)
+    difference = abs(result["objective"] - reference["objective"]) / max(1.0, abs(reference["objective"]))
+    return difference <= allowed
+
+
+def parity_check(backends=("gurobi", "highs"), include_grid=False, tolerance=PARITY_TOLERANCE, workers=None):
+    """
+    Solve every instance with each backend and compare the objectives with the first backend
+    (objectives_agree). Prints the table and returns (all instances agree, table).
+    """
+    instances = parity_instances(include_grid)
+    jobs = [(kind, args) for _, kind, args in instances]
+    results = {backend: solve_many(jobs, backend, workers=workers) for backend in backends}
+    reference = backends[0]
+
+    rows = []
+    for k, (name, kind, _) in enumerate(instances):
+        row = {"instance": name, "model": kind}
+        for backend in backends:
+            row[f"{backend} status"] = results[backend][k]["status"]
+            row[f"{backend} objective"] = results[backend][k]["objective"]
+        row["agree"] = all(objectives_agree(kind, results[reference][k], results[backend][k], tolerance)
+                           for backend in backends[1:])
+        rows.append(row)
+
+    table = pd.DataFrame(rows)
+    print(table.to_string(index=False))
+    return bool(table["agree"].all()), table
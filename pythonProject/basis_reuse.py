@@ -0,0 +1,156 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+from gurobipy import GRB
+
+import warm_start
+from d_test import create_model, collect_results
+
+logger = logging.getLogger(__name__)
+
+# Reduced cost tolerance used when deciding whether a basis is still optimal
+OPTIMALITY_TOL = 1e-9
+
+
+def objective_only_key(scenario):
+    """Scenarios with the same key differ only in their storage costs (i.e. only in the objective)"""
+    return warm_start.parameter_vector(
+        {key: value for key, value in scenario.items() if key != "storage_costs"}
+    ).tobytes()
+
+
+def capture_basis(model):
+    """
+    Store an optimal basis of the model together with its LU factorization and the
+    nonbasic columns needed to price any other objective vector.
+    """
+    n = model.NumVars
+    constrs = model.getConstrs()
+
+    # Augmented matrix [A | slack columns]: -1 for >= rows, +1 otherwise (equality slacks are fixed at 0)
+    senses = np.array(model.getAttr("Sense", constrs))
+    slack_sign = np.where(senses == GRB.GREATER_EQUAL, -1.0, 1.0)
+    is_equality = senses == GRB.EQUAL
+    A_aug = sp.hstack([model.getA(), sp.diags(slack_sign)], format="csc")
+
+    vbasis = np.array(model.getAttr("VBasis", model.getVars()))
+    cbasis = np.array(model.getAttr("CBasis", constrs))
+    status = np.concatenate([vbasis, cbasis])
+
+    basic = np.flatnonzero(status == 0)
+    nonbasic = np.flatnonzero(status != 0)
+
+    # Equality slacks are fixed at zero, so their reduced cost may take any sign
+    checked = nonbasic[(nonbasic < n) | ~is_equality[np.maximum(nonbasic - n, 0)]]
+    at_upper = status[checked] == -2
+
+    return {
+        "basic": basic,
+        "checked": checked,
+        "at_upper": at_upper,
+        "lu": splu(A_aug[:, basic].tocsc()),
+        "A_checked_T": A_aug[:, checked].T.tocsr(),
+        "x": np.array(model.getAttr("X", model.getVars())),
+    }
+
+
+def optimal_for(basis, cost_matrix):
+    """
+    Vectorized optimality test: for each row of cost_matrix (one objective vector per scenario)
+    return whether the stored basis is still optimal
+    """
+    num_scenarios = cost_matrix.shape[0]
+    c_aug = np.hstack([cost_matrix, np.zeros((num_scenarios, basis["lu"].shape[0]))])
+
+    # Simplex multipliers y solve B^T y = c_B for every scenario at once
+    Y = basis["lu"].solve(np.ascontiguousarray(c_aug[:, basis["basic"]].T), trans="T")
+    reduced_costs = c_aug[:, basis["checked"]] - (basis["A_checked_T"] @ Y).T
+
+    at_lower_ok = reduced_costs[:, ~basis["at_upper"]] >= -OPTIMALITY_TOL
+    at_upper_ok = reduced_costs[:, basis["at_upper"]] <= OPTIMALITY_TOL
+    return at_lower_ok.all(axis=1) & at_upper_ok.all(axis=1)
+
+
+def solve_group(scenarios):
+    """
+    Solve scenarios that share everything except the storage costs.
+    Gurobi is only called for scenarios outside the optimality region of every known basis.
+    """
+    model, P, S, X, num_product, num_supplier, months, _, procurement_costs = create_model(scenarios[0])
+    model.update()
+
+    # Objective vector of every scenario: base objective with the storage cost columns replaced
+    S_index = np.array([[S[i, t].index for t in range(months)] for i in range(num_product)])
+    P_index = np.array([[P[i, t].index for t in range(months)] for i in range(num_product)])
+    X_index = np.array([[[X[i, j, t].index for t in range(months)] for j in range(num_supplier)]
+                        for i in range(num_product)])
+    base_cost = np.array(model.getAttr("Obj", model.getVars()))
+    storage_costs = np.array([scenario["storage_costs"] for scenario in scenarios], dtype=float)
+    cost_matrix = np.tile(base_cost, (len(scenarios), 1))
+    cost_matrix[:, S_index] = storage_costs[:, :, None]
+
+    solution = [None] * len(scenarios)
+    pending = np.ones(len(scenarios), dtype=bool)
+    num_solves = 0
+
+    while pending.any():
+        # Solve the first scenario not covered by a known basis
+        k = int(np.flatnonzero(pending)[0])
+        model.setAttr("Obj", model.getVars(), cost_matrix[k].tolist())
+        warm_start.optimize(model, scenarios[k])
+        num_solves += 1
+
+        # Feasibility does not depend on the objective, so no other scenario of the group can be solved
+        if model.status != GRB.OPTIMAL:
+            break
+
+        # Every pending scenario this basis solves gets the same primal solution
+        basis = capture_basis(model)
+        pending_ids = np.flatnonzero(pending)
+        solved = pending_ids[optimal_for(basis, cost_matrix[pending_ids])]
+        solved = np.union1d(solved, [k])
+        for idx in solved:
+            solution[idx] = basis["x"]
+        pending[solved] = False
+
+    results = []
+    for scenario, costs, x, c in zip(scenarios, storage_costs, solution, cost_matrix):
+        if x is None:
+            results.append(collect_results(scenario, None, None, None, None, costs, procurement_costs))
+        else:
+            results.append(collect_results(scenario, float(c @ x), x[P_index], x[S_index], x[X_index],
+                                           costs, procurement_costs))
+    model.dispose()
+    return results, num_solves
+
+
+def iter_basis_reuse(scenarios):
+    """
+    Generator over (position, result row) for every scenario, one group of objective-only
+    variants at a time, so rows can be written out while the sweep is running
+    """
+    groups = {}
+    for position, scenario in enumerate(scenarios):
+        groups.setdefault(objective_only_key(scenario), []).append(position)
+
+    total_solves = 0
+    for positions in groups.values():
+        group_results, num_solves = solve_group([scenarios[p] for p in positions])
+        total_solves += num_solves
+        yield from zip(positions, group_results)
+
+    logger.info("Basis reuse: %d solver calls for %d scenarios", total_solves, len(scenarios))
+
+
+def run_experiments_with_basis_reuse(scenarios):
+    """
+    Same output as d_test.run_experiments, but objective-only variants are resolved
+    from stored optimal bases by matrix products instead of Gurobi calls
+    """
+    results = [None] * len(scenarios)
+    for position, row in iter_basis_reuse(scenarios):
+        results[position] = row
+    return pd.DataFrame(results)
@@ -0,0 +1,435 @@
+"""
+Command line entry point for the steel production models.
+
+    python -m cli solve-b [--scenario data_c1] [--no-sensitivity]
+    python -m cli solve-e [--copper-limit 0.03] [--time-limit 10] [--mip-gap 1e-3]
+    python -m cli copper-search [--time-limit 10] [--mip-gap 1e-3]
+    python -m cli copper-scan [--start 0 --end 0.03 --step 0.001] [--plot copper.png] [--time-limit 10]
+    python -m cli experiments [--output results.xlsx] [--no-basis-reuse] [--backend highs|pdhg]
+    python -m cli plot [--results results.xlsx] [--save-dir plots]
+    python -m cli schedule [--workload experiments|copper] [--cores N] [--compare]
+    python -m cli tune [--family model_b|model_e|all] [--trials 30]
+    python -m cli sweep-init DIR [--axes JSON] [--shard-size 25]
+    python -m cli sweep-worker DIR [--workers 4]
+    python -m cli sweep-merge DIR [--output results.xlsx]
+    python -m cli parity [--grid]
+    python -m cli surrogate [--training 20] [--max-gap 1e-3]
+    python -m cli presolve [--scenario data_b] [--catalog 5000] [--copper-limit 0.01] [--backend highs]
+    python -m cli colgen [--catalog 100000] [--copper-limit 0.01] [--batch 50] [--no-full]
+    python -m cli lagrange [--grades 100] [--iterations 50] [--workers 4] [--no-full]
+    python -m cli aggregate [--months 12 24 48 96] [--bucket 3] [--electrolysis] [--workers 4] [--no-full]
+    python -m cli rolling [--copper-limit 0.03] [--months 12] [--paths 100] [--cold-paths 10] [--workers 4]
+    python -m cli doe [--points 64] [--method adaptive|lhs|sobol] [--reference results.xlsx] [--output doe.xlsx]
+    python -m cli model-cache [--evict] [--benchmark]
+
+Any subcommand accepts --model-cache DIR before its name to load built models from (and store them in) DIR.
+
+Heavy modules (gurobipy, pandas, matplotlib, seaborn) are only imported by the subcommand that needs them.
+
+The parity instances are also asserted by the test suite: python -m pytest tests
+"""
+import argparse
+import os
+import sys
+
+
+def _policy(args):
+    """Anytime solve policy from --time-limit / --mip-gap (None: solve to optimality)"""
+    policy = {}
+    if args.time_limit is not None:
+        policy["TimeLimit"] = args.time_limit
+    if args.mip_gap is not None:
+        policy["MIPGap"] = args.mip_gap
+    return policy or None
+
+
+def solve_b(args):
+    import data
+    from main import solve_b
+    model = solve_b(getattr(data, args.scenario), show_sensitivity=not args.sensitivity_off)
+    model.dispose()
+
+
+def solve_e(args):
+    from model_e import data_e, get_supplier_data_e, solve_model_with_copper_limit, display_optimal_plans
+    data = get_supplier_data_e(data_e)
+    copper_limit = data[8] if args.copper_limit is None else args.copper_limit
+    is_feasible, cost, model, variables, cost_params = solve_model_with_copper_limit(copper_limit, data, _policy(args))
+    if not is_feasible:
+        print(f"No solution found for copper limit {copper_limit}")
+        return
+    P, S, X, B, m = variables
+    storage_costs, electrolysis_fixed_cost, electrolysis_unit_cost, supplier_costs = cost_params
+    display_optimal_plans(model, data[0], P, S, X, B, m, data[-2], data[-1], storage_costs,
+                          electrolysis_fixed_cost, electrolysis_unit_cost, supplier_costs)
+    model.dispose()
+
+
+def copper_search(args):
+    from model_e import copper_search
+    copper_search(policy=_policy(args))
+
+
+def copper_scan(args):
+    from model_e_exp import data_e, get_supplier_data_e, scan_copper_limits, plot_copper_limits
+    results_df = scan_copper_limits(get_supplier_data_e(data_e), args.start, args.end, args.step, args.resume,
+                                    _policy(args))
+    print("\nSummary of results:")
+    print(results_df.to_string(index=False))
+    if args.plot:
+        plot_copper_limits(results_df, save_path=args.plot)
+        print(f"Plot saved to: {args.plot}")
+
+
+def experiments(args):
+    import warm_start
+    from solver_env import peak_memory_mb
+    from d_test import stream_experiments
+    from result_writer import read_results
+
+    # Results are checkpointed to CSV as they are solved; an .xlsx output is written from it at the end
+    checkpoint = os.path.splitext(args.output)[0] + ".csv"
+    stream_experiments(checkpoint, reuse_bases=not args.no_basis_reuse, resume=args.resume,
+                       chunk_size=args.chunk_size, backend=args.backend)
+    if checkpoint != args.output:
+        read_results(checkpoint).to_excel(args.output, index=False)
+    print(f"Experiments completed. Results saved to '{args.output}'.")
+    stats = warm_start.warm_start_stats()
+    if stats["solves"]:
+        print(f"Warm start hit rate: {stats['hit_rate']:.1%} ({stats['hits']}/{stats['solves']}), "
+              f"estimated time saved: {stats['time_saved']:.2f}s over {stats['timed_hits']} hits")
+    peak = peak_memory_mb()
+    if peak is not None:
+        print(f"Peak resident memory: {peak:.1f} MB")
+
+
+def plot(args):
+    from Plot import generate_plots
+    generate_plots(args.results, args.save_dir, args.workers, args.force)
+
+
+def sweep_init(args):
+    import json
+    from sweep_queue import create_sweep
+    spec = {"axes": json.loads(args.axes)} if args.axes else {"grid": "experimental"}
+    num_scenarios = create_sweep(args.directory, spec, args.shard_size)
+    print(f"Created sweep of {num_scenarios} scenarios in {args.directory}")
+
+
+def sweep_worker(args):
+    from sweep_queue import work, run_local, status
+    kwargs = {"heartbeat_interval": args.heartbeat, "stale_after": args.stale_after,
+              "reuse_bases": not args.no_basis_reuse}
+    if args.workers > 1:
+        print(f"Shard status: {run_local(args.directory, args.workers, **kwargs)}")
+    else:
+        work(args.directory, **kwargs)
+        print(f"Shard status: {status(args.directory)}")
+
+
+def sweep_merge(args):
+    from sweep_queue import merge_results
+    results = merge_results(args.directory, args.output)
+    if results.empty:
+        print("No shard has results yet.")
+        return
+    print(f"Merged {len(results)} scenarios into '{args.output}'.")
+
+
+def tune(args):
+    from tuning import tune_family
+    families = ["model_b", "model_e"] if args.family == "all" else [args.family]
+    for family in families:
+        tune_family(family, args.instances, args.trials, args.repeats, args.seed)
+    from tuning import params_file, is_enabled
+    if not is_enabled():
+        print(f"Parameter sets saved to '{params_file()}'; set STEEL_TUNED_PARAMS to that file to apply them to solves.")
+
+
+def schedule(args):
+    import pandas as pd
+    import scheduler
+    if args.workload == "experiments":
+        from data import get_experimental_scenarios
+        jobs = scheduler.experiment_jobs(get_experimental_scenarios())
+    else:
+        from model_e_exp import data_e, get_supplier_data_e
+        jobs = scheduler.copper_jobs(get_supplier_data_e(data_e), args.start, args.end, args.step, _policy(args))
+
+    if args.compare:
+        rows, _ = scheduler.compare_with_naive(jobs, args.cores)
+    else:
+        rows, report = scheduler.run_scheduled(jobs, args.cores)
+        print(pd.DataFrame([report]).to_string(index=False, float_format="{:.3f}".format))
+    if args.output:
+        pd.DataFrame([row for row in rows if row is not None]).to_excel(args.output, index=False)
+        print(f"Results saved to '{args.output}'.")
+
+
+def model_cache(args):
+    import model_cache
+    if args.evict:
+        removed = model_cache.evict(max_age_days=args.max_age_days, max_size_mb=args.max_size_mb)
+        print(f"Removed {removed} cached models from {model_cache.cache_dir()}")
+    if args.benchmark:
+        model_cache.benchmark()
+
+
+def parity(args):
+    from backends import parity_check
+    agree, _ = parity_check(include_grid=args.grid, workers=args.workers)
+    print("All backends agree." if agree else "Objective mismatch between backends.")
+    return 0 if agree else 1
+
+
+def surrogate(args):
+    from surrogate import evaluate_on_grid
+    evaluate_on_grid(num_training=args.training, max_gap=args.max_gap, seed=args.seed)
+
+
+def presolve(args):
+    import data
+    from presolve import compare
+    default = "data_b" if args.copper_limit is None else "data_e"
+    scenario = getattr(data, args.scenario or default)
+    if args.catalog:
+        scenario = data.synthetic_catalog(scenario, args.catalog, seed=args.seed)
+    compare(scenario, args.copper_limit, args.backend)
+
+
+def colgen(args):
+    import data
+    from colgen import compare
+    default = "data_b" if args.copper_limit is None else "data_e"
+    scenario = getattr(data, args.scenario or default)
+    if args.catalog:
+        scenario = data.synthetic_catalog(scenario, args.catalog, seed=args.seed)
+    compare(scenario, args.copper_limit, args.backend, args.batch, full=not args.no_full)
+
+
+def lagrange(args):
+    from lagrange import compare
+    compare(args.grades, args.backend, args.iterations, args.workers, args.seed, full=not args.no_full)
+
+
+def aggregate(args):
+    from time_aggregation import compare
+    compare(args.months, args.electrolysis, args.bucket, args.backend, args.workers, args.seed, full=not args.no_full)
+
+
+def rolling(args):
+    from rolling import compare
+    compare(args.copper_limit, args.months, args.paths, args.noise, args.seed, args.workers, args.cold_paths,
+            _policy(args))
+
+
+def doe(args):
+    from doe import compare_with_grid, write_predicted
+    reference = None
+    if args.reference and os.path.exists(args.reference):
+        from Plot import load_results
+        reference = load_results(args.reference)
+    summary, predicted = compare_with_grid(args.points, args.method, args.seed, reference)
+    if args.output and summary["not reproduced"]:
+        # Plot.py draws every heatmap metric, so a file without the failed ones is no use either
+        print(f"Not writing '{args.output}': {', '.join(summary['not reproduced'])} not reproduced "
+              f"(try more --points or --method adaptive).")
+    elif args.output:
+        write_predicted(predicted, args.output)
+        print(f"Predicted grid results saved to '{args.output}' (plot them with: plot --results {args.output}).")
+
+
+def _add_policy_arguments(command):
+    command.add_argument("--time-limit", type=float, default=None,
+                         help="Seconds per MILP solve; the best solution found and its bound are kept")
+    command.add_argument("--mip-gap", type=float, default=None, help="Relative MIP gap at which solves stop")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Steel production planning models")
+    parser.add_argument("--model-cache", default=None, metavar="DIR",
+                        help="Load built models from this cache directory and store new ones in it")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("solve-b", help="Solve the base model (question b) or one of its scenarios")
+    command.add_argument("--scenario", default="data_b",
+                         help="Scenario dictionary from data.py, e.g. data_b, data_c1 ... data_c7 (default: data_b)")
+    command.add_argument("--no-sensitivity", dest="sensitivity_off", action="store_true",
+                         help="Skip the shadow price and ranging report")
+    command.set_defaults(handler=solve_b)
+
+    command = commands.add_parser("solve-e", help="Solve the electrolysis model (question e) for one copper limit")
+    command.add_argument("--copper-limit", type=float, default=None,
+                         help="Copper content limit (default: the limit in data_e)")
+    _add_policy_arguments(command)
+    command.set_defaults(handler=solve_e)
+
+    command = commands.add_parser("copper-search", help="Binary search for the minimum cost-neutral copper limit")
+    _add_policy_arguments(command)
+    command.set_defaults(handler=copper_search)
+
+    command = commands.add_parser("copper-scan", help="Scan a range of copper limits and save the cost breakdown")
+    command.add_argument("--start", type=float, default=0.0)
+    command.add_argument("--end", type=float, default=0.03)
+    command.add_argument("--step", type=float, default=0.001)
+    command.add_argument("--plot", default=None, help="Save the cost plot to this file")
+    command.add_argument("--resume", action="store_true", help="Skip copper limits already in the CSV checkpoint")
+    _add_policy_arguments(command)
+    command.set_defaults(handler=copper_scan)
+
+    command = commands.add_parser("experiments", help="Run the max production x storage cost experiment grid")
+    command.add_argument("--output", default="steel_production_experiment_results.xlsx",
+                         help="Result file (.xlsx or .csv); results are checkpointed to a .csv next to it")
+    command.add_argument("--resume", action="store_true", help="Skip scenarios already in the CSV checkpoint")
+    command.add_argument("--chunk-size", type=int, default=100, help="Rows buffered before each append")
+    command.add_argument("--no-basis-reuse", action="store_true",
+                         help="Call the solver for every scenario instead of reusing optimal bases")
+    command.add_argument("--backend", choices=["gurobi", "highs", "pdhg"], default="gurobi",
+                         help="Solver backend; highs needs no license and runs one process per core, "
+                              "pdhg gives approximate costs from one batched first-order solve")
+    command.set_defaults(handler=experiments)
+
+    command = commands.add_parser("plot", help="Generate the figures from the experiment results")
+    command.add_argument("--results", default="steel_production_experiment_results.xlsx")
+    command.add_argument("--save-dir", default="plots")
+    command.add_argument("--workers", type=int, default=None, help="Rendering processes (default: one per core)")
+    command.add_argument("--force", action="store_true", help="Redraw figures even if their data is unchanged")
+    command.set_defaults(handler=plot)
+
+    command = commands.add_parser("schedule", help="Run a sweep with core-aware scheduling of solves and threads")
+    command.add_argument("--workload", choices=["experiments", "copper"], default="experiments")
+    command.add_argument("--cores", type=int, default=None, help="Cores to use (default: all)")
+    command.add_argument("--start", type=float, default=0.0, help="First copper limit (copper workload)")
+    command.add_argument("--end", type=float, default=0.03, help="Last copper limit (copper workload)")
+    command.add_argument("--step", type=float, default=0.001, help="Copper limit step (copper workload)")
+    command.add_argument("--compare", action="store_true", help="Also run the naive layout and compare")
+    command.add_argument("--output", default=None, help="Save the result rows to this Excel file")
+    _add_policy_arguments(command)
+    command.set_defaults(handler=schedule)
+
+    command = commands.add_parser("tune", help="Search solver parameters per model family and store the best sets")
+    command.add_argument("--family", choices=["model_b", "model_e", "all"], default="all")
+    command.add_argument("--instances", type=int, default=10, help="Sampled grid instances per family")
+    command.add_argument("--trials", type=int, default=30, help="Parameter combinations tried (defaults included)")
+    command.add_argument("--repeats", type=int, default=3, help="Solves per instance and combination")
+    command.add_argument("--seed", type=int, default=0)
+    command.set_defaults(handler=tune)
+
+    command = commands.add_parser("sweep-init", help="Create a sweep work queue in a shared directory")
+    command.add_argument("directory")
+    command.add_argument("--axes", default=None,
+                         help='Full factorial grid over data_b as JSON, e.g. \'{"max_production": [95, 100]}\' '
+                              '(default: the experiment grid of data.py)')
+    command.add_argument("--shard-size", type=int, default=25)
+    command.set_defaults(handler=sweep_init)
+
+    command = commands.add_parser("sweep-worker", help="Claim and solve shards of a sweep until it is done")
+    command.add_argument("directory")
+    command.add_argument("--workers", type=int, default=1, help="Worker processes to start on this machine")
+    command.add_argument("--heartbeat", type=float, default=10, help="Seconds between heartbeats")
+    command.add_argument("--stale-after", type=float, default=60,
+                         help="Seconds without a heartbeat before a shard is reclaimed")
+    command.add_argument("--no-basis-reuse", action="store_true")
+    command.set_defaults(handler=sweep_worker)
+
+    command = commands.add_parser("sweep-merge", help="Merge the shard results of a sweep")
+    command.add_argument("directory")
+    command.add_argument("--output", default="steel_production_experiment_results.xlsx")
+    command.set_defaults(handler=sweep_merge)
+
+    command = commands.add_parser("parity", help="Compare the objectives of the Gurobi and HiGHS backends")
+    command.add_argument("--grid", action="store_true", help="Also solve every scenario of the experiment grid")
+    command.add_argument("--workers", type=int, default=None, help="Processes per backend (default: one per core)")
+    command.set_defaults(handler=parity)
+
+    command = commands.add_parser("surrogate", help="Answer the experiment grid from the value-function surrogate")
+    command.add_argument("--training", type=int, default=20, help="Random grid points solved before the queries")
+    command.add_argument("--max-gap", type=float, default=1e-3,
+                         help="Relative bound gap up to which a query is answered without a solve")
+    command.add_argument("--seed", type=int, default=0)
+    command.set_defaults(handler=surrogate)
+
+    command = commands.add_parser("presolve", help="Remove forced-zero procurement and dominated suppliers")
+    command.add_argument("--scenario", default=None,
+                         help="Scenario dictionary from data.py (default: data_b, or data_e with --copper-limit)")
+    command.add_argument("--catalog", type=int, default=0,
+                         help="Extend the scenario to a synthetic catalog of this many suppliers")
+    command.add_argument("--copper-limit", type=float, default=None,
+                         help="Presolve the electrolysis model (data_e) with this copper limit")
+    command.add_argument("--backend", choices=["gurobi", "highs"], default="highs")
+    command.add_argument("--seed", type=int, default=0)
+    command.set_defaults(handler=presolve)
+
+    command = commands.add_parser("colgen", help="Solve over a large supplier catalog by column generation")
+    command.add_argument("--scenario", default=None,
+                         help="Scenario dictionary from data.py (default: data_b, or data_e with --copper-limit)")
+    command.add_argument("--catalog", type=int, default=0,
+                         help="Extend the scenario to a synthetic catalog of this many suppliers")
+    command.add_argument("--copper-limit", type=float, default=None,
+                         help="Solve the electrolysis model (data_e) with this copper limit")
+    command.add_argument("--backend", choices=["gurobi", "highs"], default="highs")
+    command.add_argument("--batch", type=int, default=50, help="Suppliers added per pricing round")
+    command.add_argument("--no-full", action="store_true", help="Do not solve the full model for comparison")
+    command.add_argument("--seed", type=int, default=0)
+    command.set_defaults(handler=colgen)
+
+    command = commands.add_parser("lagrange", help="Solve a many-grade instance by Lagrangian decomposition")
+    command.add_argument("--grades", type=int, default=100, help="Grades of the synthetic instance")
+    command.add_argument("--iterations", type=int, default=50)
+    command.add_argument("--workers", type=int, default=None, help="Subproblem processes (default: CPU count)")
+    command.add_argument("--backend", choices=["gurobi", "highs"], default="highs")
+    command.add_argument("--no-full", action="store_true", help="Do not solve the monolithic model for comparison")
+    command.add_argument("--seed", type=int, default=0)
+    command.set_defaults(handler=lagrange)
+
+    command = commands.add_parser("aggregate", help="Solve long horizons coarse (per bucket of months), then refine")
+    command.add_argument("--months", type=int, nargs="+", default=[12, 24, 48, 96], help="Horizons to solve")
+    command.add_argument("--bucket", type=int, default=3, help="Months per coarse period")
+    command.add_argument("--electrolysis", action="store_true", help="Use the electrolysis model (data_e)")
+    command.add_argument("--workers", type=int, default=None, help="Bucket processes (default: CPU count)")
+    command.add_argument("--backend", choices=["gurobi", "highs"], default="highs")
+    command.add_argument("--no-full", action="store_true", help="Do not solve the monolithic model for comparison")
+    command.add_argument("--seed", type=int, default=0)
+    command.set_defaults(handler=aggregate)
+
+    command = commands.add_parser("rolling", help="Simulate monthly re-planning of model_e over random demand paths")
+    command.add_argument("--copper-limit", type=float, default=None, help="Copper limit (default: the one of data_e)")
+    command.add_argument("--months", type=int, default=12, help="Horizon (longer ones repeat the data_e demand)")
+    command.add_argument("--paths", type=int, default=100, help="Demand paths simulated")
+    command.add_argument("--noise", type=float, default=0.2, help="Relative demand noise per month (uniform +-)")
+    command.add_argument("--cold-paths", type=int, default=10,
+                         help="Paths simulated again by the persistent and by a rebuilt cold planner, for the timing")
+    command.add_argument("--workers", type=int, default=None, help="Simulation processes (default: CPU count)")
+    command.add_argument("--seed", type=int, default=0)
+    _add_policy_arguments(command)
+    command.set_defaults(handler=rolling)
+
+    command = commands.add_parser("doe", help="Predict the experiment grid from a space-filling design of solves")
+    command.add_argument("--points", type=int, default=64, help="Scenarios solved (the box corners included)")
+    command.add_argument("--method", choices=["lhs", "sobol", "adaptive"], default="adaptive")
+    command.add_argument("--seed", type=int, default=0)
+    command.add_argument("--reference", default="steel_production_experiment_results.xlsx",
+                         help="Full factorial results to compare with; the grid is solved if the file is missing")
+    command.add_argument("--output", default=None, help="Write the predicted grid as an experiment result file")
+    command.set_defaults(handler=doe)
+
+    command = commands.add_parser("model-cache", help="Evict old entries of the model cache or benchmark it")
+    command.add_argument("--evict", action="store_true", help="Remove old entries and shrink the cache to its size limit")
+    command.add_argument("--max-age-days", type=float, default=30)
+    command.add_argument("--max-size-mb", type=float, default=2048)
+    command.add_argument("--benchmark", action="store_true", help="Time cold model builds against cache loads")
+    command.set_defaults(handler=model_cache)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.model_cache:
+        # Through the environment, so worker processes use the same cache
+        os.environ["STEEL_MODEL_CACHE"] = args.model_cache
+    return args.handler(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Column generation over large supplier catalogs.
+
+Only a restricted set of suppliers is in the model (the restricted master: the model_b / model_e
+template of those suppliers). After every master solve the suppliers outside it are priced at once
+with NumPy: supplier j enters product i in month t with the column
+    supply[j,t]: 1   blend[i,t]: -1   chromium[i,t]: -Cr_j   nickel[i,t]: -Ni_j   (copper[i,t]: Cu_j)
+and reduced cost
+    d[i,j,t] = cost_j + y_blend[i,t] + Cr_j y_chromium[i,t] + Ni_j y_nickel[i,t] (- Cu_j y_copper[i,t])
+(the supply row of a supplier outside the master is slack, its dual is 0). The suppliers with the most
+negative reduced costs are added until none is left, so the master stays small however large the
+catalog is. Artificial columns on the balance rows (unmet demand at ARTIFICIAL_COST) keep every
+master feasible; if they are still used at the end, the full problem is infeasible.
+
+model_e is a MILP: columns are generated for its LP relaxation (a lower bound), the master MILP fixes
+the electrolysis months, columns are generated again for the LP with those months fixed, and a final
+master MILP gives the plan.
+
+The master objective is a bound only once pricing finds no negative reduced cost. If max_iterations
+runs out before, the status is ITERATION_LIMIT: without the LP bound (-inf) when the LP relaxation is
+not priced out, otherwise with the bound but a plan that may not be optimal.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import backends
+from model_template import compile_template, scenario_vectors
+from presolve import reduced_params
+
+# Cost of one unit of unmet demand in the restricted masters
+ARTIFICIAL_COST = 1e5
+
+# Suppliers closest to each product's composition in the first master
+DEFAULT_INITIAL = 5
+
+# Suppliers added per pricing round
+DEFAULT_BATCH = 50
+
+# Reduced cost below which a supplier improves the master
+PRICING_TOL = 1e-7
+
+# Suppliers priced per NumPy block (bounds the memory of the reduced cost array)
+PRICING_BLOCK = 20000
+
+
+def initial_suppliers(params, per_product=DEFAULT_INITIAL):
+    """For every product the per_product suppliers closest to its chromium and nickel targets (cheapest first)"""
+    chromium = np.asarray(params["chromium_content"], dtype=float)
+    nickel = np.asarray(params["nickel_content"], dtype=float)
+    costs = np.asarray(params["costs"], dtype=float)
+    chosen = set()
+    for target_cr, target_ni in zip(params["chromium_ratio"], params["nickel_ratio"]):
+        distance = np.abs(chromium - target_cr) + np.abs(nickel - target_ni)
+        chosen.update(np.lexsort((costs, distance))[:per_product].tolist())
+    return np.array(sorted(chosen))
+
+
+def master_problem(params, suppliers, num_product, months, electrolysis=False, relax=True):
+    """Restricted master of the suppliers, with one artificial column per balance row"""
+    template = compile_template(num_product, len(suppliers), months, electrolysis)
+    problem = backends.matrix_problem(template, scenario_vectors(template, reduced_params(params, suppliers)))
+    balance = template["rows"]["balance"].ravel()
+    artificial = sp.csr_matrix((np.ones(balance.size), (balance, np.arange(balance.size))),
+                               shape=(template["num_rows"], balance.size))
+    problem["A"] = sp.hstack([problem["A"], artificial], format="csr")
+    problem["c"] = np.concatenate([problem["c"], np.full(balance.size, ARTIFICIAL_COST)])
+    problem["lb"] = np.concatenate([problem["lb"], np.zeros(balance.size)])
+    problem["ub"] = np.concatenate([problem["ub"], np.full(balance.size, np.inf)])
+    integrality = np.zeros_like(problem["integrality"]) if relax else problem["integrality"]
+    problem["integrality"] = np.concatenate([integrality, np.zeros(balance.size, dtype=int)])
+    return problem
+
+
+def price_suppliers(params, problem, duals, candidates, electrolysis=False):
+    """Most negative reduced cost over (product, month) of every candidate supplier"""
+    rows = problem["template"]["rows"]
+    y_blend, y_chromium, y_nickel = (duals[rows[family]] for family in ("blend", "chromium", "nickel"))
+    y_copper = duals[rows["copper"]] if electrolysis else None
+
+    best = np.empty(len(candidates))
+    for start in range(0, len(candidates), PRICING_BLOCK):
+        block = candidates[start:start + PRICING_BLOCK]
+        reduced = (np.asarray(params["costs"], dtype=float)[block][None, :, None] + y_blend[:, None, :]
+                   + np.asarray(params["chromium_content"], dtype=float)[block][None, :, None] * y_chromium[:, None, :]
+                   + np.asarray(params["nickel_content"], dtype=float)[block][None, :, None] * y_nickel[:, None, :])
+        if electrolysis:
+            reduced -= np.asarray(params["copper_content"], dtype=float)[block][None, :, None] * y_copper[:, None, :]
+        best[start:start + PRICING_BLOCK] = reduced.min(axis=(0, 2))
+    return best
+
+
+def _generate(params, suppliers, num_product, months, electrolysis, backend, batch, max_iterations, history,
+              phase, verbose):
+    """
+    Price and add suppliers until no reduced cost is negative. Returns the suppliers, the last master,
+    its LP result and whether pricing converged (False when max_iterations ran out).
+    """
+    max_supply = np.asarray(params["max_supply"], dtype=float)
+    has_supply = (max_supply if max_supply.ndim == 1 else max_supply.max(axis=1)) > 0
+    for iteration in range(max_iterations):
+        start = time.perf_counter()
+        problem = master_problem(params, suppliers, num_product, months, electrolysis)
+        result = backends.solve(problem, backend)
+        if result["duals"] is None:
+            raise RuntimeError(f"Restricted master not solved to optimality: {result['status']}")
+
+        outside = np.setdiff1d(np.flatnonzero(has_supply), suppliers)
+        reduced = price_suppliers(params, problem, result["duals"], outside, electrolysis)
+        entering = outside[np.argsort(reduced)[:batch]]
+        entering = entering[np.sort(reduced)[:batch] < -PRICING_TOL]
+        history.append({"phase": phase, "suppliers": len(suppliers), "objective": result["objective"],
+                        "min reduced cost": float(reduced.min(initial=0.0)), "added": len(entering),
+                        "time [s]": time.perf_counter() - start})
+        if verbose:
+            row = history[-1]
+            print(f"{phase}: {row['suppliers']} suppliers, objective {row['objective']:.4f}, "
+                  f"min reduced cost {row['min reduced cost']:.4g}, {row['added']} added")
+        if not len(entering):
+            return suppliers, problem, result, True
+        if iteration == max_iterations - 1:
+            break  # the suppliers returned are those of the last master
+        suppliers = np.union1d(suppliers, entering)
+    if verbose:
+        print(f"{phase}: stopped after {max_iterations} iterations with suppliers of negative reduced cost left")
+    return suppliers, problem, result, False
+
+
+def _unmet_demand(problem, x):
+    return float(x[problem["template"]["num_vars"]:].sum())
+
+
+def column_generation(params, num_product, months, electrolysis=False, backend="highs", initial=None,
+                      batch=DEFAULT_BATCH, max_iterations=100, policy=None, verbose=True):
+    """
+    Solve the model over the whole catalog of params (template parameters) by column generation.
+    Returns status, objective, bound (LP relaxation, -inf if not priced out), gap, the suppliers in the
+    final master, the plan in full catalog indexing (P, S, X (, B, m)) and the iteration history.
+    """
+    suppliers = initial_suppliers(params) if initial is None else np.asarray(initial)
+    history = []
+    suppliers, problem, result, converged = _generate(params, suppliers, num_product, months, electrolysis, backend, batch,
+                                           max_iterations, history, "LP" if not electrolysis else "LP relaxation",
+                                           verbose)
+    # An unconverged master objective only bounds the optimum from above
+    bound = result["objective"] if converged else -np.inf
+
+    if electrolysis:
+        # Fix the electrolysis months of the master MILP and price again for that LP
+        milp = backends.solve(master_problem(params, suppliers, num_product, months, electrolysis, relax=False),
+                              backend, policy)
+        if milp["x"] is not None:
+            template = compile_template(num_product, len(suppliers), months, electrolysis)
+            months_used = np.round(milp["x"][template["index"]["B"]])
+            fixed = {**params, "lb": {**params.get("lb", {}), "B": months_used},
+                     "ub": {**params.get("ub", {}), "B": months_used}}
+            suppliers, _, _, fixed_converged = _generate(fixed, suppliers, num_product, months, electrolysis, backend, batch,
+                                        max_iterations, history, "LP with fixed electrolysis", verbose)
+            converged = converged and fixed_converged
+        problem = master_problem(params, suppliers, num_product, months, electrolysis, relax=False)
+        result = backends.solve(problem, backend, policy)
+
+    if result["x"] is None or _unmet_demand(problem, result["x"]) > 1e-6:
+        # Unmet demand proves infeasibility only when no supplier could still improve the master
+        status = result["status"] if result["x"] is None else "INFEASIBLE" if converged else "ITERATION_LIMIT"
+        return {"status": status, "objective": None,
+                "bound": bound, "gap": np.inf, "suppliers": suppliers, "plan": None, "history": pd.DataFrame(history)}
+
+    template = problem["template"]
+    plan = {family: result["x"][index] for family, index in template["index"].items()}
+    X = np.zeros((num_product, len(params["costs"]), months))
+    X[:, suppliers] = plan["X"]
+    plan["X"] = X
+    objective = result["objective"]
+    status = result["status"] if converged else "ITERATION_LIMIT"
+    return {"status": status, "objective": objective, "bound": bound,
+            "gap": (objective - bound) / max(1.0, abs(objective)), "suppliers": suppliers, "plan": plan,
+            "history": pd.DataFrame(history)}
+
+
+def compare(scenario, copper_limit=None, backend="highs", batch=DEFAULT_BATCH, full=True):
+    """
+    Column generation on a scenario dictionary (model_e if a copper limit is given, else model_b),
+    optionally checked against the full model. Prints a summary and returns the result.
+    """
+    from model_template import params_b, params_e
+    from data import get_supplier_data, get_supplier_data_e
+
+    if copper_limit is None:
+        data = get_supplier_data(scenario)
+        params = params_b(data)
+        full_problem = lambda: backends.problem_b(data)
+    else:
+        data = get_supplier_data_e(scenario)
+        params = {**params_e(copper_limit, data), "big_m": backends.BIG_M}
+        full_problem = lambda: backends.problem_e(copper_limit, data)
+
+    start = time.perf_counter()
+    result = column_generation(params, data[-2], data[0], copper_limit is not None, backend, batch=batch)
+    elapsed = time.perf_counter() - start
+    print(f"Column generation: {result['status']}, objective {result['objective']}, "
+          f"LP bound {result['bound']:.4f}, {len(result['suppliers'])} of {data[-1]} suppliers, "
+          f"{len(result['history'])} master solves, {elapsed:.2f}s")
+    if full:
+        start = time.perf_counter()
+        reference = backends.solve(full_problem(), backend)
+        print(f"Full model: {reference['status']}, objective {reference['objective']}, "
+              f"{time.perf_counter() - start:.2f}s")
+    return result
@@ -1,115 +1,142 @@
-from gurobipy import Model, GRB, quicksum
+from gurobipy import GRB
 import pandas as pd
-from data import get_supplier_data, experimental_scenarios
+from data import get_supplier_data, get_experimental_scenarios
+import warm_start
+from solver_env import peak_memory_mb
+from model_template import build_model_b
+from model_cache import cached_build
+from results import PlanResult
+from result_writer import scenario_id, completed_ids, stream_to_file, read_results, DEFAULT_CHUNK_SIZE
 
 
-def create_model(data):
+def create_model(data, cache=None):
     # Extract supplier data as separate arrays
+    supplier_data = get_supplier_data(data)
     months, chromium_content, nickel_content, max_supply, procurement_costs, \
         chromium_content_ratio, nickel_content_ratio, \
-        demand, storage_costs, max_production, num_product, num_supplier = get_supplier_data(data)
-
-    # Create a mathematical model in matrix form
-    model = Model("Steel Production")
-
-    # Variables: Create decision variables for production, storage, and scrap amounts
-    P = model.addVars(num_product, months, vtype=GRB.CONTINUOUS, name="P")
-    S = model.addVars(num_product, months, vtype=GRB.CONTINUOUS, name="S")
-    X = model.addVars(num_product, num_supplier, months, vtype=GRB.CONTINUOUS, name="X")
-
-    # Objective function: Minimize total cost (procurement + storage)
-    model.setObjective(
-        quicksum(
-            procurement_costs[j] * X[i, j, t] for i in range(num_product) for j in range(num_supplier) for t in range(months)) +
-        quicksum(storage_costs[i] * S[i, t] for i in range(num_product) for t in range(months)),
-        GRB.MINIMIZE
-    )
-
-    # Constraints
-    for t in range(months):
-        # Demand satisfaction constraints
-        if t == 0:
-            for i in range(num_product):
-                model.addConstr(P[i, t] == demand[i, t] + S[i, t])
-        else:
-            for i in range(num_product):
-                model.addConstr(P[i, t] + S[i, t - 1] == demand[i, t] + S[i, t])
-
-        # Production capacity constraint
-        model.addConstr(quicksum(P[i, t] for i in range(num_product)) <= max_production)
-
-        # Supply limits constraints
-        for j in range(num_supplier):
-            model.addConstr(quicksum(X[i, j, t] for i in range(num_product)) <= max_supply[j])
-
-        # Supply-production balance
-        for i in range(num_product):
-            model.addConstr(P[i, t] == quicksum(X[i, j, t] for j in range(num_supplier)))
-
-        # Chromium content constraint
-        for i in range(num_product):
-            model.addConstr(
-                chromium_content_ratio[i] * P[i, t] == quicksum(
-                    chromium_content[j] * X[i, j, t] for j in range(num_supplier))
-            )
-
-        # Nickel content constraint
-        for i in range(num_product):
-            model.addConstr(
-                nickel_content_ratio[i] * P[i, t] == quicksum(
-                    nickel_content[j] * X[i, j, t] for j in range(num_supplier))
-            )
+        demand, storage_costs, max_production, num_product, num_supplier = supplier_data
 
-    return model, P, S, X, num_product, num_supplier, months, storage_costs, procurement_costs
+    # Create the model from the cached sparse template of this shape (same rows and names as
+    # the term-by-term formulation in main.solve_b), or load it from the model cache
+    model, (P, S, X) = cached_build("model_b", supplier_data, lambda: build_model_b(supplier_data), enabled=cache)
 
+    return model, P, S, X, num_product, num_supplier, months, storage_costs, procurement_costs
 
-def run_experiments():
-    results = []
 
-    for scenario in experimental_scenarios:
+def collect_results(scenario, total_cost, P_values, S_values, X_values, storage_costs, procurement_costs):
+    """
+    Build one result row from solution arrays P[i, t], S[i, t] and X[i, j, t]
+    """
+    if P_values is None:
+        return {
+            'Scenario': scenario_id(scenario),
+            'Max Production': scenario['max_production'],
+            'Storage Costs': scenario['storage_costs'].tolist(),
+            'Total Cost': 'No solution',
+            'Total Production': 'N/A',
+            'Total Storage': 'N/A',
+            'Total Procurement': 'N/A',
+            'Total Storage Cost': 'N/A',
+            'Total Procurement Cost': 'N/A'
+        }
+
+    return {
+        'Scenario': scenario_id(scenario),
+        'Max Production': scenario['max_production'],
+        'Storage Costs': scenario['storage_costs'].tolist(),
+        # Convert numpy array to list for Excel compatibility
+        'Total Cost': total_cost,
+        'Total Production': P_values.sum(),
+        'Total Storage': S_values.sum(),
+        'Total Procurement': X_values.sum(),
+        # Calculate total storage cost
+        'Total Storage Cost': (storage_costs[:, None] * S_values).sum(),
+        # Calculate total procurement cost
+        'Total Procurement Cost': (procurement_costs[None, :, None] * X_values).sum()
+    }
+
+
+def iter_experiments(scenarios=None, reuse_bases=True, skip_ids=(), backend="gurobi"):
+    """
+    Generator that solves the scenarios and yields one result row per scenario as it completes.
+    Scenarios whose id is in skip_ids (e.g. already in the output file) are not solved again.
+    Another backend than gurobi (see backends.py) solves the scenarios in one process per core;
+    pdhg solves all of them approximately in one batch (see pdhg.py).
+    """
+    if scenarios is None:
+        scenarios = get_experimental_scenarios()
+    if skip_ids:
+        scenarios = [scenario for scenario in scenarios if scenario_id(scenario) not in skip_ids]
+
+    if backend == "pdhg":
+        # Approximate costs from one batched first-order solve (screening)
+        from pdhg import experiment_rows
+        yield from experiment_rows(scenarios)
+        return
+    if backend != "gurobi":
+        from backends import experiment_rows
+        yield from experiment_rows(scenarios, backend)
+        return
+
+    if reuse_bases:
+        from basis_reuse import iter_basis_reuse
+        for _, row in iter_basis_reuse(scenarios):
+            yield row
+        return
+
+    for scenario in scenarios:
         model, P, S, X, num_product, num_supplier, months, storage_costs, procurement_costs = create_model(scenario)
-        model.optimize()
-
-        if model.status == GRB.OPTIMAL:
-            total_production = sum(P[i, t].x for i in range(num_product) for t in range(months))
-            total_storage = sum(S[i, t].x for i in range(num_product) for t in range(months))
-            total_procurement = sum(
-                X[i, j, t].x for i in range(num_product) for j in range(num_supplier) for t in range(months))
-
-            # Calculate total storage cost
-            total_storage_cost = sum(storage_costs[i] * S[i, t].x for i in range(num_product) for t in range(months))
-
-            # Calculate total procurement cost
-            total_procurement_cost = sum(
-                procurement_costs[j] * X[i, j, t].x for i in range(num_product) for j in range(num_supplier) for t in range(months))
-
-            results.append({
-                'Max Production': scenario['max_production'],
-                'Storage Costs': scenario['storage_costs'].tolist(),
-                # Convert numpy array to list for Excel compatibility
-                'Total Cost': model.objVal,
-                'Total Production': total_production,
-                'Total Storage': total_storage,
-                'Total Procurement': total_procurement,
-                'Total Storage Cost': total_storage_cost,
-                'Total Procurement Cost': total_procurement_cost
-            })
-        else:
-            results.append({
-                'Max Production': scenario['max_production'],
-                'Storage Costs': scenario['storage_costs'].tolist(),
-                'Total Cost': 'No solution',
-                'Total Production': 'N/A',
-                'Total Storage': 'N/A',
-                'Total Procurement': 'N/A',
-                'Total Storage Cost': 'N/A',
-                'Total Procurement Cost': 'N/A'
-            })
-
-    return pd.DataFrame(results)
-
-
-# Run the experiments and save results
-results_df = run_experiments()
-results_df.to_excel('steel_production_experiment_results.xlsx', index=False)
-print("Experiments completed. Results saved to 'steel_production_experiment_results.xlsx'.")
\ No newline at end of file
+        # The model is disposed as soon as its results are collected
+        with model:
+            warm_start.optimize(model, scenario)
+
+            if model.status == GRB.OPTIMAL:
+                plan = PlanResult.from_model(model, P, S, X)
+                row = collect_results(scenario, model.objVal, plan.production, plan.storage,
+                                      plan.procurement, storage_costs, procurement_costs)
+            else:
+                row = collect_results(scenario, None, None, None, None, storage_costs, procurement_costs)
+        yield row
+
+
+def run_experiments(scenarios=None, reuse_bases=True):
+    """
+    Solve every scenario and collect the results in a DataFrame.
+    With reuse_bases, scenarios that only change the objective are resolved from known optimal bases.
+    """
+    if scenarios is None:
+        scenarios = get_experimental_scenarios()
+
+    if reuse_bases:
+        from basis_reuse import run_experiments_with_basis_reuse
+        return run_experiments_with_basis_reuse(scenarios)
+
+    return pd.DataFrame(list(iter_experiments(scenarios, reuse_bases=False)))
+
+
+def stream_experiments(output, scenarios=None, reuse_bases=True, resume=False, chunk_size=DEFAULT_CHUNK_SIZE,
+                       backend="gurobi"):
+    """
+    Solve the scenarios and append the results to the CSV file output in chunks.
+    With resume, scenarios already in output are skipped and new rows are appended after them.
+    Returns the number of rows written by this run.
+    """
+    skip_ids = completed_ids(output) if resume else set()
+    if skip_ids:
+        print(f"Resuming: {len(skip_ids)} scenarios already in {output}")
+    return stream_to_file(iter_experiments(scenarios, reuse_bases, skip_ids, backend), output, chunk_size, resume)
+
+
+if __name__ == "__main__":
+    # Run the experiments, checkpointing the results to CSV, and save the final table
+    stream_experiments('steel_production_experiment_results.csv')
+    read_results('steel_production_experiment_results.csv').to_excel('steel_production_experiment_results.xlsx',
+                                                                     index=False)
+    print("Experiments completed. Results saved to 'steel_production_experiment_results.xlsx'.")
+    stats = warm_start.warm_start_stats()
+    if stats["solves"]:
+        print(f"Warm start hit rate: {stats['hit_rate']:.1%} ({stats['hits']}/{stats['solves']}), "
+              f"estimated time saved: {stats['time_saved']:.2f}s over {stats['timed_hits']} hits")
+    peak = peak_memory_mb()
+    if peak is not None:
+        print(f"Peak resident memory: {peak:.1f} MB")
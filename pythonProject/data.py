@@ -1,5 +1,7 @@
 import numpy as np
 import itertools
+import functools
+from scenarios import make_patch, materialize
 
 
 # Define function to extract supplier data into separate matrices
@@ -55,221 +57,136 @@ data_b = {
 }
 
 
+# Scenarios below are written as data_b plus a patch of the changed fields only.
+# Unchanged arrays are shared with data_b as read-only views (see scenarios.py).
+
 # Data for experimental test
-data_exp = {
-    "months": 12,  # Number of months
-    "storage_costs": np.array([20, 10, 5]),  # Storage costs for 18/10, 18/8, and 18/0
-    "max_production": 100,  # Maximum production capacity per month
-    "demand": {  # Demand for each type (18/10, 18/8, 18/0)
-        "18_10": np.array([10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
-        "18_8": np.array([10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
-        "18_0": np.array([10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
-    },
-    "suppliers": {
-        "A": [0.18, 0.00, 0.00, 90, 5],
-        "B": [0.25, 0.15, 0.04, 30, 10],
-        "C": [0.15, 0.10, 0.02, 50, 9],
-        "D": [0.14, 0.16, 0.05, 70, 7],
-        "E": [0.00, 0.10, 0.03, 20, 8.5],
-    },  # Supplier matrix
-    "chromium_content_ratio": np.array([0.18, 0.18, 0.18]),  # Chromium content ratio
-    "nickel_content_ratio": np.array([0.1, 0.08, 0]),  # Nickel content ratio
-    "Product set": 3,  # Kinds of products
-    "Supplier set": 5,  # Kinds of suppliers
-}
+data_exp = materialize(data_b, make_patch({
+    "demand.18_10": [10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    "demand.18_8": [10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    "demand.18_0": [10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+}))
 
 
 # Data used in question c verification
+# (cost and RHS variants can also be predicted from one data_b solve with sensitivity.py, see main.py)
 # Objective function parameter: Increase the storage cost of 18/0 product from 5 to 20
-data_c1 = {
-    "months": 12,  # Number of months
-    "storage_costs": np.array([20, 10, 20]),  # Storage costs for 18/10, 18/8, and 18/0
-    "max_production": 100,  # Maximum production capacity per month
-    "demand": {  # Demand for each type (18/10, 18/8, 18/0)
-        "18_10": np.array([25, 25, 0, 0, 0, 50, 12, 0, 10, 10, 45, 99]),
-        "18_8": np.array([10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10]),
-        "18_0": np.array([5, 20, 80, 25, 50, 125, 150, 80, 40, 35, 3, 100]),
-    },
-    "suppliers": {
-        "A": [0.18, 0.00, 0.00, 90, 5],
-        "B": [0.25, 0.15, 0.04, 30, 10],
-        "C": [0.15, 0.10, 0.02, 50, 9],
-        "D": [0.14, 0.16, 0.05, 70, 7],
-        "E": [0.00, 0.10, 0.03, 20, 8.5],
-    },  # Supplier matrix
-    "chromium_content_ratio": np.array([0.18, 0.18, 0.18]),  # Chromium content ratio
-    "nickel_content_ratio": np.array([0.1, 0.08, 0]),  # Nickel content ratio
-    "Product set": 3,  # Kinds of products
-    "Supplier set": 5,  # Kinds of suppliers
-}
+data_c1 = materialize(data_b, make_patch({
+    "storage_costs": [20, 10, 20],  # Storage costs for 18/10, 18/8, and 18/0
+}))
 
 
 # Objective function parameter: Decrease the supplier procurement cost of supplier B from 10 to 1
-data_c2 = {
-    "months": 12,  # Number of months
-    "storage_costs": np.array([20, 10, 5]),  # Storage costs for 18/10, 18/8, and 18/0
-    "max_production": 100,  # Maximum production capacity per month
-    "demand": {  # Demand for each type (18/10, 18/8, 18/0)
-        "18_10": np.array([25, 25, 0, 0, 0, 50, 12, 0, 10, 10, 45, 99]),
-        "18_8": np.array([10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10]),
-        "18_0": np.array([5, 20, 80, 25, 50, 125, 150, 80, 40, 35, 3, 100]),
-    },
-    "suppliers": {
-        "A": [0.18, 0.00, 0.00, 90, 5],
-        "B": [0.25, 0.15, 0.04, 30, 1],
-        "C": [0.15, 0.10, 0.02, 50, 9],
-        "D": [0.14, 0.16, 0.05, 70, 7],
-        "E": [0.00, 0.10, 0.03, 20, 8.5],
-    },  # Supplier matrix
-    "chromium_content_ratio": np.array([0.18, 0.18, 0.18]),  # Chromium content ratio
-    "nickel_content_ratio": np.array([0.1, 0.08, 0]),  # Nickel content ratio
-    "Product set": 3,  # Kinds of products
-    "Supplier set": 5,  # Kinds of suppliers
-}
+data_c2 = materialize(data_b, make_patch({
+    "suppliers.B": [0.25, 0.15, 0.04, 30, 1],
+}))
 
 
 # Functional parameter test: Produce only 1kg 25/0 product in the first month \
 #                       to test whether the model can output pure chromium
-data_c3 = {
-    "months": 12,  # Number of months
-    "storage_costs": np.array([20, 10, 5]),  # Storage costs for 18/10, 18/8, and 18/0
-    "max_production": 100,  # Maximum production capacity per month
-    "demand": {  # Demand for each type (18/10, 18/8, 18/0)
-        "18_10": np.array([0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
-        "18_8": np.array([0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
-        "18_0": np.array([1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
-    },
-    "suppliers": {
-        "A": [0.18, 0.00, 0.00, 90, 5],
-        "B": [0.25, 0.15, 0.04, 30, 10],
-        "C": [0.15, 0.10, 0.02, 50, 9],
-        "D": [0.14, 0.16, 0.05, 70, 7],
-        "E": [0.00, 0.10, 0.03, 20, 8.5],
-    },  # Supplier matrix
-    "chromium_content_ratio": np.array([0.18, 0.18, 0.25]),  # Chromium content ratio
-    "nickel_content_ratio": np.array([0.1, 0.08, 0]),  # Nickel content ratio
-    "Product set": 3,  # Kinds of products
-    "Supplier set": 5,  # Kinds of suppliers
-}
+data_c3 = materialize(data_b, make_patch({
+    "demand.18_10": [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    "demand.18_8": [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    "demand.18_0": [1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    "chromium_content_ratio": [0.18, 0.18, 0.25],  # Chromium content ratio
+}))
 
 
 # Functional parameter test: Adjust supply to have only two suppliers supplying pure metal material \
 # (25% chromium for supplier A and 18% nickel for supplier E)
-data_c4 = {
-    "months": 12,  # Number of months
-    "storage_costs": np.array([20, 10, 5]),  # Storage costs for 18/10, 18/8, and 18/0
-    "max_production": 100,  # Maximum production capacity per month
-    "demand": {  # Demand for each type (18/10, 18/8, 18/0)
-        "18_10": np.array([25, 25, 0, 0, 0, 50, 12, 0, 10, 10, 45, 99]),
-        "18_8": np.array([10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10]),
-        "18_0": np.array([5, 20, 80, 25, 50, 125, 150, 80, 40, 35, 3, 100]),
-    },
-    "suppliers": {
-        "A": [0.25, 0.00, 0.00, 100, 5],
-        "B": [0, 0, 0.04, 30, 10],
-        "C": [0, 0, 0.02, 50, 9],
-        "D": [0, 0, 0.05, 70, 7],
-        "E": [0.00, 0.18, 0, 100, 8.5],
-    },  # Supplier matrix
-    "chromium_content_ratio": np.array([0.18, 0.18, 0.18]),  # Chromium content ratio
-    "nickel_content_ratio": np.array([0.1, 0.08, 0]),  # Nickel content ratio
-    "Product set": 3,  # Kinds of products
-    "Supplier set": 5,  # Kinds of suppliers
-}
+data_c4 = materialize(data_b, make_patch({
+    "suppliers.A": [0.25, 0.00, 0.00, 100, 5],
+    "suppliers.B": [0, 0, 0.04, 30, 10],
+    "suppliers.C": [0, 0, 0.02, 50, 9],
+    "suppliers.D": [0, 0, 0.05, 70, 7],
+    "suppliers.E": [0.00, 0.18, 0, 100, 8.5],
+}))
 
 
 # RHS parameter test: Increase the maximum production capacity from 100 to 1000
-data_c5 = {
-    "months": 12,  # Number of months
-    "storage_costs": np.array([20, 10, 5]),  # Storage costs for 18/10, 18/8, and 18/0
+data_c5 = materialize(data_b, make_patch({
     "max_production": 1000,  # Maximum production capacity per month
-    "demand": {  # Demand for each type (18/10, 18/8, 18/0)
-        "18_10": np.array([25, 25, 0, 0, 0, 50, 12, 0, 10, 10, 45, 99]),
-        "18_8": np.array([10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10]),
-        "18_0": np.array([5, 20, 80, 25, 50, 125, 150, 80, 40, 35, 3, 100]),
-    },
-    "suppliers": {
-        "A": [0.18, 0.00, 0.00, 90, 5],
-        "B": [0.25, 0.15, 0.04, 30, 10],
-        "C": [0.15, 0.10, 0.02, 50, 9],
-        "D": [0.14, 0.16, 0.05, 70, 7],
-        "E": [0.00, 0.10, 0.03, 20, 8.5],
-    },  # Supplier matrix
-    "chromium_content_ratio": np.array([0.18, 0.18, 0.18]),  # Chromium content ratio
-    "nickel_content_ratio": np.array([0.1, 0.08, 0]),  # Nickel content ratio
-    "Product set": 3,  # Kinds of products
-    "Supplier set": 5,  # Kinds of suppliers
-}
+}))
 
 
 # RHS parameter test: Increase the maximum supply from supplier A from 90 to 900
-data_c6 = {
-    "months": 12,  # Number of months
-    "storage_costs": np.array([20, 10, 5]),  # Storage costs for 18/10, 18/8, and 18/0
-    "max_production": 100,  # Maximum production capacity per month
-    "demand": {  # Demand for each type (18/10, 18/8, 18/0)
-        "18_10": np.array([25, 25, 0, 0, 0, 50, 12, 0, 10, 10, 45, 99]),
-        "18_8": np.array([10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10, 10]),
-        "18_0": np.array([5, 20, 80, 25, 50, 125, 150, 80, 40, 35, 3, 100]),
-    },
-    "suppliers": {
-        "A": [0.18, 0.00, 0.00, 900, 5],
-        "B": [0.25, 0.15, 0.04, 30, 10],
-        "C": [0.15, 0.10, 0.02, 50, 9],
-        "D": [0.14, 0.16, 0.05, 70, 7],
-        "E": [0.00, 0.10, 0.03, 20, 8.5],
-    },  # Supplier matrix
-    "chromium_content_ratio": np.array([0.18, 0.18, 0.18]),  # Chromium content ratio
-    "nickel_content_ratio": np.array([0.1, 0.08, 0]),  # Nickel content ratio
-    "Product set": 3,  # Kinds of products
-    "Supplier set": 5,  # Kinds of suppliers
-}
+data_c6 = materialize(data_b, make_patch({
+    "suppliers.A": [0.18, 0.00, 0.00, 900, 5],
+}))
 
 
 # RHS parameter test: Verification with a demand of Jan [10,10,10] and Feb-Dec zero
-data_c7 = {
-    "months": 12,  # Number of months
-    "storage_costs": np.array([20, 10, 5]),  # Storage costs for 18/10, 18/8, and 18/0
-    "max_production": 100,  # Maximum production capacity per month
-    "demand": {  # Demand for each type (18/10, 18/8, 18/0)
-        "18_10": np.array([10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
-        "18_8": np.array([10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
-        "18_0": np.array([10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]),
-    },
-    "suppliers": {
-        "A": [0.18, 0.00, 0.00, 90, 5],
-        "B": [0.25, 0.15, 0.04, 30, 10],
-        "C": [0.15, 0.10, 0.02, 50, 9],
-        "D": [0.14, 0.16, 0.05, 70, 7],
-        "E": [0.00, 0.10, 0.03, 20, 8.5],
-    },  # Supplier matrix
-    "chromium_content_ratio": np.array([0.18, 0.18, 0.18]),  # Chromium content ratio
-    "nickel_content_ratio": np.array([0.1, 0.08, 0]),  # Nickel content ratio
-    "Product set": 3,  # Kinds of products
-    "Supplier set": 5,  # Kinds of suppliers
-}
+data_c7 = materialize(data_b, make_patch({
+    "demand.18_10": [10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    "demand.18_8": [10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+    "demand.18_0": [10, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+}))
 
 
 # d: experiment
 # Experimental scenarios
-experimental_scenarios = []
-
 # Define experiment parameters
 max_production_values = [95, 100, 120, 150, 200]
 storage_cost_base = np.array([20, 10, 5])
 storage_cost_multipliers = [0.1, 0.5, 1.0, 2.0, 5.0]
 
-# Generate scenarios
-for max_prod in max_production_values:
-    for cost_multipliers in itertools.product(storage_cost_multipliers, repeat=3):
-        scenario = data_b.copy()
-        scenario['max_production'] = max_prod
-        scenario['storage_costs'] = np.array([
-            storage_cost_base[0] * cost_multipliers[0],
-            storage_cost_base[1] * cost_multipliers[1],
-            storage_cost_base[2] * cost_multipliers[2]
-        ])
-        experimental_scenarios.append(scenario)
+# Generate scenarios (data_b with a patch of max production and storage costs)
+def get_experimental_patches():
+    """Patches of the experiment grid (max production x storage cost multipliers) over data_b"""
+    patches = []
+    for max_prod in max_production_values:
+        for cost_multipliers in itertools.product(storage_cost_multipliers, repeat=3):
+            patches.append(make_patch({
+                'max_production': max_prod,
+                'storage_costs': storage_cost_base * np.array(cost_multipliers),
+            }))
+    return patches
+
+
+@functools.lru_cache(maxsize=None)
+def _experimental_scenarios():
+    return [materialize(data_b, patch) for patch in get_experimental_patches()]
+
+
+def get_experimental_scenarios():
+    """The experiment grid as scenario dictionaries; built on first use, not at import"""
+    return list(_experimental_scenarios())
+
+
+def __getattr__(name):
+    # Keep 'from data import experimental_scenarios' working without building the grid at import
+    if name == "experimental_scenarios":
+        return get_experimental_scenarios()
+    if name == "experimental_patches":
+        return get_experimental_patches()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def synthetic_catalog(base, num_suppliers, num_grades=60, seed=0):
+    """
+    Scenario with a large catalog of scrap lots: the suppliers of base followed by random lots of
+    num_grades compositions (rounded to whole percents), each lot with its own supply and price.
+    Used to benchmark presolve and column generation on catalogs of realistic size.
+    """
+    rng = np.random.default_rng(seed)
+    # Grades: chromium and nickel bearing scrap, some of it without nickel or copper
+    chromium = np.round(rng.uniform(0.10, 0.30, num_grades) * (rng.random(num_grades) > 0.1), 2)
+    nickel = np.round(rng.uniform(0.02, 0.20, num_grades) * (rng.random(num_grades) > 0.3), 2)
+    copper = np.round(rng.uniform(0.0, 0.05, num_grades) * (rng.random(num_grades) > 0.3), 2)
+    price = 4 + 30 * nickel + 10 * chromium - 20 * copper
+
+    suppliers = dict(base["suppliers"])
+    grades = rng.integers(num_grades, size=max(num_suppliers - len(suppliers), 0))
+    supply = rng.integers(5, 60, size=grades.size)
+    markup = rng.uniform(0.9, 1.4, size=grades.size)
+    for k, (grade, amount, factor) in enumerate(zip(grades, supply, markup)):
+        suppliers[f"L{k + 1:05d}"] = [chromium[grade], nickel[grade], copper[grade], int(amount),
+                                      round(float(price[grade] * factor), 2)]
+
+    scenario = dict(base)
+    scenario["suppliers"] = suppliers
+    scenario["Supplier set"] = len(suppliers)
+    return scenario
 
 
 def get_supplier_data_e(data):
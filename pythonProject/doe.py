@@ -0,0 +1,457 @@
+"""
+Space-filling designs of experiments over scenario axes, as a replacement for full factorial grids.
+
+An axis is a scalar parameter of a scenario with its range, {name: (low, high)} or
+{name: (low, high, "log")} for axes sampled on a log scale, or with the list of the only values it
+takes, {name: [95, 100, 120]} (each value gets an equal share of the unit interval). Names:
+    max_production, copper_limit, ...  number fields of the scenario (see scenarios.SCENARIO_FIELDS)
+    storage_costs[1]                   one component of a vector field
+    suppliers.B[4]                     one value of a supplier row (Cr, Ni, Cu, max supply, cost)
+    demand_scale                       factor applied to every demand series
+A design (Latin hypercube, Sobol or adaptive) is solved with model_b and produces the usual result
+rows, with the plan of every solved point kept. The metrics of a scenario are then predicted in two
+ways:
+    plan reuse        the cheapest stored plan that is feasible for the scenario, at the scenario's
+                      costs. Axes that only change costs (storage costs, supplier prices) keep every
+                      plan feasible, and the LP optimum is one of finitely many plans, so this is
+                      exact once the design has met that plan, and an upper bound otherwise.
+    response surface  an RBF fitted to the design rows, for scenarios no stored plan is feasible for.
+The full experiment grid, whose heatmaps then come from far fewer solves, is the main use.
+"""
+import re
+import time
+import itertools
+
+import numpy as np
+import pandas as pd
+from gurobipy import GRB
+from scipy.stats import qmc
+from scipy.interpolate import RBFInterpolator
+
+from scenarios import make_patch, materialize
+from result_writer import scenario_id
+
+# Metrics fitted by default (the values shown in the heatmaps of Plot.py)
+RESPONSE_METRICS = ['Total Cost', 'Total Storage Cost', 'Total Procurement Cost']
+
+# Metrics predicted as the sum of the surfaces of their parts (more accurate than a surface of their own)
+RESPONSE_SUMS = {'Total Cost': ('Total Storage Cost', 'Total Procurement Cost')}
+
+# Largest relative error of a heatmap cell for which compare_with_grid counts the heatmaps as reproduced
+HEATMAP_TOLERANCE = 0.05
+
+# Feasibility tolerance (relative to the right-hand side) of a stored plan in another scenario
+FEASIBILITY_TOL = 1e-6
+
+# Kernel of the response surface; with degree 1 it reproduces linear responses exactly
+RBF_KERNEL = 'cubic'
+
+_COMPONENT = re.compile(r'^(.+)\[(\d+)\]$')
+
+# Axes that only change objective coefficients: every plan stays feasible along them
+_COST_AXIS = re.compile(r'^(storage_costs\[\d+\]|suppliers\.[^.]+\[4\])$')
+
+
+def _parse_axes(axes):
+    """Axes as a list of (name, low, high, log, levels); levels is None for a continuous axis"""
+    parsed = []
+    for name, spec in axes.items():
+        if isinstance(spec, list):
+            levels = np.unique(np.asarray(spec, dtype=float))
+            if len(levels) < 2:
+                raise ValueError(f"{name}: a level axis needs at least two values")
+            parsed.append((name, levels[0], levels[-1], False, levels))
+            continue
+        low, high = float(spec[0]), float(spec[1])
+        log = len(spec) > 2 and spec[2] == "log"
+        if not low < high:
+            raise ValueError(f"{name}: empty range ({low}, {high})")
+        if log and low <= 0:
+            raise ValueError(f"{name}: a log axis needs a positive lower bound")
+        parsed.append((name, low, high, log, None))
+    return parsed
+
+
+def to_unit(axes, points):
+    """Design points (DataFrame or array, one column per axis) mapped to the unit cube"""
+    points = np.asarray(points[list(axes)] if isinstance(points, pd.DataFrame) else points, dtype=float)
+    unit = np.empty_like(points)
+    for k, (_, low, high, log, levels) in enumerate(_parse_axes(axes)):
+        if levels is not None:
+            nearest = np.abs(points[:, k][:, None] - levels[None, :]).argmin(axis=1)
+            unit[:, k] = (nearest + 0.5) / len(levels)
+        elif log:
+            unit[:, k] = (np.log(points[:, k]) - np.log(low)) / (np.log(high) - np.log(low))
+        else:
+            unit[:, k] = (points[:, k] - low) / (high - low)
+    return unit
+
+
+def from_unit(axes, unit):
+    """Unit cube samples as a design DataFrame (one column per axis)"""
+    unit = np.atleast_2d(unit)
+    columns = {}
+    for k, (name, low, high, log, levels) in enumerate(_parse_axes(axes)):
+        if levels is not None:
+            columns[name] = levels[np.minimum((unit[:, k] * len(levels)).astype(int), len(levels) - 1)]
+        elif log:
+            columns[name] = np.exp(np.log(low) + unit[:, k] * (np.log(high) - np.log(low)))
+        else:
+            columns[name] = low + unit[:, k] * (high - low)
+    return pd.DataFrame(columns)
+
+
+def latin_hypercube(axes, n, seed=0):
+    """n points of an optimized Latin hypercube over the axes"""
+    sampler = qmc.LatinHypercube(d=len(axes), optimization="random-cd", seed=seed)
+    return from_unit(axes, sampler.random(n))
+
+
+def sobol(axes, n, seed=0):
+    """First n points of a scrambled Sobol sequence over the axes (balanced when n is a power of 2)"""
+    sampler = qmc.Sobol(d=len(axes), scramble=True, seed=seed)
+    return from_unit(axes, sampler.random_base2(int(np.ceil(np.log2(max(n, 1)))))[:n])
+
+
+def corners(axes):
+    """
+    The corners of the box, where a space-filling fit would extrapolate: both ends of every continuous
+    axis combined with every value of the level axes (which have no interior to fill)
+    """
+    parsed = _parse_axes(axes)
+    ends = [[(k + 0.5) / len(levels) for k in range(len(levels))] if levels is not None else [0.0, 1.0]
+            for *_, levels in parsed]
+    return from_unit(axes, np.array(list(itertools.product(*ends))))
+
+
+def space_filling(axes, n, method="lhs", seed=0, include_corners=True):
+    """Design of n points: the box corners (if include_corners) filled up by a Latin hypercube or Sobol points"""
+    sampler = latin_hypercube if method == "lhs" else sobol
+    if not include_corners:
+        return sampler(axes, n, seed)
+    box = corners(axes)
+    if n < len(box):
+        raise ValueError(f"{n} points do not cover the {len(box)} corners of the axes")
+    return pd.concat([box, sampler(axes, n - len(box), seed)], ignore_index=True)
+
+
+def _base_value(base, field):
+    if "." in field:
+        group, name = field.split(".", 1)
+        return base[group][name]
+    return base[field]
+
+
+def axis_value(scenario, name, base=None):
+    """Value of an axis in a scenario (demand_scale relative to the total demand of base)"""
+    if name == "demand_scale":
+        total = sum(np.sum(series) for series in scenario["demand"].values())
+        return total / sum(np.sum(series) for series in base["demand"].values())
+    match = _COMPONENT.match(name)
+    if match:
+        return float(_base_value(scenario, match.group(1))[int(match.group(2))])
+    return float(_base_value(scenario, name))
+
+
+def scenario_from_point(base, point):
+    """Scenario dictionary base + the axis values of one design point ({axis: value})"""
+    changes = {}
+    for name, value in point.items():
+        value = float(value)
+        if name == "demand_scale":
+            for product, series in base["demand"].items():
+                changes[f"demand.{product}"] = np.asarray(series) * value
+            continue
+        match = _COMPONENT.match(name)
+        if match:
+            field, k = match.group(1), int(match.group(2))
+            current = list(changes.get(field, _base_value(base, field)))
+            current[k] = value
+            changes[field] = current
+        else:
+            changes[name] = value
+    return materialize(base, make_patch(changes))
+
+
+def _solve_plan(scenario, backend):
+    """Result row (d_test.collect_results format) and solution vector (None if unsolved) of one scenario"""
+    from backends import plan_arrays, problem_b, solve
+    from d_test import collect_results
+    from data import get_supplier_data
+
+    data = get_supplier_data(scenario)
+    problem = problem_b(data)
+    result = solve(problem, backend)
+    if not result["optimal"]:
+        return collect_results(scenario, None, None, None, None, data[8], data[4]), None
+    plan = plan_arrays(problem, result["x"])
+    return collect_results(scenario, result["objective"], plan["P"], plan["S"], plan["X"], data[8], data[4]), \
+        result["x"]
+
+
+def run_design(design, base=None, backend="gurobi"):
+    """
+    Solve every point of the design and return its result rows (d_test.iter_experiments format)
+    with the axis values in front and the solution vector in the column 'Solution' (None if unsolved)
+    """
+    if base is None:
+        from data import data_b
+        base = data_b
+    design = design.reset_index(drop=True)
+    solved = [_solve_plan(scenario_from_point(base, point), backend) for point in design.to_dict("records")]
+    results = pd.DataFrame([row for row, _ in solved])
+    results['Solution'] = [x for _, x in solved]
+    return pd.concat([design, results], axis=1)
+
+
+def _metric_values(results, metric):
+    # 'No solution' rows become NaN and are left out of the fit
+    return pd.to_numeric(results[metric], errors='coerce').to_numpy(dtype=float)
+
+
+def _surface(unit, values):
+    """Interpolator of values at the unit cube points; positive responses are fitted on a log scale"""
+    if np.all(values > 0):
+        surface = RBFInterpolator(unit, np.log(values), kernel=RBF_KERNEL, degree=1)
+        return lambda points: np.exp(surface(points))
+    return RBFInterpolator(unit, values, kernel=RBF_KERNEL, degree=1)
+
+
+def fit_response(axes, results, metrics=RESPONSE_METRICS):
+    """
+    Response surface {metric: function of unit cube points} from the solved design points.
+    A metric of RESPONSE_SUMS whose parts are fitted as well is predicted as their sum.
+    """
+    unit = to_unit(axes, results)
+    sums = {metric: parts for metric, parts in RESPONSE_SUMS.items()
+            if metric in metrics and all(part in metrics for part in parts)}
+    response = {}
+    for metric in [metric for metric in metrics if metric not in sums]:
+        values = _metric_values(results, metric)
+        solved = np.isfinite(values)
+        if solved.sum() <= len(axes) + 1:
+            raise ValueError(f"{metric}: {solved.sum()} solved points are too few for {len(axes)} axes")
+        response[metric] = _surface(unit[solved], values[solved])
+    for metric, parts in sums.items():
+        response[metric] = lambda points, parts=parts: sum(response[part](points) for part in parts)
+    return {metric: response[metric] for metric in metrics}
+
+
+def predict(axes, response, points):
+    """Predicted metrics at the points (DataFrame with one column per axis)"""
+    unit = to_unit(axes, points)
+    return pd.DataFrame({metric: surface(unit) for metric, surface in response.items()}, index=points.index)
+
+
+def cost_axes(axes):
+    """The axes that only change objective coefficients (storage costs, supplier prices)"""
+    return [name for name in axes if _COST_AXIS.match(name)]
+
+
+def lower_bounds(axes, results, points, metric='Total Cost'):
+    """
+    Lower bounds of the optimal cost at the points from the solved design points: the LP optimum is
+    concave in the objective coefficients, so at least the best convex combination of the solved
+    costs of the points with the same values of all other axes. -inf outside their convex hull.
+    """
+    from scipy.optimize import linprog
+
+    costs, others = cost_axes(axes), [name for name in axes if not _COST_AXIS.match(name)]
+    values = _metric_values(results, metric)
+    solved = results[np.isfinite(values)]
+    values = values[np.isfinite(values)]
+    keys = [tuple(row) for row in solved[others].to_numpy(dtype=float)]
+    bounds = np.full(len(points), -np.inf)
+    for k, point in enumerate(points.to_dict("records")):
+        key = tuple(float(point[name]) for name in others)
+        members = [i for i, other in enumerate(keys) if other == key]
+        if not members or not costs:
+            continue
+        A = np.vstack([solved.iloc[members][costs].to_numpy(dtype=float).T, np.ones(len(members))])
+        b = np.append([point[name] for name in costs], 1.0)
+        result = linprog(-values[members], A_eq=A, b_eq=b, bounds=(0, None), method="highs")
+        if result.status == 0:
+            bounds[k] = -result.fun
+    return bounds
+
+
+def adaptive_design(axes, scenarios=None, base=None, batch=8, budget=64, candidates=512, tolerance=1e-6, seed=0,
+                    backend="gurobi"):
+    """
+    Sequential design: start from the corners (every level of the level axes), then solve batches
+    of the candidate scenarios (default: candidates Sobol points of the box) where the cost is least
+    certain: the gap between plan reuse (an upper bound) and lower_bounds. Candidates without a
+    finite gap come first, the ones farthest from the solved points among them. Stops at budget
+    points or when every gap is within tolerance (relative). Returns the result rows of all points
+    (run_design format).
+    """
+    if base is None:
+        from data import data_b
+        base = data_b
+    if scenarios is None:
+        pool = from_unit(axes, qmc.Sobol(d=len(axes), scramble=True, seed=seed).random(candidates))
+        scenarios = [scenario_from_point(base, point) for point in pool.to_dict("records")]
+    points = pd.DataFrame([{name: axis_value(scenario, name, base) for name in axes} for scenario in scenarios])
+    points = from_unit(axes, to_unit(axes, points))  # level axes snapped to their values
+
+    results = run_design(corners(axes), base, backend)
+    round_number = 0
+    while len(results) < budget:
+        rows = reuse_plans(results, scenarios)
+        upper = np.array([row['Total Cost'] if row is not None else np.inf for row in rows])
+        gap = (upper - lower_bounds(axes, results, points)) / np.maximum(1.0, np.abs(upper))
+        gap = np.where(np.isnan(gap), np.inf, gap)
+        if gap.max() <= tolerance:
+            break
+        distance = np.linalg.norm(to_unit(axes, points)[:, None, :] - to_unit(axes, results)[None, :, :],
+                                  axis=2).min(axis=1)
+        chosen = np.lexsort((-distance, -gap))[:min(batch, budget - len(results))]
+
+        round_number += 1
+        results = pd.concat([results, run_design(points.iloc[chosen], base, backend)], ignore_index=True)
+        print(f"Round {round_number}: {len(results)} points, {int((gap > tolerance).sum())} uncertain "
+              f"scenarios, largest finite gap {gap[np.isfinite(gap)].max(initial=0.0):.2%}")
+    return results
+
+
+def grid_axes():
+    """
+    Axes spanning the experiment grid of data.py: its max production levels (a plan solved between
+    two levels would store more than needed at the upper one) and storage costs on a log scale
+    like the multipliers
+    """
+    from data import max_production_values, storage_cost_base, storage_cost_multipliers
+
+    axes = {'max_production': list(max_production_values)}
+    for i, cost in enumerate(storage_cost_base):
+        axes[f'storage_costs[{i}]'] = (cost * min(storage_cost_multipliers), cost * max(storage_cost_multipliers), "log")
+    return axes
+
+
+def reuse_plans(results, scenarios, tol=FEASIBILITY_TOL):
+    """
+    Result rows of the scenarios from the plans of solved design points (run_design rows): the
+    cheapest plan that is feasible for the scenario, at the scenario's costs. None for a scenario
+    no stored plan is feasible for.
+    """
+    from backends import plan_arrays, problem_b
+    from d_test import collect_results
+    from data import get_supplier_data
+
+    plans = [x for x in results['Solution'] if x is not None]
+    rows = []
+    for scenario in scenarios:
+        data = get_supplier_data(scenario)
+        problem = problem_b(data)
+        candidates = [x for x in plans if len(x) == problem["A"].shape[1]]
+        if not candidates:
+            rows.append(None)
+            continue
+        X = np.column_stack(candidates)
+        activity, b = problem["A"] @ X, problem["b"][:, None]
+        slack = tol * np.maximum(1.0, np.abs(b))
+        sense = problem["sense"][:, None]
+        feasible = np.where(sense == GRB.LESS_EQUAL, activity <= b + slack,
+                            np.where(sense == GRB.GREATER_EQUAL, activity >= b - slack, np.abs(activity - b) <= slack))
+        feasible = feasible.all(axis=0) & np.all((X >= problem["lb"][:, None] - tol)
+                                                 & (X <= problem["ub"][:, None] + tol), axis=0)
+        if not feasible.any():
+            rows.append(None)
+            continue
+        cost = np.where(feasible, problem["c"] @ X, np.inf)
+        k = int(np.argmin(cost))
+        plan = plan_arrays(problem, X[:, k])
+        rows.append(collect_results(scenario, float(cost[k]), plan["P"], plan["S"], plan["X"], data[8], data[4]))
+    return rows
+
+
+def predicted_results(axes, response, scenarios, base=None, results=None):
+    """
+    Result rows predicted for the scenarios, with the per-product storage cost columns of
+    Plot.load_results, so Plot.aggregate_heatmaps and the other figures work on them unchanged.
+    With the design results, scenarios a stored plan is feasible for are predicted by plan reuse,
+    the others by the response surface ('Predicted by' column).
+    """
+    from Plot import PRODUCTS
+
+    points = pd.DataFrame([{name: axis_value(scenario, name, base) for name in axes} for scenario in scenarios])
+    frame = pd.DataFrame({
+        'Scenario': [scenario_id(scenario) for scenario in scenarios],
+        'Max Production': [scenario['max_production'] for scenario in scenarios],
+        'Storage Costs': [np.asarray(scenario['storage_costs']) for scenario in scenarios],
+    })
+    for k, product in enumerate(PRODUCTS):
+        frame[f'Storage Cost {product}'] = frame['Storage Costs'].apply(lambda x: x[k])
+    metrics = predict(axes, response, points)
+    metrics['Predicted by'] = 'surface'
+    if results is not None and 'Solution' in results:
+        for k, row in enumerate(reuse_plans(results, scenarios)):
+            if row is not None:
+                metrics.loc[k, list(response)] = [row[metric] for metric in response]
+                metrics.loc[k, 'Predicted by'] = 'plan'
+    return pd.concat([frame, metrics], axis=1)
+
+
+def compare_with_grid(num_points=64, method="adaptive", seed=0, reference=None, backend="gurobi"):
+    """
+    Solve a design of num_points over the experiment grid's box, predict all grid scenarios (plan
+    reuse, else the response surface) and compare with the exact full factorial results (reference:
+    a DataFrame of d_test.run_experiments rows; solved here when not given). Prints and returns a
+    summary with the errors per scenario and per heatmap cell; summary["not reproduced"] lists the
+    metrics whose heatmaps are off by more than HEATMAP_TOLERANCE in some cell.
+    """
+    from data import get_experimental_scenarios
+    from d_test import run_experiments
+    from Plot import PRODUCTS, aggregate_heatmaps
+
+    axes = grid_axes()
+    scenarios = get_experimental_scenarios()
+    start = time.perf_counter()
+    if method == "adaptive":
+        results = adaptive_design(axes, scenarios, budget=num_points, seed=seed, backend=backend)
+    else:
+        results = run_design(space_filling(axes, num_points, method, seed), backend=backend)
+    response = fit_response(axes, results)
+    predicted = predicted_results(axes, response, scenarios, results=results)
+    design_time = time.perf_counter() - start
+
+    if reference is None:
+        reference = run_experiments(scenarios)
+    # Matched on the grid parameters (older result files have no Scenario column)
+    def grid_key(frame):
+        return [(float(max_production), *np.round(np.asarray(costs, dtype=float), 9))
+                for max_production, costs in zip(frame['Max Production'], frame['Storage Costs'])]
+    exact = reference.set_index(pd.MultiIndex.from_tuples(grid_key(reference)))
+    exact = exact.loc[grid_key(predicted)].reset_index(drop=True)
+    for k, product in enumerate(PRODUCTS):
+        exact[f'Storage Cost {product}'] = exact['Storage Costs'].apply(lambda x: x[k])
+    for metric in RESPONSE_METRICS:
+        exact[metric] = _metric_values(exact, metric)
+
+    summary = {"design": method, "design solves": len(results), "full factorial solves": len(scenarios),
+               "design + fit + prediction [s]": design_time,
+               "predicted by plan reuse": int((predicted['Predicted by'] == 'plan').sum())}
+    exact_heatmaps, predicted_heatmaps = aggregate_heatmaps(exact), aggregate_heatmaps(predicted)
+    for metric in RESPONSE_METRICS:
+        error = np.abs(predicted[metric] - exact[metric]) / np.abs(exact[metric])
+        summary[f"{metric}: median relative error"] = float(np.nanmedian(error))
+        summary[f"{metric}: max relative error"] = float(np.nanmax(error))
+        summary[f"{metric}: heatmap cell max relative error"] = max(
+            float((np.abs(predicted_heatmaps[product, metric] - exact_heatmaps[product, metric])
+                   / np.abs(exact_heatmaps[product, metric])).to_numpy().max()) for product in PRODUCTS)
+    print(pd.Series(summary).to_string())
+    summary["not reproduced"] = [metric for metric in RESPONSE_METRICS
+                                 if summary[f"{metric}: heatmap cell max relative error"] > HEATMAP_TOLERANCE]
+    for metric in summary["not reproduced"]:
+        print(f"{metric}: heatmaps NOT reproduced (a cell is off by "
+              f"{summary[f'{metric}: heatmap cell max relative error']:.0%}); solve the full grid for this metric")
+    return summary, predicted
+
+
+def write_predicted(predicted, path):
+    """Predicted rows in the format of the experiment result file (readable by Plot.load_results)"""
+    from Plot import PRODUCTS
+
+    frame = predicted.drop(columns=[f'Storage Cost {product}' for product in PRODUCTS])
+    frame['Storage Costs'] = frame['Storage Costs'].apply(lambda x: np.asarray(x).tolist())
+    frame.to_excel(path, index=False)
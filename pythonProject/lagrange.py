@@ -0,0 +1,261 @@
+"""
+Product-wise Lagrangian decomposition of model_b for instances with many grades.
+
+Grades only interact through the monthly capacity rows (sum_i P[i,t] <= max_production[t]) and the
+supply rows (sum_i X[i,j,t] <= max_supply[j,t]). With multipliers lam[t] >= 0 and mu[j,t] >= 0 on
+them, the problem splits into one subproblem per grade: its own model_b block with P priced up by lam
+and X by mu. Each subproblem keeps the capacity and supply rows for its grade alone (valid for any
+feasible plan), which makes the bound
+    L(lam, mu) = sum_i v_i(lam, mu) - lam'max_production - sum mu * max_supply
+tighter. Subproblems are solved in parallel processes.
+
+Feasible plans are recovered from the subproblem plans collected so far: a small LP picks one convex
+combination of the plans of every grade that fits the capacity and supply rows. The best such plan
+is the upper bound; the reported gap is relative to it. The multipliers move by a stabilized
+cutting-plane (bundle) step, to a smoothed combination of the best multipliers so far and the
+prices of the recovery LP. (Plain subgradient steps rarely produce subproblem plans that combine
+into a feasible plan, so they give no upper bound.)
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from gurobipy import GRB
+
+import backends
+from model_template import compile_template, scenario_vectors
+
+# Weight of the best multipliers so far in the smoothed bundle step
+SMOOTHING = 0.5
+
+# Cost of exceeding a capacity or supply row in the recovery LP
+OVERFLOW_COST = 1e4
+
+# Relative gap at which the iterations stop
+DEFAULT_GAP = 1e-3
+
+
+def grade_params(params, i, max_production=None, max_supply=None):
+    """Template parameters of grade i alone (optionally with its own capacity and supply shares)"""
+    return {**params,
+            "chromium_ratio": np.asarray(params["chromium_ratio"])[i:i + 1],
+            "nickel_ratio": np.asarray(params["nickel_ratio"])[i:i + 1],
+            "demand": np.asarray(params["demand"])[i:i + 1],
+            "storage_costs": np.asarray(params["storage_costs"])[i:i + 1],
+            "max_production": params["max_production"] if max_production is None else max_production,
+            "max_supply": params["max_supply"] if max_supply is None else max_supply}
+
+
+# Grade parameters of a worker process (set once by _init_grades) and their matrix problems
+_grades = []
+_problems = {}
+
+
+def _init_grades(grades):
+    """Process initializer: the grade parameters are sent once, the jobs only carry the multipliers"""
+    global _grades
+    _grades = grades
+    _problems.clear()
+
+
+def _grade_problem(i):
+    """Matrix problem of grade i at its own costs, built on first use"""
+    if i not in _problems:
+        params = _grades[i]
+        template = compile_template(1, len(params["costs"]), np.shape(params["demand"])[1])
+        _problems[i] = backends.matrix_problem(template, scenario_vectors(template, params))
+    return _problems[i]
+
+
+def _solve_grade(job):
+    """Subproblem of grade i with P priced up by lam[t] and X by mu[j,t] (runs in a worker process)"""
+    i, lam, mu, backend = job
+    problem = _grade_problem(i)
+    index = problem["template"]["index"]
+    c = problem["c"].copy()
+    c[index["P"][0]] += lam
+    c[index["X"][0]] += mu
+    result = backends.solve({**problem, "c": c}, backend)
+    if not result["optimal"]:
+        return {"status": result["status"], "optimal": False}
+    x = result["x"]
+    return {"status": result["status"], "optimal": True, "value": result["objective"],
+            "cost": float(problem["c"] @ x), "P": x[index["P"][0]], "S": x[index["S"][0]], "X": x[index["X"][0]]}
+
+
+def _solve_grades(executor, jobs, workers=1):
+    if executor is None:
+        return [_solve_grade(job) for job in jobs]
+    return list(executor.map(_solve_grade, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+
+def _supply_matrix(params, months):
+    max_supply = np.asarray(params["max_supply"], dtype=float)
+    return max_supply if max_supply.ndim == 2 else np.repeat(max_supply[:, None], months, axis=1)
+
+
+def recover_plan(params, plans, backend="highs"):
+    """
+    Best convex combination of the subproblem plans collected per grade (lists of subproblem
+    results): a small LP with one weight per plan, one convexity row per grade and the capacity and
+    supply rows, made elastic by overflow columns at OVERFLOW_COST. Every combination of a grade's
+    plans is a plan of that grade, so without overflow the LP optimum is a feasible plan.
+    Returns the plan (None while overflow is needed), its cost and the multipliers of the rows.
+    """
+    num_product = len(plans)
+    months = len(plans[0][0]["P"])
+    capacity = np.broadcast_to(np.asarray(params["max_production"], dtype=float), (months,))
+    supply = _supply_matrix(params, months)
+
+    grade = np.concatenate([np.full(len(grade_plans), i) for i, grade_plans in enumerate(plans)])
+    columns = [plan for grade_plans in plans for plan in grade_plans]
+    usage = np.column_stack([np.concatenate([plan["P"], plan["X"].ravel()]) for plan in columns])
+    linking = usage.shape[0]
+    convexity = sp.csr_matrix((np.ones(len(columns)), (grade, np.arange(len(columns)))),
+                              shape=(num_product, len(columns)))
+    overflow = sp.vstack([sp.csr_matrix((num_product, linking)), -sp.identity(linking)])
+    problem = {
+        "c": np.concatenate([[plan["cost"] for plan in columns], np.full(linking, OVERFLOW_COST)]),
+        "A": sp.hstack([sp.vstack([convexity, sp.csr_matrix(usage)]), overflow], format="csr"),
+        "sense": np.array([GRB.EQUAL] * num_product + [GRB.LESS_EQUAL] * linking),
+        "b": np.concatenate([np.ones(num_product), capacity, supply.ravel()]),
+        "lb": np.zeros(len(columns) + linking),
+        "ub": np.full(len(columns) + linking, np.inf),
+        "integrality": np.zeros(len(columns) + linking, dtype=int),
+    }
+    result = backends.solve(problem, backend)
+    if not result["optimal"]:
+        raise RuntimeError(f"Recovery LP not solved: {result['status']}")
+
+    # Multipliers of the linking rows (<= rows have nonpositive duals)
+    prices = -result["duals"][num_product:]
+    lam, mu = prices[:months], prices[months:].reshape(supply.shape)
+    weights = result["x"][:len(columns)]
+    if result["x"][len(columns):].sum() > 1e-6:
+        return None, np.inf, lam, mu
+
+    plan = {}
+    for family in ("P", "S", "X"):
+        combined = np.zeros((num_product,) + columns[0][family].shape)
+        for k, column in enumerate(columns):
+            combined[grade[k]] += weights[k] * column[family]
+        plan[family] = combined
+    return plan, float(weights @ problem["c"][:len(columns)]), lam, mu
+
+
+def decompose(params, backend="highs", iterations=50, gap=DEFAULT_GAP, workers=None, verbose=True):
+    """
+    Lagrangian decomposition of model_b over its grades (template parameters with demand of shape
+    grades x months). The multipliers move to a smoothed combination of the best ones so far and the
+    prices of the recovery LP (stabilized cutting planes). Returns lower bound, upper bound (cost of
+    the best recovered plan), gap, the plan, the multipliers and the iteration history.
+    """
+    demand = np.asarray(params["demand"], dtype=float)
+    num_product, months = demand.shape
+    capacity = np.broadcast_to(np.asarray(params["max_production"], dtype=float), (months,))
+    supply = _supply_matrix(params, months)
+    grades = [grade_params(params, i) for i in range(num_product)]
+
+    lam, mu = np.zeros(months), np.zeros_like(supply)
+    center = (lam, mu)
+    plans = [[] for _ in range(num_product)]
+    lower, upper, plan = -np.inf, np.inf, None
+    history = []
+
+    workers = workers or os.cpu_count() or 1
+    executor = None
+    if workers > 1 and num_product > 1:
+        executor = ProcessPoolExecutor(max_workers=min(workers, num_product), initializer=_init_grades,
+                                       initargs=(grades,))
+    else:
+        _init_grades(grades)
+    try:
+        for k in range(iterations):
+            start = time.perf_counter()
+            results = _solve_grades(executor, [(i, lam, mu, backend) for i in range(num_product)], workers)
+            if not all(result["optimal"] for result in results):
+                infeasible = [i for i, result in enumerate(results) if not result["optimal"]]
+                raise RuntimeError(f"Grade subproblems {infeasible[:10]} are infeasible on their own")
+            P = np.stack([result["P"] for result in results])
+            X = np.stack([result["X"] for result in results])
+            value = sum(result["value"] for result in results) - lam @ capacity - np.sum(mu * supply)
+            if not np.isfinite(lower) or value > lower + 1e-9 * max(1.0, abs(lower)):
+                lower, center = value, (lam, mu)
+
+            # Keep every new subproblem plan for the primal recovery
+            for grade_plans, result in zip(plans, results):
+                if not grade_plans or not np.allclose(grade_plans[-1]["X"], result["X"]):
+                    grade_plans.append({family: result[family] for family in ("cost", "P", "S", "X")})
+            candidate, cost, prices_lam, prices_mu = recover_plan(params, plans, backend)
+            if cost < upper:
+                upper, plan = cost, candidate
+
+            # Largest violation of the relaxed rows by the subproblem plans
+            violation = max((P.sum(axis=0) - capacity).max(), (X.sum(axis=0) - supply).max(), 0.0)
+            relative_gap = (upper - lower) / max(1.0, abs(upper)) if np.isfinite(upper) else np.inf
+            history.append({"iteration": k, "lower bound": lower, "upper bound": upper, "gap": relative_gap,
+                            "violation": float(violation),
+                            "time [s]": time.perf_counter() - start})
+            if verbose:
+                print(f"Iteration {k}: bound {lower:.4f}, plan {upper:.4f}, gap {relative_gap:.2%}")
+            if relative_gap <= gap:
+                break
+
+            # Smoothed step from the best multipliers towards the recovery LP prices
+            lam = SMOOTHING * center[0] + (1 - SMOOTHING) * prices_lam
+            mu = SMOOTHING * center[1] + (1 - SMOOTHING) * prices_mu
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return {"lower bound": lower, "upper bound": upper,
+            "gap": (upper - lower) / max(1.0, abs(upper)) if np.isfinite(upper) else np.inf,
+            "plan": plan, "lam": lam, "mu": mu, "history": pd.DataFrame(history)}
+
+
+def many_grade_params(num_product, base=None, seed=0):
+    """
+    model_b parameters with num_product grades: chromium target 18%, random nickel targets and demand
+    series drawn around those of base; capacity and supplies scaled with the number of grades
+    """
+    from data import data_b, get_supplier_data
+    from model_template import params_b
+
+    params = params_b(get_supplier_data(data_b if base is None else base))
+    rng = np.random.default_rng(seed)
+    base_demand = np.asarray(params["demand"], dtype=float)
+    scale = num_product / base_demand.shape[0]
+    pattern = rng.integers(base_demand.shape[0], size=num_product)
+    demand = np.round(base_demand[pattern] * rng.uniform(0.5, 1.5, size=(num_product, base_demand.shape[1])))
+    nickel = np.round(rng.uniform(0.0, 0.12, num_product) * (rng.random(num_product) > 0.2), 3)
+    return {**params,
+            "chromium_ratio": np.full(num_product, 0.18), "nickel_ratio": nickel, "demand": demand,
+            "storage_costs": rng.choice(np.asarray(params["storage_costs"], dtype=float), num_product),
+            "max_production": np.asarray(params["max_production"], dtype=float) * scale,
+            "max_supply": np.asarray(params["max_supply"], dtype=float) * scale}
+
+
+def compare(num_product=100, backend="highs", iterations=50, workers=None, seed=0, full=True):
+    """
+    Decompose a many-grade instance and (optionally) compare cost and wall time with the monolithic LP.
+    Every iteration solves one LP per grade, so the decomposition only pays off in time when the
+    monolithic LP is much slower than num_product small LPs spread over the workers.
+    """
+    params = many_grade_params(num_product, seed=seed)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    result = decompose(params, backend, iterations, workers=workers)
+    elapsed = time.perf_counter() - start
+    print(f"Lagrangian decomposition: bound {result['lower bound']:.4f}, plan {result['upper bound']:.4f}, "
+          f"gap {result['gap']:.3%}, {len(result['history'])} iterations, {elapsed:.2f}s on {workers} workers")
+    if full:
+        start = time.perf_counter()
+        template = compile_template(num_product, len(params["costs"]), params["demand"].shape[1])
+        reference = backends.solve(backends.matrix_problem(template, scenario_vectors(template, params)), backend)
+        monolithic = time.perf_counter() - start
+        print(f"Monolithic model: {reference['status']}, objective {reference['objective']}, {monolithic:.2f}s")
+        print(f"Decomposition time / monolithic time: {elapsed / monolithic:.1f}x")
+    return result
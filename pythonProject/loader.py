@@ -0,0 +1,180 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Table formats in order of preference; .npy tables are memory-mapped instead of read into memory
+TABLE_EXTENSIONS = (".npy", ".parquet", ".csv")
+
+# Column order of the supplier table (same order as the supplier rows in data.py)
+SUPPLIER_COLUMNS = ["chromium", "nickel", "copper", "max_supply", "cost"]
+
+# Column order of the grade table
+GRADE_COLUMNS = ["chromium_ratio", "nickel_ratio", "storage_cost"]
+
+
+def _find_table(directory, stem):
+    """Return the path of '<stem>.npy/.parquet/.csv' in directory"""
+    for extension in TABLE_EXTENSIONS:
+        path = os.path.join(directory, stem + extension)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No {stem} table ({', '.join(TABLE_EXTENSIONS)}) in {directory}")
+
+
+def _read_table(path, columns=None):
+    """
+    Read a numeric table. .npy files are memory-mapped (no copy); CSV/Parquet files are read with pandas
+    and, when columns are given, reduced to those columns in that order.
+    """
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+
+    frame = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+    if columns is None:
+        # Everything except a month label column is data
+        frame = frame.drop(columns=[column for column in frame.columns if str(column).lower() == "month"])
+    else:
+        missing = [column for column in columns if column not in frame.columns]
+        if missing:
+            raise ValueError(f"{path} is missing columns {missing}")
+        frame = frame[columns]
+    return frame.to_numpy(dtype=float)
+
+
+def _read_settings(directory):
+    """Scalar parameters (max_production, copper_limit, electrolysis costs, ...) from settings.json"""
+    path = os.path.join(directory, "settings.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def _check(condition, message):
+    if not condition:
+        raise ValueError(message)
+
+
+def load_tables(directory):
+    """
+    Load and validate the supplier, grade and demand tables of a scenario directory:
+    - suppliers: one row per supplier with columns chromium, nickel, copper, max_supply, cost
+    - grades: one row per product with columns chromium_ratio, nickel_ratio, storage_cost
+    - demand: products x months (.npy) or one column per product and one row per month (CSV/Parquet)
+    - settings.json: max_production and, for model e, copper_limit and electrolysis costs
+    """
+    suppliers = _read_table(_find_table(directory, "suppliers"), SUPPLIER_COLUMNS)
+    grades = _read_table(_find_table(directory, "grades"), GRADE_COLUMNS)
+
+    demand_path = _find_table(directory, "demand")
+    demand = _read_table(demand_path)
+    if not demand_path.endswith(".npy"):
+        demand = demand.T  # CSV/Parquet tables store one column per product
+
+    settings = _read_settings(directory)
+
+    # Validate shapes and value ranges before anything is built on top of the tables
+    _check(suppliers.ndim == 2 and suppliers.shape[1] == len(SUPPLIER_COLUMNS),
+           f"suppliers must have {len(SUPPLIER_COLUMNS)} columns {SUPPLIER_COLUMNS}, got shape {suppliers.shape}")
+    _check(grades.ndim == 2 and grades.shape[1] == len(GRADE_COLUMNS),
+           f"grades must have {len(GRADE_COLUMNS)} columns {GRADE_COLUMNS}, got shape {grades.shape}")
+    _check(demand.ndim == 2 and demand.shape[0] == grades.shape[0],
+           f"demand must have one row per grade ({grades.shape[0]}), got shape {demand.shape}")
+    _check(settings.get("months", demand.shape[1]) == demand.shape[1],
+           f"settings.json says {settings.get('months')} months but demand has {demand.shape[1]}")
+    _check("max_production" in settings, "settings.json must define max_production")
+
+    contents = suppliers[:, :3]
+    _check(np.all((contents >= 0) & (contents <= 1)), "Supplier contents must be fractions in [0, 1]")
+    _check(np.all(suppliers[:, 3:] >= 0), "Supplier max_supply and cost must be non-negative")
+    _check(np.all((grades[:, :2] >= 0) & (grades[:, :2] <= 1)), "Grade ratios must be fractions in [0, 1]")
+    _check(np.all(grades[:, 2] >= 0), "Storage costs must be non-negative")
+    _check(np.all(demand >= 0), "Demand must be non-negative")
+
+    return suppliers, grades, demand, settings
+
+
+def load_supplier_data(directory):
+    """Load a scenario directory into the same tuple as data.get_supplier_data"""
+    suppliers, grades, demand, settings = load_tables(directory)
+    return (
+        demand.shape[1],  # Number of months
+        suppliers[:, 0],  # Chromium content
+        suppliers[:, 1],  # Nickel content
+        suppliers[:, 3],  # Maximum supply
+        suppliers[:, 4],  # Costs
+        grades[:, 0],  # Chromium content ratio
+        grades[:, 1],  # Nickel content ratio
+        demand,  # Demand for each type
+        grades[:, 2],  # Storage costs for each type
+        settings["max_production"],  # Max production
+        grades.shape[0],  # Number of product types
+        suppliers.shape[0],  # Number of suppliers
+    )
+
+
+def load_supplier_data_e(directory):
+    """Load a scenario directory into the same tuple as data.get_supplier_data_e"""
+    suppliers, grades, demand, settings = load_tables(directory)
+    for key in ("copper_limit", "electrolysis_fixed_cost", "electrolysis_unit_cost"):
+        _check(key in settings, f"settings.json must define {key} for model e")
+    return (
+        demand.shape[1],  # Number of months
+        suppliers[:, 0],  # Chromium content
+        suppliers[:, 1],  # Nickel content
+        suppliers[:, 2],  # Copper content
+        suppliers[:, 3],  # Maximum supply
+        suppliers[:, 4],  # Costs
+        grades[:, 0],  # Chromium content ratio
+        grades[:, 1],  # Nickel content ratio
+        settings["copper_limit"],  # Copper content limit
+        demand,  # Demand for each type
+        grades[:, 2],  # Storage costs for each type
+        settings["max_production"],  # Maximum production capacity
+        settings["electrolysis_fixed_cost"],  # Fixed cost for electrolysis
+        settings["electrolysis_unit_cost"],  # Unit cost for electrolysis
+        grades.shape[0],  # Number of product types
+        suppliers.shape[0],  # Number of suppliers
+    )
+
+
+def save_scenario(data, directory, table_format="npy"):
+    """
+    Write a data dictionary (as in data.py) to a scenario directory.
+    table_format is 'npy' (memory-mappable), 'parquet' or 'csv'.
+    """
+    os.makedirs(directory, exist_ok=True)
+    supplier_names = list(data["suppliers"])
+    product_names = list(data["demand"])
+
+    suppliers = np.array([data["suppliers"][name] for name in supplier_names], dtype=float)
+    grades = np.column_stack([data["chromium_content_ratio"], data["nickel_content_ratio"], data["storage_costs"]])
+    demand = np.array([data["demand"][name] for name in product_names], dtype=float)
+
+    if table_format == "npy":
+        # Column-major storage keeps every supplier attribute contiguous in the memory map
+        np.save(os.path.join(directory, "suppliers.npy"), np.asfortranarray(suppliers))
+        np.save(os.path.join(directory, "grades.npy"), np.asfortranarray(grades))
+        np.save(os.path.join(directory, "demand.npy"), demand)
+    else:
+        tables = {
+            "suppliers": pd.DataFrame(suppliers, columns=SUPPLIER_COLUMNS, index=pd.Index(supplier_names, name="supplier")),
+            "grades": pd.DataFrame(grades, columns=GRADE_COLUMNS, index=pd.Index(product_names, name="grade")),
+            "demand": pd.DataFrame(demand.T, columns=product_names, index=pd.RangeIndex(1, demand.shape[1] + 1, name="month")),
+        }
+        for stem, frame in tables.items():
+            path = os.path.join(directory, f"{stem}.{table_format}")
+            if table_format == "parquet":
+                frame.to_parquet(path)
+            else:
+                frame.to_csv(path)
+
+    settings = {key: data[key] for key in
+                ("months", "max_production", "copper_limit", "electrolysis_fixed_cost", "electrolysis_unit_cost")
+                if key in data}
+    with open(os.path.join(directory, "settings.json"), "w") as file:
+        json.dump({key: value.item() if isinstance(value, np.generic) else value for key, value in settings.items()},
+                  file, indent=2)
+    return directory
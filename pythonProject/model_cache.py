@@ -0,0 +1,232 @@
+"""
+On-disk cache of built models.
+
+A built model is written as <key>.mps with a <key>.json sidecar holding the model name and the
+index of every variable of the builder's tupledicts (P, S, X, ...). The key is a hash of the model
+family and its input data, so the same inputs load the stored model instead of rebuilding it.
+Entries are evicted by age and when the cache grows above a size limit (least recently used first).
+
+The cache is used when STEEL_MODEL_CACHE is set to a directory (or with enabled=True).
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+
+import gurobipy as gp
+
+from solver_env import read_model
+from warm_start import parameter_vector
+
+logger = logging.getLogger(__name__)
+
+# Directory used when STEEL_MODEL_CACHE is not set but the cache is enabled explicitly
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_cache")
+
+# Part of every key: bump it when a builder changes, so stale models are never loaded
+FORMAT_VERSION = 1
+
+MAX_AGE_DAYS = 30
+MAX_SIZE_MB = 2048
+
+# Seconds between eviction passes of one process
+EVICT_INTERVAL = 60
+_last_eviction = {}
+
+# Hit statistics for the current process
+_stats = {"hits": 0, "misses": 0}
+
+
+def cache_dir():
+    return os.environ.get("STEEL_MODEL_CACHE") or DEFAULT_CACHE_DIR
+
+
+def is_enabled():
+    return bool(os.environ.get("STEEL_MODEL_CACHE"))
+
+
+def input_key(family, params):
+    """Key of a model: format version, family and every number of its input data"""
+    digest = hashlib.sha1(f"{FORMAT_VERSION}|{family}".encode())
+    digest.update(parameter_vector(params).tobytes())
+    return digest.hexdigest()[:20]
+
+
+def _paths(directory, key):
+    return os.path.join(directory, key + ".mps"), os.path.join(directory, key + ".json")
+
+
+def store(model, variables, key, directory=None):
+    """Write the model and the variable index of its tupledicts (written to temporary files, then renamed)"""
+    directory = directory or cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    model_path, index_path = _paths(directory, key)
+    model.update()
+
+    position = {var.index: k for k, var in enumerate(model.getVars())}
+    index = {
+        "model_name": model.ModelName,
+        "num_vars": model.NumVars,
+        # Keys and variable positions of every tupledict, in builder order
+        "variables": [{"keys": [list(key) if isinstance(key, tuple) else key for key in tupledict.keys()],
+                       "index": [position[var.index] for var in tupledict.values()]}
+                      for tupledict in variables],
+    }
+
+    # Gurobi picks the file format from the extension, so the temporary file keeps it
+    tmp_suffix = f".tmp{os.getpid()}"
+    model.write(model_path[:-4] + tmp_suffix + ".mps")
+    os.replace(model_path[:-4] + tmp_suffix + ".mps", model_path)
+    with open(index_path + tmp_suffix, "w") as file:
+        json.dump(index, file)
+    os.replace(index_path + tmp_suffix, index_path)
+
+
+def load(key, directory=None, verbose=False):
+    """The stored model and its tupledicts, or None when the key is not cached (or unreadable)"""
+    directory = directory or cache_dir()
+    model_path, index_path = _paths(directory, key)
+    if not (os.path.exists(model_path) and os.path.exists(index_path)):
+        return None
+    try:
+        with open(index_path) as file:
+            index = json.load(file)
+        model = read_model(model_path, verbose)
+    except (OSError, ValueError, gp.GurobiError):
+        logger.warning("Skipping unreadable model cache entry %s", model_path)
+        return None
+
+    # MPS keeps the name only up to the first space
+    model.ModelName = index["model_name"]
+    model_vars = model.getVars()
+    variables = tuple(
+        gp.tupledict(zip((tuple(key) if isinstance(key, list) else key for key in entry["keys"]),
+                         (model_vars[k] for k in entry["index"])))
+        for entry in index["variables"])
+
+    # Mark the entry as recently used for eviction
+    os.utime(index_path)
+    return model, variables
+
+
+def cached_build(family, params, build, verbose=False, enabled=None, directory=None):
+    """
+    build() returns (model, tuple of tupledicts). With the cache enabled, the model is loaded from
+    the cache when the family and params were built before, otherwise built and stored.
+    """
+    if not (is_enabled() if enabled is None else enabled):
+        return build()
+
+    directory = directory or cache_dir()
+    key = input_key(family, params)
+    cached = load(key, directory, verbose)
+    if cached is not None:
+        _stats["hits"] += 1
+        return cached
+
+    _stats["misses"] += 1
+    model, variables = build()
+    try:
+        store(model, variables, key, directory)
+        _evict_now_and_then(directory)
+    except (OSError, gp.GurobiError) as error:
+        logger.warning("Could not store model %s in the cache: %s", key, error)
+    return model, variables
+
+
+def _evict_now_and_then(directory):
+    now = time.time()
+    if now - _last_eviction.get(directory, 0) >= EVICT_INTERVAL:
+        _last_eviction[directory] = now
+        evict(directory)
+
+
+def evict(directory=None, max_age_days=MAX_AGE_DAYS, max_size_mb=MAX_SIZE_MB):
+    """
+    Remove entries not used for max_age_days, then the least recently used ones until the cache
+    is below max_size_mb. Returns the number of removed entries.
+    """
+    directory = directory or cache_dir()
+    if not os.path.isdir(directory):
+        return 0
+    entries = []
+    for file_name in os.listdir(directory):
+        if not file_name.endswith(".json"):
+            continue
+        model_path, index_path = _paths(directory, file_name[:-5])
+        try:
+            size = os.path.getsize(index_path) + (os.path.getsize(model_path) if os.path.exists(model_path) else 0)
+            entries.append((os.path.getmtime(index_path), size, model_path, index_path))
+        except OSError:
+            continue  # removed by another process meanwhile
+
+    entries.sort()
+    total = sum(size for _, size, _, _ in entries)
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for used, size, model_path, index_path in entries:
+        if used >= cutoff and total <= max_size_mb * 1024 * 1024:
+            break
+        for path in (index_path, model_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def stats():
+    return dict(_stats)
+
+
+def benchmark(sizes=((5, 12), (50, 60), (50, 120)), repeats=3, directory=None):
+    """
+    Time a cold model_e build against loading the same model from the cache, for generated
+    instances with (suppliers, months) in sizes. Prints and returns one row per size.
+    """
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    from model_e import data_e, get_supplier_data_e, build_model
+    from model_template import compile_template
+
+    base = get_supplier_data_e(data_e)
+    rng = np.random.default_rng(0)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = directory or tmp
+        for num_supplier, months in sizes:
+            data = list(base)
+            data[0], data[-1] = months, num_supplier
+            data[1:6] = [rng.uniform(10, 20, num_supplier), rng.uniform(5, 10, num_supplier),
+                         rng.uniform(0, 1, num_supplier), rng.uniform(50, 100, num_supplier),
+                         rng.uniform(5, 10, num_supplier)]
+            data[9] = rng.uniform(10, 30, (base[-2], months))
+            data = tuple(data)
+
+            timings = {"build": [], "load": []}
+            for _ in range(repeats):
+                # Cold build: without the compiled template of this shape
+                compile_template.cache_clear()
+                start = time.perf_counter()
+                model, variables = build_model(0.03, data, cache=False)
+                model.update()
+                timings["build"].append(time.perf_counter() - start)
+                store(model, variables, "benchmark", directory)
+                model.dispose()
+
+                start = time.perf_counter()
+                model, variables = load("benchmark", directory)
+                model.update()
+                timings["load"].append(time.perf_counter() - start)
+                model.dispose()
+
+            rows.append({"suppliers": num_supplier, "months": months, "variables": data[-2] * months * (3 + num_supplier) + months,
+                         "build [ms]": 1000 * min(timings["build"]), "cache load [ms]": 1000 * min(timings["load"])})
+
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False, float_format="{:.1f}".format))
+    return report
@@ -1,6 +1,11 @@
-from gurobipy import Model, GRB, quicksum
+from gurobipy import GRB
 import numpy as np
 import pandas as pd
+import warm_start
+from model_template import build_model_e
+from model_cache import cached_build
+from results import PlanResult
+from anytime import apply_policy, solve_outcome, decision_interval, compare_cost, escalate
 
 
 # Input data dictionary
@@ -70,55 +75,24 @@ def get_supplier_data_e(data):
 # Overall parameter of big M
 M = 999999
 
-def calculate_detailed_costs(model, months, P, S, X, B, m, storage_costs, electrolysis_fixed_cost, 
+def calculate_detailed_costs(model, months, P, S, X, B, m, storage_costs, electrolysis_fixed_cost,
                            electrolysis_unit_cost, supplier_costs, num_products, num_suppliers):
     """
     Calculate detailed breakdown of costs from the optimal solution
     """
-    # Storage costs calculation
-    storage_cost_details = []
-    total_storage_cost = 0
-    
-    for t in range(months):
-        month_storage_cost = sum(storage_costs[i] * S[i, t].x for i in range(num_products))
-        total_storage_cost += month_storage_cost
-        storage_cost_details.append({
-            "Month": t + 1,
-            "18/10 Storage Cost": storage_costs[0] * S[0, t].x,
-            "18/8 Storage Cost": storage_costs[1] * S[1, t].x,
-            "18/0 Storage Cost": storage_costs[2] * S[2, t].x,
-            "Total Storage Cost": month_storage_cost
-        })
-    
-    # Electrolysis costs calculation
-    electrolysis_cost_details = []
-    total_electrolysis_cost = 0
-    
-    for t in range(months):
-        fixed_cost = electrolysis_fixed_cost * B[t].x
-        variable_cost = sum(electrolysis_unit_cost * m[i, t].x for i in range(num_products))
-        month_total = fixed_cost + variable_cost
-        total_electrolysis_cost += month_total
-        
-        electrolysis_cost_details.append({
-            "Month": t + 1,
-            "Fixed Cost": fixed_cost,
-            "Variable Cost": variable_cost,
-            "Total Electrolysis Cost": month_total
-        })
-    
-    # Procurement costs calculation
-    procurement_cost = sum(supplier_costs[j] * X[i, j, t].x 
-                         for i in range(num_products) 
-                         for j in range(num_suppliers) 
-                         for t in range(months))
-    
+    result = PlanResult.from_model(
+        model, P, S, X, B, m,
+        storage_costs=storage_costs, supplier_costs=supplier_costs,
+        electrolysis_fixed_cost=electrolysis_fixed_cost, electrolysis_unit_cost=electrolysis_unit_cost
+    )
+
     return {
-        "storage_costs": storage_cost_details,
-        "electrolysis_costs": electrolysis_cost_details,
-        "total_storage_cost": total_storage_cost,
-        "total_electrolysis_cost": total_electrolysis_cost,
-        "total_procurement_cost": procurement_cost
+        "storage_costs": result.storage_cost_table,
+        "electrolysis_costs": result.electrolysis_cost_table,
+        "total_storage_cost": result.total_storage_cost,
+        "total_electrolysis_cost": result.total_electrolysis_cost,
+        "total_procurement_cost": result.total_procurement_cost,
+        "plan": result
     }
 
 
@@ -126,91 +100,71 @@ def display_optimal_plans(model, months, P, S, X, B, m, num_products, num_suppli
                          electrolysis_fixed_cost, electrolysis_unit_cost, supplier_costs):
     """
     Display the optimal production, storage, electrolysis and procurement plans with detailed costs
+    (the best solution found if the solve stopped at a limit)
     """
-    if model.status == GRB.OPTIMAL:
+    if model.SolCount > 0:
         # Calculate detailed costs
         cost_details = calculate_detailed_costs(
-            model, months, P, S, X, B, m, storage_costs, 
-            electrolysis_fixed_cost, electrolysis_unit_cost, 
+            model, months, P, S, X, B, m, storage_costs,
+            electrolysis_fixed_cost, electrolysis_unit_cost,
             supplier_costs, num_products, num_suppliers
         )
-        
+        plan = cost_details["plan"]
+
+        # Display settings
+        pd.set_option('display.float_format', '{:.2f}'.format)
+        pd.set_option('display.max_rows', None)
+        pd.set_option('display.max_columns', None)
+
         print(f"\nTotal Cost: {model.objVal:.2f} euro")
+        if model.status != GRB.OPTIMAL:
+            outcome = solve_outcome(model)
+            print(f"(best solution at {outcome['status']}: bound {outcome['bound']:.2f}, gap {outcome['gap']:.2%})")
         print(f"Breakdown:")
         print(f"- Total Storage Cost: {cost_details['total_storage_cost']:.2f} euro")
         print(f"- Total Electrolysis Cost: {cost_details['total_electrolysis_cost']:.2f} euro")
         print(f"- Total Procurement Cost: {cost_details['total_procurement_cost']:.2f} euro")
-        
+
         # Display storage costs by month
         print("\nMonthly Storage Costs:")
-        print(pd.DataFrame(cost_details['storage_costs']).to_string(index=False))
-        
+        print(cost_details['storage_costs'].to_string(index=False))
+
         # Display electrolysis costs by month
         print("\nMonthly Electrolysis Costs:")
-        print(pd.DataFrame(cost_details['electrolysis_costs']).to_string(index=False))
-        
-        # Original output
-        production_data = []
-        storage_data = []
-        supplier_data = {i: [] for i in range(num_products)}
-        electrolysis_data = []
-
-        for t in range(months):
-            # Production and storage data
-            production_data.append({
-                "Month": t + 1,
-                "18/10 Production": P[0, t].x,
-                "18/8 Production": P[1, t].x,
-                "18/0 Production": P[2, t].x,
-            })
-
-            storage_data.append({
-                "Month": t + 1,
-                "18/10 Storage": S[0, t].x,
-                "18/8 Storage": S[1, t].x,
-                "18/0 Storage": S[2, t].x,
-            })
-
-            # Supplier data
-            for i in range(num_products):
-                supplier_data_row = {"Month": t + 1}
-                for j in range(num_suppliers):
-                    supplier_data_row[f"From Supplier {chr(65 + j)}"] = X[i, j, t].x
-                supplier_data[i].append(supplier_data_row)
-
-            # Electrolysis data
-            electrolysis_data.append({
-                "Month": t + 1,
-                "Electrolysis Used": B[t].x,
-                "18/10 Electrolysis": m[0, t].x,
-                "18/8 Electrolysis": m[1, t].x,
-                "18/0 Electrolysis": m[2, t].x,
-            })
+        print(cost_details['electrolysis_costs'].to_string(index=False))
 
-        # Display settings
-        pd.set_option('display.float_format', '{:.2f}'.format)
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-
-        # Convert to DataFrames and display
+        # Plans built from the solution arrays
         print("\nProduction Plan:")
-        print(pd.DataFrame(production_data).to_string(index=False))
+        print(plan.production_table.to_string(index=False))
 
         print("\nStorage Plan:")
-        print(pd.DataFrame(storage_data).to_string(index=False))
+        print(plan.storage_table.to_string(index=False))
 
         print("\nElectrolysis Plan:")
-        print(pd.DataFrame(electrolysis_data).to_string(index=False))
+        print(plan.electrolysis_table.to_string(index=False))
 
         for i in range(num_products):
-            product_names = ["18/10", "18/8", "18/0"]
-            print(f"\nSupplier Procurement Plan for Product {product_names[i]}:")
-            print(pd.DataFrame(supplier_data[i]).to_string(index=False))
+            print(f"\nSupplier Procurement Plan for Product {plan.product_names[i]}:")
+            print(plan.supplier_tables[i].to_string(index=False))
 
 
-def solve_model_with_copper_limit(copper_limit, data):
+def build_model(copper_limit, data, cache=None):
     """
-    Solve the optimization model with a specific copper limit
+    Build (without solving) the model for a specific copper limit; returns the model and its variables.
+    With the model cache enabled (see model_cache.py) a model built before for the same inputs is loaded instead.
+    """
+    # Rows and coefficients come from the cached sparse template of this shape; only the
+    # coefficient, right-hand side and objective vectors are filled per copper limit
+    return cached_build("model_e", (copper_limit, data), lambda: build_model_e(copper_limit, data, big_m=M),
+                        enabled=cache)
+
+
+def solve_copper_limit(copper_limit, data, policy=None):
+    """
+    Solve the optimization model with a specific copper limit under an anytime policy
+    ({"TimeLimit": ..., "MIPGap": ...}, see anytime.py).
+    Returns the solve outcome (status, incumbent, bound, gap) and, when there is an incumbent,
+    the model, its variables and the cost parameters; otherwise the model is disposed.
     """
     months, chromium_content, nickel_content, copper_content, \
         max_supply, costs, chromium_content_ratio, nickel_content_ratio, \
@@ -218,98 +172,81 @@ def solve_model_with_copper_limit(copper_limit, data):
         electrolysis_fixed_cost, electrolysis_unit_cost, \
         num_product, num_supplier = data
 
+    model = None
     try:
-        # Create model
-        model = Model("Steel Production")
-        model.setParam('OutputFlag', 0)  # Suppress output
-
-        # Variables
-        P = model.addVars(num_product, months, vtype=GRB.CONTINUOUS, name="P")
-        S = model.addVars(num_product, months, vtype=GRB.CONTINUOUS, name="S")
-        X = model.addVars(num_product, num_supplier, months, vtype=GRB.CONTINUOUS, name="X")
-        B = model.addVars(months, vtype=GRB.BINARY, name="B")
-        m = model.addVars(num_product, months, vtype=GRB.CONTINUOUS, name="m")
-
-        # Objective function
-        model.setObjective(
-            quicksum(
-                costs[j] * X[i, j, t] for i in range(num_product) for j in range(num_supplier) for t in range(months)) +
-            quicksum(storage_costs[i] * S[i, t] for i in range(num_product) for t in range(months)) +
-            quicksum(electrolysis_fixed_cost * B[t] for t in range(months)) +
-            quicksum(electrolysis_unit_cost * m[i, t] for i in range(num_product) for t in range(months)),
-            GRB.MINIMIZE
-        )
+        model, variables = build_model(copper_limit, data)
+        apply_policy(model, policy)
 
-        # Constraints
-        for t in range(months):
-            # Demand, supply and storage constraints
-            if t == 0:
-                for i in range(num_product):
-                    model.addConstr(P[i, t] - m[i, t] == demand[i, t] + S[i, t])
-            else:
-                for i in range(num_product):
-                    model.addConstr(P[i, t] + S[i, t - 1] - m[i, t] == demand[i, t] + S[i, t])
-
-            # Production capacity constraint
-            model.addConstr(quicksum(P[i, t] for i in range(num_product)) <= max_production)
-
-            # Supply limits constraints
-            for j in range(num_supplier):
-                model.addConstr(quicksum(X[i, j, t] for i in range(num_product)) <= max_supply[j])
-
-            for i in range(num_product):
-                # supply-production balance
-                model.addConstr(P[i, t] == quicksum(X[i, j, t] for j in range(num_supplier)))
-
-                # Chromium content constraints
-                model.addConstr(
-                    chromium_content_ratio[i] * (P[i, t] - m[i, t]) ==
-                    quicksum(chromium_content[j] * X[i, j, t] for j in range(num_supplier))
-                )
-
-                # Nickel content constraints
-                model.addConstr(
-                    nickel_content_ratio[i] * (P[i, t] - m[i, t]) ==
-                    quicksum(nickel_content[j] * X[i, j, t] for j in range(num_supplier))
-                )
-
-                # Copper content constraints
-                model.addConstr(
-                    quicksum(copper_content[j] * X[i, j, t] for j in range(num_supplier)) - m[i, t] <=
-                    copper_limit * (P[i, t] - m[i, t])
-                )
-
-                # Electrolysis constraints
-                model.addConstr(
-                    m[i, t] <= B[t] * M
-                )
-
-        # Optimize
-        model.optimize()
-
-        if model.status == GRB.OPTIMAL:
-            return True, model.objVal, model, (P, S, X, B, m), \
+        # Optimize, starting from the closest previously stored solution
+        warm_start.optimize(model, (copper_limit, data))
+        outcome = solve_outcome(model)
+
+        if outcome["has_solution"]:
+            return outcome, model, variables, \
                    (storage_costs, electrolysis_fixed_cost, electrolysis_unit_cost, costs)
         else:
-            return False, float('inf'), None, None, None
+            model.dispose()
+            return outcome, None, None, None
 
     except Exception as e:
         print(f"Error solving model: {str(e)}")
-        return False, float('inf'), None, None, None
+        if model is not None:
+            model.dispose()
+        return {"status": "ERROR", "optimal": False, "infeasible": False, "has_solution": False,
+                "incumbent": float('inf'), "bound": -float('inf'), "gap": float('inf')}, None, None, None
+
+
+def solve_model_with_copper_limit(copper_limit, data, policy=None):
+    """
+    Solve the optimization model with a specific copper limit.
+    Feasible means an incumbent was found (proven optimal unless the policy sets limits).
+    """
+    outcome, model, variables, cost_params = solve_copper_limit(copper_limit, data, policy)
+    return outcome["has_solution"], outcome["incumbent"], model, variables, cost_params
 
 
-def find_minimum_copper_limit(data, initial_cost=None):
+def _print_outcome(outcome):
+    line = f"Current feasible: {outcome['has_solution']}, Cost: {outcome['incumbent']:.2f}"
+    if not outcome["optimal"] and not outcome["infeasible"]:
+        line += f", Bound: {outcome['bound']:.2f}, Gap: {outcome['gap']:.2%} ({outcome['status']})"
+    print(line)
+
+
+def _solve_until_decided(copper_limit, data, policy, retries, is_decided):
+    """Solve, and while the outcome is undecided re-solve up to retries times with a longer time limit"""
+    outcome, model, variables, cost_params = solve_copper_limit(copper_limit, data, policy)
+    for _ in range(retries):
+        if is_decided(outcome) or "TimeLimit" not in (policy or {}):
+            break
+        if model is not None:
+            model.dispose()
+        policy = escalate(policy)
+        print(f"Undecided, retrying with TimeLimit {policy['TimeLimit']}s")
+        outcome, model, variables, cost_params = solve_copper_limit(copper_limit, data, policy)
+    return outcome, model, variables, cost_params
+
+
+def find_minimum_copper_limit(data, initial_cost=None, policy=None, retries=1):
     """
     Find the minimum copper limit that doesn't increase costs
-    Uses binary search to find the limit
+    Uses binary search to find the limit. Under a time limit, a solve whose bound and incumbent do not
+    decide 'same cost' vs 'higher cost' is retried with a longer time limit; if it stays undecided the
+    search continues above it and the limit is reported as possibly not minimal.
     """
     # First solve with original copper limit to get baseline cost
     if initial_cost is None:
-        is_feasible, baseline_cost, _, _, _ = solve_model_with_copper_limit(0.1, data)
+        baseline, baseline_model, _, _ = _solve_until_decided(
+            0.1, data, policy, retries, lambda outcome: outcome["optimal"] or outcome["infeasible"])
+        if baseline_model is not None:
+            baseline_model.dispose()
+        baseline_interval = decision_interval(baseline)
     else:
-        baseline_cost = initial_cost
+        baseline_interval = (initial_cost, initial_cost)
+    baseline_cost = baseline_interval[1]
 
     print(f"Baseline cost: {baseline_cost:.2f}")
+    if baseline_interval[0] < baseline_interval[1]:
+        print(f"Baseline bound: {baseline_interval[0]:.2f} (not proven optimal within the time limit)")
 
     # Binary search parameters
     left = 0.01
@@ -319,39 +256,55 @@ def find_minimum_copper_limit(data, initial_cost=None):
     best_model = None
     best_vars = None
     best_cost_params = None
+    undecided = []
 
     # Binary search loop
     while right - left > tolerance:
         mid = (left + right) / 2
         print(f"\nTesting copper limit: {mid:.8f}")
 
-        is_feasible, current_cost, model, variables, cost_params = solve_model_with_copper_limit(mid, data)
+        outcome, model, variables, cost_params = _solve_until_decided(
+            mid, data, policy, retries, lambda outcome: compare_cost(outcome, baseline_interval) != "unknown")
+        verdict = compare_cost(outcome, baseline_interval)
 
-        if is_feasible and abs(current_cost - baseline_cost) < 1e-8:
+        if verdict == "equal":
+            # Only the best model is kept alive
+            if best_model is not None:
+                best_model.dispose()
             best_limit = mid
             best_model = model
             best_vars = variables
             best_cost_params = cost_params
             right = mid
         else:
+            if verdict == "unknown":
+                undecided.append(mid)
+            if model is not None:
+                model.dispose()
             left = mid
 
-        print(f"Current feasible: {is_feasible}, Cost: {current_cost:.2f}")
+        _print_outcome(outcome)
+
+    if undecided:
+        print(f"\n{len(undecided)} copper limits stayed undecided within the time limit; "
+              f"the minimum may be as low as {min(undecided):.6f}")
 
     return best_limit, best_model, best_vars, best_cost_params
 
 
-# Main execution
-if __name__ == "__main__":
+def copper_search(data_dict=data_e, policy=None):
+    """
+    Find the minimum copper limit that keeps the cost of data_dict and display the optimal plans for it
+    """
     # Get base data
-    data = get_supplier_data_e(data_e)
+    data = get_supplier_data_e(data_dict)
     months = data[0]
     num_product = data[-2]
     num_supplier = data[-1]
 
     # Find minimum copper limit
     print("Finding minimum copper limit...")
-    min_limit, final_model, final_vars, cost_params = find_minimum_copper_limit(data)
+    min_limit, final_model, final_vars, cost_params = find_minimum_copper_limit(data, policy=policy)
     # print(f"\nMinimum feasible copper limit: {min_limit:.6f}")
 
     # Display optimal plans for the minimum copper limit
@@ -367,3 +320,10 @@ if __name__ == "__main__":
         )
 
     print(f"\nMinimum feasible copper limit: {min_limit:.6f}")
+
+    return min_limit, final_model
+
+
+# Main execution
+if __name__ == "__main__":
+    copper_search()
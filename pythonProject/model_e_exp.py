@@ -1,8 +1,12 @@
-from gurobipy import Model, GRB, quicksum
 import numpy as np
 import pandas as pd
 import os
-import matplotlib.pyplot as plt
+import warm_start
+from model_template import build_model_e
+from model_cache import cached_build
+from results import PlanResult
+from result_writer import read_results, stream_to_file
+from anytime import apply_policy, solve_outcome
 
 
 # Input data dictionary
@@ -64,36 +68,29 @@ def get_supplier_data_e(data):
         data["Supplier set"],
     )
 
-def calculate_costs(model, months, P, S, X, B, m, storage_costs, electrolysis_fixed_cost, 
+def calculate_costs(model, months, P, S, X, B, m, storage_costs, electrolysis_fixed_cost,
                    electrolysis_unit_cost, supplier_costs, num_products, num_suppliers):
     """Calculate detailed costs from the optimal solution"""
-    
-    # Storage costs
-    total_storage_cost = sum(storage_costs[i] * S[i, t].x 
-                           for i in range(num_products) 
-                           for t in range(months))
-    
-    # Electrolysis costs
-    total_electrolysis_cost = sum(electrolysis_fixed_cost * B[t].x +
-                                 sum(electrolysis_unit_cost * m[i, t].x 
-                                     for i in range(num_products))
-                                 for t in range(months))
-    
-    # Procurement costs
-    total_procurement_cost = sum(supplier_costs[j] * X[i, j, t].x 
-                               for i in range(num_products) 
-                               for j in range(num_suppliers) 
-                               for t in range(months))
-    
+    result = PlanResult.from_model(
+        model, P, S, X, B, m,
+        storage_costs=storage_costs, supplier_costs=supplier_costs,
+        electrolysis_fixed_cost=electrolysis_fixed_cost, electrolysis_unit_cost=electrolysis_unit_cost
+    )
+
     return {
         "total_cost": model.objVal,
-        "storage_cost": total_storage_cost,
-        "electrolysis_cost": total_electrolysis_cost,
-        "procurement_cost": total_procurement_cost
+        "storage_cost": result.total_storage_cost,
+        "electrolysis_cost": result.total_electrolysis_cost,
+        "procurement_cost": result.total_procurement_cost
     }
 
-def solve_model_with_copper_limit(copper_limit, data):
-    """Solve the optimization model with a specific copper limit"""
+def solve_model_with_copper_limit(copper_limit, data, policy=None):
+    """
+    Solve the optimization model with a specific copper limit under an anytime policy
+    ({"TimeLimit": ..., "MIPGap": ...}). The cost breakdown carries the solve status, bound and gap;
+    it is returned without costs when the solve stopped at a limit before finding any solution or
+    the limit is proven infeasible.
+    """
     months, chromium_content, nickel_content, copper_content, \
         max_supply, costs, chromium_content_ratio, nickel_content_ratio, \
         _, demand, storage_costs, max_production, \
@@ -101,129 +98,100 @@ def solve_model_with_copper_limit(copper_limit, data):
         num_product, num_supplier = data
 
     try:
-        # Create model
-        model = Model("Steel Production")
-        model.setParam('OutputFlag', 0)
-
-        # Variables
-        P = model.addVars(num_product, months, vtype=GRB.CONTINUOUS, name="P")
-        S = model.addVars(num_product, months, vtype=GRB.CONTINUOUS, name="S")
-        X = model.addVars(num_product, num_supplier, months, vtype=GRB.CONTINUOUS, name="X")
-        B = model.addVars(months, vtype=GRB.BINARY, name="B")
-        m = model.addVars(num_product, months, vtype=GRB.CONTINUOUS, name="m")
-
-        # Objective function
-        model.setObjective(
-            quicksum(costs[j] * X[i, j, t] 
-                    for i in range(num_product) 
-                    for j in range(num_supplier) 
-                    for t in range(months)) +
-            quicksum(storage_costs[i] * S[i, t] 
-                    for i in range(num_product) 
-                    for t in range(months)) +
-            quicksum(electrolysis_fixed_cost * B[t] 
-                    for t in range(months)) +
-            quicksum(electrolysis_unit_cost * m[i, t] 
-                    for i in range(num_product) 
-                    for t in range(months)),
-            GRB.MINIMIZE
-        )
-
-        # Constraints
-        for t in range(months):
-            if t == 0:
-                for i in range(num_product):
-                    model.addConstr(P[i, t] - m[i, t] == demand[i, t] + S[i, t])
-            else:
-                for i in range(num_product):
-                    model.addConstr(P[i, t] + S[i, t - 1] - m[i, t] == demand[i, t] + S[i, t])
-
-            model.addConstr(quicksum(P[i, t] for i in range(num_product)) <= max_production)
-
-            for j in range(num_supplier):
-                model.addConstr(quicksum(X[i, j, t] for i in range(num_product)) <= max_supply[j])
-
-            for i in range(num_product):
-                model.addConstr(P[i, t] == quicksum(X[i, j, t] for j in range(num_supplier)))
-
-                model.addConstr(
-                    chromium_content_ratio[i] * (P[i, t] - m[i, t]) ==
-                    quicksum(chromium_content[j] * X[i, j, t] for j in range(num_supplier))
-                )
-
-                model.addConstr(
-                    nickel_content_ratio[i] * (P[i, t] - m[i, t]) ==
-                    quicksum(nickel_content[j] * X[i, j, t] for j in range(num_supplier))
-                )
-
-                model.addConstr(
-                    quicksum(copper_content[j] * X[i, j, t] for j in range(num_supplier)) - m[i, t] <=
-                    copper_limit * (P[i, t] - m[i, t])
+        # Create the model from the cached sparse template or the model cache (disposed when the block ends)
+        model, (P, S, X, B, m) = cached_build("model_e", (copper_limit, data), lambda: build_model_e(copper_limit, data))
+        with model:
+            # Optimize, starting from the closest previously stored solution
+            apply_policy(model, policy)
+            warm_start.optimize(model, (copper_limit, data))
+            outcome = solve_outcome(model)
+            status = {"status": outcome["status"], "bound": outcome["bound"], "gap": outcome["gap"]}
+
+            if outcome["has_solution"]:
+                cost_breakdown = calculate_costs(
+                    model, months, P, S, X, B, m, 
+                    storage_costs, electrolysis_fixed_cost, 
+                    electrolysis_unit_cost, costs, 
+                    num_product, num_supplier
                 )
-
-                model.addConstr(
-                      m[i, t] <= B[t] * 999999
-                )
-
-        # Optimize
-        model.optimize()
-
-        if model.status == GRB.OPTIMAL:
-            cost_breakdown = calculate_costs(
-                model, months, P, S, X, B, m, 
-                storage_costs, electrolysis_fixed_cost, 
-                electrolysis_unit_cost, costs, 
-                num_product, num_supplier
-            )
-            return True, cost_breakdown
-        else:
-            return False, None
+                return True, {**cost_breakdown, **status}
+            # Undecided (keep the bound so the scan can report it) or proven infeasible
+            return False, status
 
     except Exception as e:
         print(f"Error solving model with copper limit {copper_limit}: {str(e)}")
         return False, None
 
-def scan_copper_limits(data, start=0.000, end=0.03, step=0.001):
-    """Scan through different copper limits and save results to Excel"""
-    results = []
+def copper_limit_row(copper_limit, cost_breakdown):
+    """Result row of one copper limit; costs are NaN when a time limit left no solution"""
+    nan = float('nan')
+    return {
+        "Copper Limit": copper_limit,
+        "Total Cost": cost_breakdown.get("total_cost", nan),
+        "Storage Cost": cost_breakdown.get("storage_cost", nan),
+        "Electrolysis Cost": cost_breakdown.get("electrolysis_cost", nan),
+        "Procurement Cost": cost_breakdown.get("procurement_cost", nan),
+        "Status": cost_breakdown["status"],
+        "Bound": cost_breakdown["bound"],
+        "Gap": cost_breakdown["gap"]
+    }
+
+
+def iter_copper_limits(data, start=0.000, end=0.03, step=0.001, skip_limits=(), policy=None):
+    """
+    Generator over the cost breakdown of every copper limit in the scan, as each one is solved.
+    Proven infeasible limits get a row with status INFEASIBLE (so a resumed scan counts them as
+    done); limits stopped by the policy's time limit are kept with their bound and gap. Both have
+    NaN costs when there is no solution.
+    """
     copper_limits = np.arange(start, end + step, step)
-    
+    skip_limits = {round(float(limit), 10) for limit in skip_limits}
+
     for copper_limit in copper_limits:
+        if round(float(copper_limit), 10) in skip_limits:
+            continue
         print(f"Testing copper limit: {copper_limit:.3f}")
-        is_feasible, cost_breakdown = solve_model_with_copper_limit(copper_limit, data)
-        
-        if is_feasible and cost_breakdown:
-            results.append({
-                "Copper Limit": copper_limit,
-                "Total Cost": cost_breakdown["total_cost"],
-                "Storage Cost": cost_breakdown["storage_cost"],
-                "Electrolysis Cost": cost_breakdown["electrolysis_cost"],
-                "Procurement Cost": cost_breakdown["procurement_cost"]
-            })
-    
+        is_feasible, cost_breakdown = solve_model_with_copper_limit(copper_limit, data, policy)
+
+        if cost_breakdown:
+            yield copper_limit_row(copper_limit, cost_breakdown)
+
+
+def scan_copper_limits(data, start=0.000, end=0.03, step=0.001, resume=False, policy=None):
+    """
+    Scan through different copper limits and save results to Excel.
+    Results are appended to a CSV checkpoint as they are solved; with resume, limits already
+    in the checkpoint are not solved again.
+    """
+    base_path = os.path.join(os.path.dirname(__file__), "copper_limit_analysis")
+    checkpoint_path = base_path + ".csv"
+
+    skip_limits = []
+    if resume:
+        done = read_results(checkpoint_path)
+        if "Copper Limit" in done.columns:
+            skip_limits = done["Copper Limit"].tolist()
+    stream_to_file(iter_copper_limits(data, start, end, step, skip_limits, policy), checkpoint_path,
+                   chunk_size=10, resume=resume)
+
     # Convert results to DataFrame
-    results_df = pd.DataFrame(results)
-    
+    results_df = read_results(checkpoint_path)
+    if not results_df.empty:
+        results_df = results_df.sort_values("Copper Limit").reset_index(drop=True)
+
     # Save to Excel
-    excel_path = os.path.join(os.path.dirname(__file__), "copper_limit_analysis.xlsx")
+    excel_path = base_path + ".xlsx"
     results_df.to_excel(excel_path, index=False)
     print(f"\nResults saved to: {excel_path}")
-    
-    return results_df
 
-# Main execution
-if __name__ == "__main__":
-    # Get base data
-    data = get_supplier_data_e(data_e)
-    
-    # Scan copper limits and save results
-    results_df = scan_copper_limits(data)
-    
-    # Display summary
-    print("\nSummary of results:")
-    print(results_df.to_string(index=False))
+    return results_df
 
-    df = pd.read_excel('copper_limit_analysis.xlsx')
+def plot_copper_limits(df, save_path=None):
+    """Plot every cost component against the copper limit (shown on screen unless save_path is given)"""
+    import matplotlib
+    if save_path is not None:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
 
     # Set the columns to be plotted against 'Copper Limit'
     columns_to_plot = ['Total Cost', 'Storage Cost', 'Electrolysis Cost', 'Procurement Cost']
@@ -243,5 +211,24 @@ if __name__ == "__main__":
 
     # Adjust layout to make room for the legend
     plt.tight_layout()
-    # Show the plot
-    plt.show()
+    if save_path is None:
+        # Show the plot
+        plt.show()
+    else:
+        plt.savefig(save_path)
+        plt.close()
+
+
+# Main execution
+if __name__ == "__main__":
+    # Get base data
+    data = get_supplier_data_e(data_e)
+
+    # Scan copper limits and save results
+    results_df = scan_copper_limits(data)
+
+    # Display summary
+    print("\nSummary of results:")
+    print(results_df.to_string(index=False))
+
+    plot_copper_limits(results_df)
@@ -0,0 +1,312 @@
+"""
+Sparse constraint-matrix templates for the model_b (blending LP) and model_e (electrolysis MILP)
+formulations.
+
+The structure of the constraint matrix only depends on (products, suppliers, months), so it is
+compiled once per shape with vectorized NumPy indexing and cached: CSR pattern, senses, variable
+and constraint names and index maps. A scenario then only fills the coefficient, right-hand side,
+objective and bound vectors and loads everything in bulk with addMVar/addMConstr.
+
+Rows (same names and order as the term-by-term builders), for every month t:
+    balance[i,t]       P[i,t] + S[i,t-1] - S[i,t] (- m[i,t])           == demand[i,t]
+    capacity[t]        sum_i P[i,t]                                     <= max_production[t]
+    supply[j,t]        sum_i X[i,j,t]                                   <= max_supply[j,t]
+    blend[i,t]         P[i,t] - sum_j X[i,j,t]                          == 0
+    chromium[i,t]      ratio_i (P[i,t] - m[i,t]) - sum_j Cr_j X[i,j,t]  == 0
+    nickel[i,t]        ratio_i (P[i,t] - m[i,t]) - sum_j Ni_j X[i,j,t]  == 0
+    copper[i,t]        sum_j Cu_j X[i,j,t] - m[i,t] - L (P[i,t] - m[i,t]) <= 0     (model_e)
+    electrolysis[i,t]  m[i,t] - M B[t]                                  <= 0     (model_e)
+model_b adds the blend/chromium/nickel rows family by family within a month, model_e product by product.
+"""
+from functools import lru_cache
+
+import numpy as np
+import scipy.sparse as sp
+import gurobipy as gp
+from gurobipy import GRB
+
+from solver_env import new_model
+
+# Big M of the electrolysis rows (as in model_e)
+BIG_M = 999999
+
+
+def _parameter_layout(num_product, num_supplier):
+    """Offsets of the coefficient parameters in the per-scenario parameter vector (index 0 is the constant 1)"""
+    layout = {}
+    offset = 1
+    for name, length in [("chromium_ratio", num_product), ("nickel_ratio", num_product),
+                         ("chromium_content", num_supplier), ("nickel_content", num_supplier),
+                         ("copper_content", num_supplier), ("copper_limit", 1), ("big_m", 1)]:
+        layout[name] = (offset, length)
+        offset += length
+    return layout, offset
+
+
+def _names(family, *shape):
+    """Names 'family[i,j,...]' for every index of shape, in C order"""
+    grids = np.indices(shape).reshape(len(shape), -1).T
+    return [f"{family}[{','.join(map(str, index))}]" for index in grids]
+
+
+@lru_cache(maxsize=32)
+def compile_template(num_product, num_supplier, months, electrolysis=False):
+    """
+    Compile the structure of the model for one shape. Every nonzero gets its value as
+    scale * parameters[source] + offset, so filling a scenario is one gather over the parameter vector.
+    """
+    n_p, n_s, T = num_product, num_supplier, months
+    layout, num_params = _parameter_layout(n_p, n_s)
+
+    # Variable index maps, in the order of addVars: P, S, X (, B, m)
+    P = np.arange(n_p * T).reshape(n_p, T)
+    S = P + n_p * T
+    X = np.arange(n_p * n_s * T).reshape(n_p, n_s, T) + 2 * n_p * T
+    num_vars = 2 * n_p * T + n_p * n_s * T
+    index = {"P": P, "S": S, "X": X}
+    var_names = _names("P", n_p, T) + _names("S", n_p, T) + _names("X", n_p, n_s, T)
+    vtype = [GRB.CONTINUOUS] * num_vars
+    if electrolysis:
+        index["B"] = np.arange(T) + num_vars
+        index["m"] = np.arange(n_p * T).reshape(n_p, T) + num_vars + T
+        num_vars += T + n_p * T
+        var_names += _names("B", T) + _names("m", n_p, T)
+        vtype += [GRB.BINARY] * T + [GRB.CONTINUOUS] * (n_p * T)
+
+    def param(name, k=0):
+        return layout[name][0] + k
+
+    families = []  # (name, shape, sense, order keys, entries)
+
+    # Nonzero entries of a family: local row, column, parameter source, scale, offset
+    def entries(rows, cols, source=0, scale=1.0, offset=0.0):
+        rows, cols = np.broadcast_arrays(np.asarray(rows), np.asarray(cols))
+        shape = rows.shape
+        return [rows.ravel(), cols.ravel(), np.broadcast_to(source, shape).ravel(),
+                np.broadcast_to(scale, shape).ravel().astype(float), np.broadcast_to(offset, shape).ravel().astype(float)]
+
+    i_t = np.arange(n_p * T).reshape(n_p, T)  # local row of (i, t) families
+    j_t = np.arange(n_s * T).reshape(n_s, T)
+    t_idx = np.broadcast_to(np.arange(T), (n_p, T))
+    i_idx = np.broadcast_to(np.arange(n_p)[:, None], (n_p, T))
+
+    # Balance rows
+    parts = [entries(i_t, P), entries(i_t, S, scale=-1.0), entries(i_t[:, 1:], S[:, :-1])]
+    if electrolysis:
+        parts.append(entries(i_t, index["m"], scale=-1.0))
+    families.append(("balance", (n_p, T), GRB.EQUAL, (t_idx, 0, i_idx, 0), parts))
+
+    # Capacity rows
+    families.append(("capacity", (T,), GRB.LESS_EQUAL, (np.arange(T), 1, 0, 0),
+                     [entries(np.broadcast_to(np.arange(T), (n_p, T)), P)]))
+
+    # Supply rows
+    families.append(("supply", (n_s, T), GRB.LESS_EQUAL,
+                     (np.broadcast_to(np.arange(T), (n_s, T)), 2, np.broadcast_to(np.arange(n_s)[:, None], (n_s, T)), 0),
+                     [entries(np.broadcast_to(j_t, (n_p, n_s, T)), X)]))
+
+    # Blend and composition rows; X columns broadcast over (i, j, t)
+    i_jt = np.broadcast_to(i_t[:, None, :], (n_p, n_s, T))
+    j_of_x = np.broadcast_to(np.arange(n_s)[None, :, None], (n_p, n_s, T))
+    i_of_p = np.broadcast_to(np.arange(n_p)[:, None], (n_p, T))
+    per_product = [
+        ("blend", [entries(i_t, P), entries(i_jt, X, scale=-1.0)]),
+        ("chromium", [entries(i_t, P, source=param("chromium_ratio", i_of_p)),
+                      entries(i_jt, X, source=param("chromium_content", j_of_x), scale=-1.0)]),
+        ("nickel", [entries(i_t, P, source=param("nickel_ratio", i_of_p)),
+                    entries(i_jt, X, source=param("nickel_content", j_of_x), scale=-1.0)]),
+    ]
+    if electrolysis:
+        m = index["m"]
+        per_product[1][1].append(entries(i_t, m, source=param("chromium_ratio", i_of_p), scale=-1.0))
+        per_product[2][1].append(entries(i_t, m, source=param("nickel_ratio", i_of_p), scale=-1.0))
+        per_product.append(("copper", [entries(i_jt, X, source=param("copper_content", j_of_x)),
+                                       entries(i_t, m, source=param("copper_limit"), offset=-1.0),
+                                       entries(i_t, P, source=param("copper_limit"), scale=-1.0)]))
+        per_product.append(("electrolysis", [entries(i_t, m),
+                                             entries(i_t, np.broadcast_to(index["B"], (n_p, T)),
+                                                     source=param("big_m"), scale=-1.0)]))
+    senses = {"blend": GRB.EQUAL, "chromium": GRB.EQUAL, "nickel": GRB.EQUAL,
+              "copper": GRB.LESS_EQUAL, "electrolysis": GRB.LESS_EQUAL}
+    for position, (name, parts) in enumerate(per_product):
+        # model_e interleaves the families per product, model_b adds them family by family
+        keys = (t_idx, 3, i_idx, position) if electrolysis else (t_idx, 3 + position, i_idx, 0)
+        families.append((name, (n_p, T), senses[name], keys, parts))
+
+    # Global row order: month, stage, product/supplier, family
+    row_keys, row_names, row_senses, nonzeros = [], [], [], []
+    first_row = 0
+    for name, shape, sense, keys, parts in families:
+        size = int(np.prod(shape))
+        row_keys.append(np.stack([np.broadcast_to(np.asarray(key), shape).ravel() for key in keys]))
+        row_names += _names(name, *shape)
+        row_senses += [sense] * size
+        for rows, cols, source, scale, offset in parts:
+            nonzeros.append((rows + first_row, cols, source, scale, offset))
+        first_row += size
+    keys = np.concatenate(row_keys, axis=1)
+    order = np.lexsort(keys[::-1])  # sort by month first
+    position = np.empty_like(order)
+    position[order] = np.arange(order.size)
+
+    rows = position[np.concatenate([entry[0] for entry in nonzeros])]
+    cols = np.concatenate([entry[1] for entry in nonzeros])
+    source = np.concatenate([entry[2] for entry in nonzeros])
+    scale = np.concatenate([entry[3] for entry in nonzeros])
+    offset = np.concatenate([entry[4] for entry in nonzeros])
+
+    # Put the nonzeros in CSR order once, so a scenario only computes the data array
+    csr_order = np.lexsort((cols, rows))
+    num_rows = order.size
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=num_rows))])
+
+    family_rows = {}
+    start = 0
+    for name, shape, *_ in families:
+        size = int(np.prod(shape))
+        family_rows[name] = position[start:start + size].reshape(shape)
+        start += size
+
+    template = {
+        "shape": (n_p, n_s, T),
+        "electrolysis": electrolysis,
+        "layout": layout,
+        "num_params": num_params,
+        "num_vars": num_vars,
+        "num_rows": num_rows,
+        "index": index,
+        "rows": family_rows,
+        "var_names": np.array(var_names),
+        "vtype": np.array(vtype),
+        "constr_names": [row_names[k] for k in order],
+        "sense": np.array(row_senses)[order],
+        "indices": cols[csr_order],
+        "indptr": indptr,
+        "source": source[csr_order],
+        "scale": scale[csr_order],
+        "offset": offset[csr_order],
+    }
+    for value in template.values():
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+    return template
+
+
+def scenario_vectors(template, params):
+    """
+    Coefficient, RHS, objective and bound vectors of one scenario. params holds
+    chromium_content, nickel_content, max_supply (per supplier, or supplier x month), costs,
+    chromium_ratio, nickel_ratio, demand (product x month), storage_costs, max_production (scalar or
+    per month) and, for model_e, copper_content, copper_limit, electrolysis_fixed_cost and
+    electrolysis_unit_cost. Optional lb/ub ({family: array of the family's shape}) override variable bounds.
+    """
+    n_p, n_s, T = template["shape"]
+    layout = template["layout"]
+    index = template["index"]
+    rows = template["rows"]
+
+    values = np.zeros(template["num_params"])
+    values[0] = 1.0
+    for name, (offset, length) in layout.items():
+        if name == "big_m":
+            values[offset] = params.get("big_m", BIG_M)
+        elif name in params:
+            values[offset:offset + length] = np.ravel(params[name])
+
+    rhs = np.zeros(template["num_rows"])
+    rhs[rows["balance"]] = np.asarray(params["demand"], dtype=float).reshape(n_p, T)
+    rhs[rows["capacity"]] = np.broadcast_to(np.asarray(params["max_production"], dtype=float), (T,))
+    max_supply = np.asarray(params["max_supply"], dtype=float)
+    rhs[rows["supply"]] = max_supply.reshape(n_s, T) if max_supply.ndim == 2 else max_supply[:, None]
+
+    obj = np.zeros(template["num_vars"])
+    obj[index["X"]] = np.asarray(params["costs"], dtype=float)[None, :, None]
+    obj[index["S"]] = np.asarray(params["storage_costs"], dtype=float)[:, None]
+    if template["electrolysis"]:
+        obj[index["B"]] = params["electrolysis_fixed_cost"]
+        obj[index["m"]] = params["electrolysis_unit_cost"]
+
+    lb = np.zeros(template["num_vars"])
+    ub = np.full(template["num_vars"], np.inf)
+    if template["electrolysis"]:
+        ub[index["B"]] = 1.0
+    for bounds, target in ((params.get("lb"), lb), (params.get("ub"), ub)):
+        for family, array in (bounds or {}).items():
+            target[index[family]] = array
+
+    coefficients = template["scale"] * values[template["source"]] + template["offset"]
+    return {"coefficients": coefficients, "rhs": rhs, "obj": obj, "lb": lb, "ub": ub}
+
+
+def load_model(template, vectors, verbose=False, columns=None):
+    """
+    Create a model from a template and scenario vectors; returns the model and tupledicts of its variables.
+    With columns (sorted template column indices, e.g. from presolve.py) only those variables are created
+    and the tupledicts leave the others out.
+    """
+    model = new_model(verbose=verbose)
+    A = sp.csr_matrix((vectors["coefficients"], template["indices"], template["indptr"]),
+                      shape=(template["num_rows"], template["num_vars"]))
+    columns = np.arange(template["num_vars"]) if columns is None else np.asarray(columns)
+    if columns.size < template["num_vars"]:
+        A = A[:, columns]
+    x = model.addMVar(columns.size, lb=vectors["lb"][columns], ub=vectors["ub"][columns],
+                      obj=vectors["obj"][columns], vtype=template["vtype"][columns],
+                      name=template["var_names"][columns])
+    constrs = model.addMConstr(A, x, template["sense"], vectors["rhs"])
+    model.setAttr("ConstrName", constrs.tolist(), template["constr_names"])
+    model.ModelSense = GRB.MINIMIZE
+
+    # Variables keyed like addVars, so results and reports work on either kind of model
+    variables = np.full(template["num_vars"], None, dtype=object)
+    variables[columns] = x.tolist()
+    tupledicts = {}
+    for family, idx in template["index"].items():
+        keys = [tuple(int(k) for k in key) if len(key) > 1 else int(key[0]) for key in np.ndindex(idx.shape)]
+        tupledicts[family] = gp.tupledict((key, variables[k]) for key, k in zip(keys, idx.ravel())
+                                          if variables[k] is not None)
+    return model, tupledicts
+
+
+def params_b(data):
+    """Template parameters from the tuple of data.get_supplier_data"""
+    months, chromium_content, nickel_content, max_supply, costs, \
+        chromium_content_ratio, nickel_content_ratio, \
+        demand, storage_costs, max_production, num_product, num_supplier = data
+    return {
+        "chromium_content": chromium_content, "nickel_content": nickel_content, "max_supply": max_supply,
+        "costs": costs, "chromium_ratio": chromium_content_ratio, "nickel_ratio": nickel_content_ratio,
+        "demand": demand, "storage_costs": storage_costs, "max_production": max_production,
+    }
+
+
+def params_e(copper_limit, data):
+    """Template parameters from the tuple of get_supplier_data_e and a copper limit"""
+    months, chromium_content, nickel_content, copper_content, \
+        max_supply, costs, chromium_content_ratio, nickel_content_ratio, \
+        _, demand, storage_costs, max_production, \
+        electrolysis_fixed_cost, electrolysis_unit_cost, \
+        num_product, num_supplier = data
+    return {
+        "chromium_content": chromium_content, "nickel_content": nickel_content,
+        "copper_content": copper_content, "max_supply": max_supply, "costs": costs,
+        "chromium_ratio": chromium_content_ratio, "nickel_ratio": nickel_content_ratio,
+        "demand": demand, "storage_costs": storage_costs, "max_production": max_production,
+        "copper_limit": copper_limit, "electrolysis_fixed_cost": electrolysis_fixed_cost,
+        "electrolysis_unit_cost": electrolysis_unit_cost,
+    }
+
+
+def build_model_b(data, verbose=False, **overrides):
+    """model_b from the tuple of data.get_supplier_data; returns the model and (P, S, X)"""
+    template = compile_template(data[-2], data[-1], data[0])
+    model, variables = load_model(template, scenario_vectors(template, {**params_b(data), **overrides}), verbose)
+    return model, (variables["P"], variables["S"], variables["X"])
+
+
+def build_model_e(copper_limit, data, verbose=False, **overrides):
+    """model_e from the tuple of get_supplier_data_e; returns the model and (P, S, X, B, m)"""
+    template = compile_template(data[-2], data[-1], data[0], electrolysis=True)
+    params = {**params_e(copper_limit, data), **overrides}
+    model, variables = load_model(template, scenario_vectors(template, params), verbose)
+    return model, tuple(variables[family] for family in ("P", "S", "X", "B", "m"))
@@ -0,0 +1,282 @@
+"""
+Batched primal-dual hybrid gradient (PDHG) LP solver in NumPy, for screening many model_b variants.
+
+Problems built from one template (backends.problem_b) share the constraint matrix and differ only in
+their objective and right-hand side vectors, so a whole batch is iterated at once: the iterates are
+(variables x scenarios) matrices and every step is one sparse matrix-matrix product with K and K'.
+
+    min c'x  s.t.  K x = q (equality rows), K x >= q (other rows), l <= x <= u
+
+The matrix is equilibrated (Ruiz, then Pock-Chambolle) before iterating; every scenario has its own
+primal weight, restarts to the average iterate when its KKT error has decayed enough (adaptive
+restarts as in PDLP) and leaves the batch once its relative KKT error is below eps.
+Answers are approximate; polish() finishes one with a short Gurobi simplex from the PDHG point.
+"""
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from gurobipy import GRB
+
+# Relative KKT error at which a scenario counts as solved
+DEFAULT_EPS = 1e-4
+
+# Iterations between KKT error checks (and restart decisions)
+CHECK_EVERY = 64
+
+# Restart when the KKT error of the candidate fell below these fractions of the error at the last restart
+SUFFICIENT_DECAY = 0.2
+NECESSARY_DECAY = 0.8
+ARTIFICIAL_RESTART = 0.36
+
+
+def _equilibrate(K, ruiz_iterations=10):
+    """Row and column scaling d_row, d_col so that diag(d_row) K diag(d_col) is well conditioned"""
+    m, n = K.shape
+    d_row, d_col = np.ones(m), np.ones(n)
+    scaled = abs(K).tocsr()
+    for _ in range(ruiz_iterations):
+        row_max = scaled.max(axis=1).toarray().ravel()
+        col_max = scaled.max(axis=0).toarray().ravel()
+        row_factor = 1 / np.sqrt(np.where(row_max > 0, row_max, 1.0))
+        col_factor = 1 / np.sqrt(np.where(col_max > 0, col_max, 1.0))
+        d_row *= row_factor
+        d_col *= col_factor
+        scaled = sp.diags(row_factor) @ scaled @ sp.diags(col_factor)
+
+    # Pock-Chambolle scaling (alpha = 1)
+    row_sum = np.asarray(scaled.sum(axis=1)).ravel()
+    col_sum = np.asarray(scaled.sum(axis=0)).ravel()
+    d_row /= np.sqrt(np.where(row_sum > 0, row_sum, 1.0))
+    d_col /= np.sqrt(np.where(col_sum > 0, col_sum, 1.0))
+    return d_row, d_col
+
+
+def _norm_estimate(K, iterations=50, seed=0):
+    """Largest singular value of K by power iteration"""
+    v = np.random.default_rng(seed).standard_normal(K.shape[1])
+    for _ in range(iterations):
+        v = K.T @ (K @ v)
+        v /= np.linalg.norm(v)
+    return np.sqrt(np.linalg.norm(K.T @ (K @ v)))
+
+
+def _kkt(K, KT, C, Q, L, U, is_inequality, X, Y):
+    """
+    Relative primal residual, dual residual and duality gap per column (original scaling),
+    plus the primal and dual objectives
+    """
+    residual = K @ X - Q
+    residual[is_inequality] = np.minimum(residual[is_inequality], 0.0)
+    reduced = C - KT @ Y
+
+    has_lower, has_upper = np.isfinite(L), np.isfinite(U)
+    # Reduced costs must be >= 0 at variables with only a lower bound, <= 0 with only an upper bound
+    dual_residual = np.where(has_lower & ~has_upper, np.minimum(reduced, 0.0),
+                             np.where(has_upper & ~has_lower, np.maximum(reduced, 0.0),
+                                      np.where(has_lower | has_upper, 0.0, reduced)))
+    primal_obj = np.einsum("ij,ij->j", C, X)
+    dual_obj = np.einsum("ij,ij->j", Q, Y)
+    dual_obj += (np.where(has_lower, L, 0.0) * np.maximum(reduced, 0.0)).sum(axis=0)
+    dual_obj += (np.where(has_upper, U, 0.0) * np.minimum(reduced, 0.0)).sum(axis=0)
+
+    primal_error = np.linalg.norm(residual, axis=0) / (1 + np.linalg.norm(Q, axis=0))
+    dual_error = np.linalg.norm(dual_residual, axis=0) / (1 + np.linalg.norm(C, axis=0))
+    gap = np.abs(primal_obj - dual_obj) / (1 + np.abs(primal_obj) + np.abs(dual_obj))
+    return np.maximum.reduce([primal_error, dual_error, gap]), primal_obj, dual_obj
+
+
+def solve_stacked(A, sense, C, B, lb, ub, eps=DEFAULT_EPS, max_iterations=20000):
+    """
+    Solve min C[:, k]'x s.t. A x (sense) B[:, k], lb <= x <= ub for every column k at once.
+    Returns X (n x k), duals in Gurobi's sign convention (m x k), KKT error, iterations and
+    whether each column converged.
+    """
+    num_rows, num_vars = A.shape
+    num_problems = C.shape[1]
+
+    # Rows as K x >= q (<= rows negated) and the diagonal preconditioner
+    row_sign = np.where(sense == GRB.LESS_EQUAL, -1.0, 1.0)
+    is_inequality = sense != GRB.EQUAL
+    K = (sp.diags(row_sign) @ A).tocsr()
+    Q = row_sign[:, None] * B
+    L, U = lb[:, None], ub[:, None]
+    d_row, d_col = _equilibrate(K)
+    Ks = (sp.diags(d_row) @ K @ sp.diags(d_col)).tocsr()
+    KsT = Ks.T.tocsr()
+    KT = K.T.tocsr()
+    Cs, Qs = d_col[:, None] * C, d_row[:, None] * Q
+    Ls, Us = L / d_col[:, None], U / d_col[:, None]
+    step = 0.95 / _norm_estimate(Ks)
+
+    c_norm, q_norm = np.linalg.norm(Cs, axis=0), np.linalg.norm(Qs, axis=0)
+    weight = np.where((c_norm > 0) & (q_norm > 0), c_norm / np.where(q_norm > 0, q_norm, 1.0), 1.0)
+
+    X_out = np.zeros((num_vars, num_problems))
+    Y_out = np.zeros((num_rows, num_problems))
+    error_out = np.full(num_problems, np.inf)
+    iterations_out = np.full(num_problems, max_iterations)
+    converged_out = np.zeros(num_problems, dtype=bool)
+
+    active = np.arange(num_problems)
+    X = np.zeros((num_vars, num_problems))
+    X = np.clip(X, Ls, Us)
+    Y = np.zeros((num_rows, num_problems))
+    X_sum, Y_sum = np.zeros_like(X), np.zeros_like(Y)
+    X_restart, Y_restart = X.copy(), Y.copy()
+    last_restart = np.zeros(num_problems, dtype=int)
+    restart_error = np.full(num_problems, np.inf)
+    previous_error = np.full(num_problems, np.inf)
+
+    def unscale(Xs, Ys):
+        return d_col[:, None] * Xs, d_row[:, None] * Ys
+
+    for iteration in range(1, max_iterations + 1):
+        tau, sigma = step / weight, step * weight
+        X_new = np.clip(X - tau * (Cs[:, active] - KsT @ Y), Ls, Us)
+        Y = Y + sigma * (Qs[:, active] - Ks @ (2 * X_new - X))
+        Y[is_inequality] = np.maximum(Y[is_inequality], 0.0)
+        X = X_new
+        X_sum += X
+        Y_sum += Y
+
+        if iteration % CHECK_EVERY and iteration != max_iterations:
+            continue
+
+        # KKT error of the current and the average iterate since the last restart
+        count = iteration - last_restart
+        X_avg, Y_avg = X_sum / count, Y_sum / count
+        C_act, Q_act = C[:, active], Q[:, active]
+        error_current, _, _ = _kkt(K, KT, C_act, Q_act, L, U, is_inequality, *unscale(X, Y))
+        error_average, _, _ = _kkt(K, KT, C_act, Q_act, L, U, is_inequality, *unscale(X_avg, Y_avg))
+        use_average = error_average < error_current
+        X_cand = np.where(use_average, X_avg, X)
+        Y_cand = np.where(use_average, Y_avg, Y)
+        error = np.minimum(error_average, error_current)
+
+        done = (error <= eps) | (iteration == max_iterations)
+        if done.any():
+            finished = active[done]
+            X_done, Y_done = unscale(X_cand[:, done], Y_cand[:, done])
+            X_out[:, finished], Y_out[:, finished] = X_done, row_sign[:, None] * Y_done
+            error_out[finished] = error[done]
+            iterations_out[finished] = iteration
+            converged_out[finished] = error[done] <= eps
+
+        restart = (error <= SUFFICIENT_DECAY * restart_error) | \
+                  ((error <= NECESSARY_DECAY * restart_error) & (error > previous_error)) | \
+                  (iteration - last_restart >= ARTIFICIAL_RESTART * iteration)
+        previous_error = error
+        if restart.any():
+            # Primal weight update from the movement since the last restart (smoothed in log space)
+            dx = np.linalg.norm(X_cand[:, restart] - X_restart[:, restart], axis=0)
+            dy = np.linalg.norm(Y_cand[:, restart] - Y_restart[:, restart], axis=0)
+            moved = (dx > 1e-10) & (dy > 1e-10)
+            new_weight = weight[restart].copy()
+            new_weight[moved] = np.exp(0.5 * np.log(dy[moved] / dx[moved]) + 0.5 * np.log(new_weight[moved]))
+            weight[restart] = new_weight
+            X[:, restart], Y[:, restart] = X_cand[:, restart], Y_cand[:, restart]
+            X_restart[:, restart], Y_restart[:, restart] = X[:, restart], Y[:, restart]
+            X_sum[:, restart], Y_sum[:, restart] = 0.0, 0.0
+            last_restart[restart] = iteration
+            restart_error[restart] = error[restart]
+
+        if done.any():
+            keep = ~done
+            active = active[keep]
+            if active.size == 0:
+                break
+            X, Y, X_sum, Y_sum = X[:, keep], Y[:, keep], X_sum[:, keep], Y_sum[:, keep]
+            X_restart, Y_restart = X_restart[:, keep], Y_restart[:, keep]
+            weight, last_restart = weight[keep], last_restart[keep]
+            restart_error, previous_error = restart_error[keep], previous_error[keep]
+
+    return X_out, Y_out, error_out, iterations_out, converged_out
+
+
+def _group_key(problem):
+    """Problems of one group share the matrix and the bounds"""
+    return (id(problem["template"]), problem["A"].data.tobytes(), problem["lb"].tobytes(), problem["ub"].tobytes())
+
+
+def solve_batch(problems, eps=DEFAULT_EPS, max_iterations=20000, polish_with_gurobi=False):
+    """
+    Solve a list of LP problems (backends.problem_b) in batches of identical matrices. Returns one
+    result dictionary per problem in the format of backends.py, with status 'APPROXIMATE' (KKT error
+    below eps), 'ITERATION_LIMIT' or, after polishing, Gurobi's status.
+    """
+    from backends import _result
+
+    groups = {}
+    for k, problem in enumerate(problems):
+        groups.setdefault(_group_key(problem), []).append(k)
+
+    results = [None] * len(problems)
+    for members in groups.values():
+        first = problems[members[0]]
+        start = time.perf_counter()
+        X, Y, error, iterations, converged = solve_stacked(
+            first["A"], first["sense"],
+            np.column_stack([problems[k]["c"] for k in members]),
+            np.column_stack([problems[k]["b"] for k in members]),
+            first["lb"], first["ub"], eps, max_iterations)
+        runtime = (time.perf_counter() - start) / len(members)
+        for column, k in enumerate(members):
+            x, y = X[:, column], Y[:, column]
+            objective = float(problems[k]["c"] @ x)
+            result = _result("APPROXIMATE" if converged[column] else "ITERATION_LIMIT", False, objective, x, y,
+                             gap=float(error[column]), runtime=runtime)
+            result["iterations"] = int(iterations[column])
+            if polish_with_gurobi:
+                result = polish(problems[k], result)
+            results[k] = result
+    return results
+
+
+def polish(problem, result, method=0):
+    """
+    Finish a PDHG answer with Gurobi: the primal and dual points are passed as PStart/DStart and
+    the simplex (primal by default, which profits most here) starts from them.
+    """
+    from anytime import solve_outcome
+    from backends import _result
+    from model_template import load_model
+
+    model, _ = load_model(problem["template"], problem["vectors"])
+    with model:
+        model.Params.Method = method
+        model.Params.LPWarmStart = 2
+        model.update()
+        model.setAttr("PStart", model.getVars(), result["x"].tolist())
+        model.setAttr("DStart", model.getConstrs(), result["duals"].tolist())
+        model.optimize()
+        outcome = solve_outcome(model)
+        if not outcome["has_solution"]:
+            return {**result, "status": outcome["status"], "polish_iterations": int(model.IterCount)}
+        polished = _result(outcome["status"], outcome["optimal"], outcome["incumbent"],
+                           np.array(model.getAttr("X", model.getVars())),
+                           np.array(model.getAttr("Pi", model.getConstrs())),
+                           outcome["bound"], outcome["gap"], result["runtime"] + model.Runtime)
+        polished["iterations"] = result.get("iterations")
+        polished["polish_iterations"] = int(model.IterCount)
+        polished["pdhg_objective"] = result["objective"]
+        return polished
+
+
+def experiment_rows(scenarios, eps=DEFAULT_EPS, polish_with_gurobi=False):
+    """Rows of d_test.iter_experiments from one batched PDHG solve of all scenarios (approximate costs)"""
+    from data import get_supplier_data
+    from d_test import collect_results
+    from backends import problem_b, plan_arrays
+
+    supplier_data = [get_supplier_data(scenario) for scenario in scenarios]
+    problems = [problem_b(data) for data in supplier_data]
+    results = solve_batch(problems, eps, polish_with_gurobi=polish_with_gurobi)
+    for scenario, data, problem, result in zip(scenarios, supplier_data, problems, results):
+        storage_costs, procurement_costs = data[8], data[4]
+        if result["x"] is not None and result["status"] != "ITERATION_LIMIT":
+            plan = plan_arrays(problem, result["x"])
+            yield collect_results(scenario, result["objective"], plan["P"], plan["S"], plan["X"],
+                                  storage_costs, procurement_costs)
+        else:
+            yield collect_results(scenario, None, None, None, None, storage_costs, procurement_costs)
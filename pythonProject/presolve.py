@@ -0,0 +1,206 @@
+"""
+Composition presolve of the blending models, run on the supplier composition matrix before building.
+
+Every product i has the composition equalities (with P[i,t] = sum_j X[i,j,t] from its blend row)
+    sum_j (Cr_j - cr_i) X[i,j,t] = 0        sum_j (Ni_j - ni_i) X[i,j,t] = 0
+(in model_e the right-hand side is -ratio_i m[i,t] <= 0). When all usable suppliers of a product lie
+on one side of its target, the suppliers strictly on that side can only take part at zero, e.g. 18/0
+needs 0 nickel, so no nickel-bearing supplier can be used for it. Removing them may put the remaining
+suppliers on one side of the other element, so the rule is applied until nothing changes.
+
+A supplier can take over the procurement of another one with the same chromium and nickel content
+(these enter the composition equalities) and no more copper (which only enters the copper <= rows of
+model_e). A month's total procurement is at most max_production, so once the cheaper of these
+suppliers can supply max_production in every month, the more expensive one is never needed
+(dominated). Suppliers of other compositions are not compared: whether a mix of them can replace a
+supplier depends on the product targets, which this presolve does not check.
+
+The presolved problem is built on the template of the kept suppliers, without the X columns of the
+forced-zero pairs; backends.solve and backends.plan_arrays map its solution back to the full catalog.
+"""
+import numpy as np
+
+from model_template import compile_template, scenario_vectors
+
+# Tolerance on composition differences and supply amounts
+COMPOSITION_TOL = 1e-9
+
+# Per-supplier entries of the template parameters
+SUPPLIER_PARAMS = ("chromium_content", "nickel_content", "copper_content", "max_supply", "costs")
+
+
+def forced_zero_pairs(params, usable, electrolysis=False, tol=COMPOSITION_TOL):
+    """(product, supplier) mask of the pairs whose X is forced to zero by the composition equalities"""
+    elements = [(np.asarray(params["chromium_content"], dtype=float), np.asarray(params["chromium_ratio"])),
+                (np.asarray(params["nickel_content"], dtype=float), np.asarray(params["nickel_ratio"]))]
+    num_product = len(elements[0][1])
+    forced = np.zeros((num_product, len(usable)), dtype=bool)
+    for i in range(num_product):
+        active = usable.copy()
+        changed = True
+        while changed and active.any():
+            changed = False
+            for content, ratio in elements:
+                difference = content - ratio[i]
+                cut = np.zeros_like(active)
+                if np.all(difference[active] >= -tol):
+                    cut |= active & (difference > tol)
+                # With electrolysis the equality only holds up to -ratio * m <= 0, so only one side forces zeros
+                if not electrolysis and np.all(difference[active] <= tol):
+                    cut |= active & (difference < -tol)
+                if cut.any():
+                    active &= ~cut
+                    changed = True
+        forced[i] = usable & ~active
+    return forced
+
+
+def dominated_suppliers(params, supply, candidates, electrolysis=False, tol=COMPOSITION_TOL):
+    """
+    {supplier: kept suppliers dominating it} among the candidates. Supplier j dominates k when it has
+    the same chromium and nickel content, no more copper (model_e) and costs no more (ties broken by
+    copper, then index); k is dominated when its dominators cover max_production in every month.
+    """
+    composition = np.column_stack([np.asarray(params[name], dtype=float)
+                                   for name in ("chromium_content", "nickel_content")])
+    copper = np.asarray(params["copper_content"], dtype=float) if electrolysis else np.zeros(len(composition))
+    costs = np.asarray(params["costs"], dtype=float)
+    capacity = np.broadcast_to(np.asarray(params["max_production"], dtype=float), (supply.shape[1],))
+
+    index = np.flatnonzero(candidates)
+    _, group = np.unique(np.round(composition[index] / tol).astype(np.int64), axis=0, return_inverse=True)
+    dominated = {}
+    for g in np.flatnonzero(np.bincount(group.ravel()) > 1):
+        members = index[group.ravel() == g]
+        members = members[np.lexsort((members, copper[members], costs[members]))]
+        # dominates[a, b]: member b comes before a in that order and has no more copper
+        before = np.tril(np.ones((len(members), len(members)), dtype=bool), k=-1)
+        dominates = before & (copper[members][None, :] <= copper[members][:, None] + tol)
+        covered = np.all(dominates.astype(float) @ supply[members] >= capacity - tol, axis=1)
+        # Its kept dominators cover max_production too: the dominators of its first dominated
+        # dominator are all kept, and they dominate it as well
+        for a in np.flatnonzero(covered):
+            dominated[int(members[a])] = members[dominates[a] & ~covered].tolist()
+    return dominated
+
+
+def presolve(params, months, electrolysis=False):
+    """
+    Presolve report of a scenario (template parameters): suppliers kept, removed ones by reason,
+    forced-zero pairs of the kept suppliers and products left without any usable supplier
+    """
+    costs = np.asarray(params["costs"], dtype=float)
+    num_supplier = len(costs)
+    max_supply = np.asarray(params["max_supply"], dtype=float)
+    supply = max_supply if max_supply.ndim == 2 else np.repeat(max_supply[:, None], months, axis=1)
+
+    usable = supply.max(axis=1) > COMPOSITION_TOL
+    forced = forced_zero_pairs(params, usable, electrolysis)
+    unusable = usable & forced.all(axis=0)
+    dominated = dominated_suppliers(params, supply, usable & ~unusable, electrolysis)
+
+    removed = ~usable | unusable
+    removed[list(dominated)] = True
+    kept = np.flatnonzero(~removed)
+    demand = np.asarray(params["demand"], dtype=float)
+    return {
+        "num_suppliers": num_supplier,
+        "kept_suppliers": kept,
+        "no_supply": np.flatnonzero(~usable),
+        "unusable": np.flatnonzero(unusable),
+        "dominated": dominated,
+        "forced_pairs": forced[:, kept],
+        "products_without_supplier": np.flatnonzero((demand.sum(axis=1) > 0) & forced[:, kept].all(axis=1)),
+    }
+
+
+def reduced_params(params, kept):
+    """Template parameters restricted to the kept suppliers (also X bound overrides)"""
+    reduced = dict(params)
+    for name in SUPPLIER_PARAMS:
+        if name in params:
+            reduced[name] = np.asarray(params[name])[kept]
+    for bounds in ("lb", "ub"):
+        if params.get(bounds) and "X" in params[bounds]:
+            reduced[bounds] = {**params[bounds], "X": np.asarray(params[bounds]["X"])[:, kept]}
+    return reduced
+
+
+def presolved_problem(params, num_product, months, electrolysis=False):
+    """backends.matrix_problem of the presolved model, with the report under 'presolve'"""
+    from backends import matrix_problem
+
+    report = presolve(params, months, electrolysis)
+    kept = report["kept_suppliers"]
+    template = compile_template(num_product, len(kept), months, electrolysis)
+    vectors = scenario_vectors(template, reduced_params(params, kept))
+
+    dropped = template["index"]["X"][report["forced_pairs"]].ravel()
+    columns = np.setdiff1d(np.arange(template["num_vars"]), dropped)
+    problem = matrix_problem(template, vectors, columns)
+
+    removed_suppliers = report["num_suppliers"] - len(kept)
+    report["columns"] = (template["num_vars"] + removed_suppliers * num_product * months, columns.size)
+    report["rows"] = (template["num_rows"] + removed_suppliers * months, template["num_rows"])
+    problem["presolve"] = report
+    return problem
+
+
+def print_report(report, supplier_names=None, product_names=None, limit=10):
+    """Print what the presolve removed (at most limit names per list)"""
+    from results import PRODUCT_NAMES
+
+    num_supplier = report["num_suppliers"]
+    supplier_names = list(supplier_names) if supplier_names is not None else [str(j) for j in range(num_supplier)]
+    product_names = list(product_names) if product_names is not None else PRODUCT_NAMES
+
+    def names(indices):
+        shown = [supplier_names[j] for j in indices[:limit]]
+        return ", ".join(shown) + (f", ... ({len(indices)} in total)" if len(indices) > limit else "")
+
+    kept = report["kept_suppliers"]
+    print(f"Suppliers: {num_supplier} -> {len(kept)}")
+    if len(report["no_supply"]):
+        print(f"  without supply: {names(report['no_supply'])}")
+    if len(report["unusable"]):
+        print(f"  usable for no product: {names(report['unusable'])}")
+    if report["dominated"]:
+        dominated = sorted(report["dominated"])
+        print(f"  dominated by cheaper suppliers of the same Cr/Ni content and no more Cu: {names(dominated)}")
+    for i, product in enumerate(product_names):
+        pairs = kept[report["forced_pairs"][i]]
+        if len(pairs):
+            print(f"  {product}: composition forces zero procurement from {names(pairs)}")
+    for i in report["products_without_supplier"]:
+        print(f"  {product_names[i]} has demand but no usable supplier (infeasible)")
+    if "columns" in report:
+        print(f"Columns: {report['columns'][0]} -> {report['columns'][1]}, rows: {report['rows'][0]} -> {report['rows'][1]}")
+
+
+def compare(scenario, copper_limit=None, backend="highs"):
+    """
+    Presolve a scenario dictionary (model_e if a copper limit is given, else model_b), print the
+    report and solve the full and the presolved problem. Returns both results.
+    """
+    import time
+    import backends
+    from data import get_supplier_data, get_supplier_data_e
+
+    if copper_limit is None:
+        data = get_supplier_data(scenario)
+        build = lambda presolve: backends.problem_b(data, presolve=presolve)
+    else:
+        data = get_supplier_data_e(scenario)
+        build = lambda presolve: backends.problem_e(copper_limit, data, presolve=presolve)
+
+    results = {}
+    for presolve in (False, True):
+        start = time.perf_counter()
+        problem = build(presolve)
+        result = backends.solve(problem, backend)
+        results[presolve] = result
+        if presolve:
+            print_report(problem["presolve"], scenario["suppliers"])
+        print(f"{'Presolved' if presolve else 'Full'} model: {result['status']}, objective {result['objective']}, "
+              f"{problem['A'].shape[1]} columns, build + solve {time.perf_counter() - start:.2f}s")
+    return results[False], results[True]
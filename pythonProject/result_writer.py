@@ -0,0 +1,131 @@
+import csv
+import hashlib
+import io
+import os
+
+import pandas as pd
+
+import warm_start
+
+# Column holding the id used to skip finished scenarios on resume
+ID_COLUMN = "Scenario"
+
+# Rows kept in memory before they are appended to the file
+DEFAULT_CHUNK_SIZE = 100
+
+
+def scenario_id(params):
+    """Stable id of a scenario (any parameter structure accepted by warm_start.parameter_vector)"""
+    return hashlib.sha1(warm_start.parameter_vector(params).tobytes()).hexdigest()[:16]
+
+
+def _complete_lines(path):
+    """Text of the file up to its last newline; a line cut off by a crash is ignored"""
+    with open(path, newline="") as file:
+        text = file.read()
+    return text[:text.rfind("\n") + 1]
+
+
+def read_results(path):
+    """All complete rows of a result file as a DataFrame (empty if the file does not exist yet)"""
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    text = _complete_lines(path)
+    if not text:
+        return pd.DataFrame()
+    return pd.read_csv(io.StringIO(text))
+
+
+def read_rows(path):
+    """All complete rows of a result file as dictionaries of strings (no type conversion)"""
+    if not os.path.exists(path):
+        return []
+    return list(csv.DictReader(io.StringIO(_complete_lines(path))))
+
+
+def completed_ids(path, id_column=ID_COLUMN):
+    """Ids already present in a result file"""
+    results = read_results(path)
+    if id_column not in results.columns:
+        return set()
+    return set(results[id_column].astype(str))
+
+
+class ResultWriter:
+    """
+    Append-only CSV writer for sweep results. Rows are buffered and appended in chunks, and every
+    chunk is flushed and synced to disk, so a crash loses at most the rows of the current chunk.
+    """
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE, resume=False):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.rows_written = 0
+
+        if not resume and os.path.exists(path):
+            os.remove(path)
+        self.columns = None
+        if os.path.exists(path):
+            # Drop a partial last line before appending after it
+            text = _complete_lines(path)
+            with open(path, "w", newline="") as file:
+                file.write(text)
+            if text:
+                self.columns = next(csv.reader(io.StringIO(text)))
+
+    def write(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def _add_columns(self, columns):
+        """
+        Rewrite the file with the extra columns appended to its header (empty in the rows already
+        written), e.g. when resuming a checkpoint written before a column was added
+        """
+        self.columns = self.columns + columns
+        tmp_path = self.path + ".tmp"
+        with open(self.path, newline="") as source, open(tmp_path, "w", newline="") as target:
+            writer = csv.DictWriter(target, fieldnames=self.columns, restval="")
+            writer.writeheader()
+            writer.writerows(csv.DictReader(source))
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(tmp_path, self.path)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.columns is None:
+            self.columns = list(self.buffer[0])
+        new_columns = [key for key in dict.fromkeys(key for row in self.buffer for key in row)
+                       if key not in self.columns]
+        if new_columns:
+            self._add_columns(new_columns)
+        with open(self.path, "a", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=self.columns, restval="")
+            if file.tell() == 0:
+                writer.writeheader()
+            writer.writerows(self.buffer)
+            file.flush()
+            os.fsync(file.fileno())
+        self.rows_written += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stream_to_file(rows, path, chunk_size=DEFAULT_CHUNK_SIZE, resume=False):
+    """Write the rows of a sweep generator to path as they arrive; returns the number of rows written"""
+    with ResultWriter(path, chunk_size, resume) as writer:
+        for row in rows:
+            writer.write(row)
+    return writer.rows_written
@@ -0,0 +1,140 @@
+import os
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+# Product names in the order used by the demand table
+PRODUCT_NAMES = ["18/10", "18/8", "18/0"]
+
+
+def _values(model, variables, shape):
+    """Read the solution of a tupledict of variables in one call and reshape it to an array"""
+    return np.array(model.getAttr("X", list(variables.values()))).reshape(shape)
+
+
+class PlanResult:
+    """
+    Solution tensors of a solved plan: production P[i, t], storage S[i, t], procurement X[i, j, t]
+    and, for model e, electrolysis use B[t] and amounts m[i, t].
+    Report tables are built from the arrays on first access and nothing is printed unless asked.
+    """
+
+    def __init__(self, objective, production, storage, procurement, electrolysis_used=None, electrolysis=None,
+                 storage_costs=None, supplier_costs=None, electrolysis_fixed_cost=0, electrolysis_unit_cost=0,
+                 product_names=None, supplier_names=None):
+        self.objective = objective
+        self.production = production
+        self.storage = storage
+        self.procurement = procurement
+        self.electrolysis_used = electrolysis_used
+        self.electrolysis = electrolysis
+        self.storage_costs = None if storage_costs is None else np.asarray(storage_costs, dtype=float)
+        self.supplier_costs = None if supplier_costs is None else np.asarray(supplier_costs, dtype=float)
+        self.electrolysis_fixed_cost = electrolysis_fixed_cost
+        self.electrolysis_unit_cost = electrolysis_unit_cost
+
+        num_products, self.months = production.shape
+        num_suppliers = procurement.shape[1]
+        if product_names is None:
+            product_names = PRODUCT_NAMES if num_products == len(PRODUCT_NAMES) else \
+                [f"Product {i + 1}" for i in range(num_products)]
+        self.product_names = list(product_names)
+        self.supplier_names = list(supplier_names) if supplier_names is not None else \
+            [chr(65 + j) if j < 26 else f"S{j + 1}" for j in range(num_suppliers)]
+
+    @classmethod
+    def from_model(cls, model, P, S, X, B=None, m=None, **kwargs):
+        """Collect the solution of a solved model (tupledicts from addVars) into arrays"""
+        num_products, months = (k + 1 for k in max(P.keys()))
+        production = _values(model, P, (num_products, months))
+        storage = _values(model, S, (num_products, months))
+
+        # X[i, j, t] per product, or X[j, t] for all products together (test.py formulation)
+        x_shape = tuple(k + 1 for k in max(X.keys()))
+        procurement = _values(model, X, x_shape if len(x_shape) == 3 else (1,) + x_shape)
+
+        electrolysis_used = None if B is None else _values(model, B, (months,))
+        electrolysis = None if m is None else _values(model, m, (num_products, months))
+        return cls(model.objVal, production, storage, procurement, electrolysis_used, electrolysis, **kwargs)
+
+    def _month_table(self, values, column_names):
+        """DataFrame with a Month column followed by one column per row of values (shape: columns x months)"""
+        table = pd.DataFrame(np.asarray(values).T, columns=column_names)
+        table.insert(0, "Month", np.arange(1, self.months + 1))
+        return table
+
+    @cached_property
+    def production_table(self):
+        return self._month_table(self.production, [f"{name} Production" for name in self.product_names])
+
+    @cached_property
+    def storage_table(self):
+        return self._month_table(self.storage, [f"{name} Storage" for name in self.product_names])
+
+    @cached_property
+    def electrolysis_table(self):
+        if self.electrolysis is None:
+            return None
+        return self._month_table(np.vstack([self.electrolysis_used, self.electrolysis]),
+                                 ["Electrolysis Used"] + [f"{name} Electrolysis" for name in self.product_names])
+
+    @cached_property
+    def supplier_tables(self):
+        """One procurement table per product (a single table for the aggregated formulation)"""
+        columns = [f"From Supplier {name}" for name in self.supplier_names]
+        return [self._month_table(self.procurement[i], columns) for i in range(self.procurement.shape[0])]
+
+    @cached_property
+    def storage_cost_table(self):
+        monthly = self.storage_costs[:, None] * self.storage
+        table = self._month_table(monthly, [f"{name} Storage Cost" for name in self.product_names])
+        table["Total Storage Cost"] = monthly.sum(axis=0)
+        return table
+
+    @cached_property
+    def electrolysis_cost_table(self):
+        if self.electrolysis is None:
+            return None
+        fixed = self.electrolysis_fixed_cost * self.electrolysis_used
+        variable = self.electrolysis_unit_cost * self.electrolysis.sum(axis=0)
+        return self._month_table(np.vstack([fixed, variable, fixed + variable]),
+                                 ["Fixed Cost", "Variable Cost", "Total Electrolysis Cost"])
+
+    @property
+    def total_storage_cost(self):
+        return float((self.storage_costs[:, None] * self.storage).sum())
+
+    @property
+    def total_procurement_cost(self):
+        return float((self.supplier_costs[None, :, None] * self.procurement).sum())
+
+    @property
+    def total_electrolysis_cost(self):
+        if self.electrolysis is None:
+            return 0.0
+        return float(self.electrolysis_fixed_cost * self.electrolysis_used.sum() +
+                     self.electrolysis_unit_cost * self.electrolysis.sum())
+
+    def tables(self):
+        """All available report tables by file-friendly name"""
+        tables = {"production": self.production_table, "storage": self.storage_table}
+        if self.electrolysis is not None:
+            tables["electrolysis"] = self.electrolysis_table
+        for i, table in enumerate(self.supplier_tables):
+            name = self.product_names[i] if len(self.supplier_tables) > 1 else "all"
+            tables[f"procurement_{name.replace('/', '_')}"] = table
+        return tables
+
+    def export(self, directory, file_format="csv"):
+        """Write every table to directory as CSV or Parquet files; returns the written paths"""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for name, table in self.tables().items():
+            path = os.path.join(directory, f"{name}.{file_format}")
+            if file_format == "parquet":
+                table.to_parquet(path, index=False)
+            else:
+                table.to_csv(path, index=False)
+            paths.append(path)
+        return paths
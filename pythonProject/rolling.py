@@ -0,0 +1,234 @@
+"""
+Closed-loop simulation of monthly re-planning with model_e.
+
+At the start of month t the actual demand of month t is known; the later months still use the
+forecast. The planner re-optimizes the remaining horizon, carries out the decisions of month t and
+freezes them (P, S, X, B, m of month t fixed at their values), then moves on. The realized cost of a
+demand path is the cost of the frozen plan after the last month, unmet demand at SHORTFALL_COST
+included (a path that leaves demand unmet is not cheaper than one that meets it).
+
+One persistent Gurobi model is kept per planner: a step only changes the balance right-hand sides
+of month t and the bounds of the month frozen before, and the previous plan, repaired for the new
+demand, is passed as MIP start.
+Demand the frozen inventory and capacity cannot meet is recorded as unmet (columns on the balance
+rows at SHORTFALL_COST), so every step stays feasible. Independent demand paths are simulated in
+parallel processes, each process with its own planner.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import gurobipy as gp
+import numpy as np
+import pandas as pd
+from gurobipy import GRB
+
+from anytime import apply_policy
+from model_template import compile_template, load_model, scenario_vectors
+
+# Cost of one unit of unmet demand
+SHORTFALL_COST = 1e4
+
+# Relative demand noise of the default paths (uniform +-)
+DEFAULT_NOISE = 0.2
+
+
+class RollingPlanner:
+    """Persistent model_e of a horizon that is re-planned month by month"""
+
+    def __init__(self, params, policy=None):
+        self.params = params
+        self.policy = policy
+        self.forecast = np.asarray(params["demand"], dtype=float)
+        self.num_product, self.months = self.forecast.shape
+        self.template = compile_template(self.num_product, len(params["costs"]), self.months, electrolysis=True)
+        self.binary = np.concatenate([self.template["vtype"] == GRB.BINARY, np.zeros(self.forecast.size, dtype=bool)])
+        vectors = scenario_vectors(self.template, params)
+        self.obj = np.concatenate([vectors["obj"], np.full(self.forecast.size, SHORTFALL_COST)])
+        self.initial_lb = np.concatenate([vectors["lb"], np.zeros(self.forecast.size)])
+        self.initial_ub = np.concatenate([vectors["ub"], np.full(self.forecast.size, np.inf)])
+
+        # Columns of every month: P, S, X, B, m and the unmet demand of month t
+        index = self.template["index"]
+        shortfall = self.template["num_vars"] + np.arange(self.forecast.size).reshape(self.forecast.shape)
+        self.month_columns = [np.concatenate([index["P"][:, t], index["S"][:, t], index["X"][:, :, t].ravel(),
+                                              [index["B"][t]], index["m"][:, t], shortfall[:, t]])
+                              for t in range(self.months)]
+        self.builds = 0
+        self.build()
+
+    def build(self):
+        """(Re)create the Gurobi model in the initial state (forecast demand, nothing frozen)"""
+        self.model, _ = load_model(self.template, scenario_vectors(self.template, self.params))
+        apply_policy(self.model, self.policy)
+        self.model.update()
+        self.balance = np.array(self.model.getConstrs())[self.template["rows"]["balance"]]
+        for i, t in np.ndindex(self.forecast.shape):
+            self.model.addVar(obj=SHORTFALL_COST, name=f"unmet[{i},{t}]", column=gp.Column([1.0], [self.balance[i, t]]))
+        self.model.update()
+        self.vars = self.model.getVars()
+        self.lb, self.ub = self.initial_lb.copy(), self.initial_ub.copy()
+        self.demand = self.forecast.copy()
+        self.builds += 1
+
+    def reset(self):
+        """Back to the initial state, in place"""
+        self.lb, self.ub = self.initial_lb.copy(), self.initial_ub.copy()
+        self.demand = self.forecast.copy()
+        self.model.setAttr("LB", self.vars, self.lb.tolist())
+        self.model.setAttr("UB", self.vars, self.ub.tolist())
+        self.model.setAttr("RHS", self.balance.ravel().tolist(), self.demand.ravel().tolist())
+        self.model.reset(1)
+
+    def _push(self, columns=None, months=None):
+        """Copy bounds (of columns) and demand (of months) to the model; everything when None"""
+        variables = self.vars if columns is None else [self.vars[k] for k in columns]
+        columns = slice(None) if columns is None else columns
+        self.model.setAttr("LB", variables, self.lb[columns].tolist())
+        self.model.setAttr("UB", variables, self.ub[columns].tolist())
+        months = slice(None) if months is None else months
+        self.model.setAttr("RHS", self.balance[:, months].ravel().tolist(), self.demand[:, months].ravel().tolist())
+
+    def repair(self, x, t, change):
+        """
+        The previous plan made feasible for the demand of month t changed by change: more demand is
+        unmet, less demand stays in stock until the end of the horizon
+        """
+        x = x.copy()
+        unmet = self.template["num_vars"] + np.ravel_multi_index((np.arange(self.num_product), t), self.forecast.shape)
+        x[unmet] += np.maximum(change, 0.0)
+        x[self.template["index"]["S"][:, t:]] += np.maximum(-change, 0.0)[:, None]
+        return x
+
+    def step(self, t, actual, start=None, warm=True):
+        """
+        Re-plan from month t on with the actual demand of month t and freeze the decisions of month t.
+        Returns the plan (all columns) and the Gurobi runtime.
+        """
+        change = actual - self.demand[:, t]
+        self.demand[:, t] = actual
+        if warm:
+            self._push(months=[t])
+            if start is not None:
+                self.model.setAttr("Start", self.vars, self.repair(start, t, change).tolist())
+        else:
+            # From scratch: a new model with everything decided so far
+            self.model.dispose()
+            lb, ub, demand = self.lb, self.ub, self.demand
+            self.build()
+            self.lb, self.ub, self.demand = lb, ub, demand
+            self._push()
+        self.model.optimize()
+        if self.model.SolCount == 0:
+            raise RuntimeError(f"Re-plan of month {t} found no plan (status {self.model.status})")
+        x = np.array(self.model.getAttr("X", self.vars))
+
+        columns = self.month_columns[t]
+        self.lb[columns] = self.ub[columns] = np.where(self.binary[columns], np.round(x[columns]), x[columns])
+        if warm:
+            self._push(columns=columns, months=[])
+        return x, self.model.Runtime
+
+    def run(self, path, warm=True):
+        """
+        Simulate one demand path (product x month); returns the realized cost (plan cost + shortfall
+        cost of the unmet demand) and the solve times
+        """
+        self.reset()
+        start_time = time.perf_counter()
+        x, runtime = None, 0.0
+        for t in range(self.months):
+            x, step_time = self.step(t, path[:, t], x, warm)
+            runtime += step_time
+        # Every column is frozen after the last month
+        plan = self.lb
+        unmet = plan[-self.forecast.size:].sum()
+        shortfall_cost = SHORTFALL_COST * unmet
+        index = self.template["index"]
+        return {"cost": float(self.obj @ plan), "plan cost": float(self.obj @ plan - shortfall_cost),
+                "shortfall cost": float(shortfall_cost), "unmet demand": float(unmet),
+                "electrolysis months": int(round(plan[index["B"]].sum())), "solve time [s]": runtime,
+                "wall time [s]": time.perf_counter() - start_time}
+
+
+def demand_paths(forecast, num_paths, noise=DEFAULT_NOISE, seed=0):
+    """Demand paths (path x product x month): the forecast with independent uniform +-noise per month"""
+    forecast = np.asarray(forecast, dtype=float)
+    rng = np.random.default_rng(seed)
+    return np.round(forecast * rng.uniform(1 - noise, 1 + noise, size=(num_paths,) + forecast.shape))
+
+
+def _simulate_chunk(job):
+    """Simulate a chunk of paths on one planner (runs in a worker process)"""
+    params, paths, warm, policy = job
+    planner = RollingPlanner(params, policy)
+    return [planner.run(path, warm) for path in paths]
+
+
+def simulate(params, paths, warm=True, policy=None, workers=None):
+    """
+    Closed-loop simulation of model_e template parameters over demand paths (path x product x month),
+    one planner per worker process. warm=False rebuilds the model at every step and solves it cold.
+    Returns one row per path.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    chunks = [(params, chunk, warm, policy) for chunk in np.array_split(np.asarray(paths), workers)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = [row for chunk in executor.map(_simulate_chunk, chunks) for row in chunk]
+    else:
+        rows = _simulate_chunk(chunks[0])
+    return pd.DataFrame(rows)
+
+
+def cost_distribution(table):
+    """Summary of the realized cost distribution (shortfall included) of a simulate() table"""
+    cost = table["cost"]
+    return {"paths": len(table), "mean": cost.mean(), "std": cost.std(), "p5": cost.quantile(0.05),
+            "median": cost.median(), "p95": cost.quantile(0.95), "max": cost.max(),
+            "mean plan cost": table["plan cost"].mean(), "mean shortfall cost": table["shortfall cost"].mean(),
+            "paths with unmet demand": int((table["unmet demand"] > 1e-6).sum()),
+            "mean unmet demand": table["unmet demand"].mean(),
+            "mean electrolysis months": table["electrolysis months"].mean()}
+
+
+def compare(copper_limit=None, months=12, num_paths=100, noise=DEFAULT_NOISE, seed=0, workers=None, cold_paths=10,
+            policy=None):
+    """
+    Simulate num_paths demand paths with the persistent warm-started planner and print their cost
+    distribution. The first cold_paths of them are then simulated again by both planners, the
+    persistent one and a rebuild-and-solve-cold one, with the same workers, to compare their times.
+    """
+    import backends
+    from data import data_e, get_supplier_data_e
+    from model_template import params_e
+    from time_aggregation import long_horizon_params
+
+    if months == data_e["months"]:
+        data = get_supplier_data_e(data_e)
+        params = {**params_e(data[8], data), "big_m": backends.BIG_M}
+    else:
+        params = long_horizon_params(months, electrolysis=True, seed=seed)
+    if copper_limit is not None:
+        params["copper_limit"] = copper_limit
+    paths = demand_paths(params["demand"], num_paths, noise, seed)
+
+    warm = simulate(params, paths, True, policy, workers)
+    print(pd.Series(cost_distribution(warm)).to_string())
+
+    if cold_paths:
+        timings = {}
+        for label, warm_start in (("persistent, MIP start", True), ("rebuilt, cold", False)):
+            start = time.perf_counter()
+            table = simulate(params, paths[:cold_paths], warm_start, policy, workers)
+            timings[label] = {"solve time per path [s]": table["solve time [s]"].mean(),
+                              "wall time per path [s]": (time.perf_counter() - start) / cold_paths,
+                              "mean cost": table["cost"].mean()}
+        timings = pd.DataFrame(timings).T
+        print(f"Same {cold_paths} paths x {params['demand'].shape[1]} steps, "
+              f"{min(workers or os.cpu_count() or 1, cold_paths)} workers:")
+        print(timings.to_string())
+        warm_solve, cold_solve = timings["solve time per path [s]"]
+        if warm_solve >= cold_solve:
+            print(f"The MIP start does not shorten the solves here ({warm_solve:.4f}s vs {cold_solve:.4f}s per path)")
+    return warm
@@ -0,0 +1,186 @@
+from types import MappingProxyType
+
+import numpy as np
+
+# Patchable fields of a scenario dictionary and the kind of value each one holds.
+# "demand.<product>" and "suppliers.<name>" address one entry of the nested dictionaries.
+SCENARIO_FIELDS = {
+    "months": "count",
+    "Product set": "count",
+    "Supplier set": "count",
+    "max_production": "number",
+    "copper_limit": "number",
+    "electrolysis_fixed_cost": "number",
+    "electrolysis_unit_cost": "number",
+    "storage_costs": "vector",
+    "chromium_content_ratio": "vector",
+    "nickel_content_ratio": "vector",
+    "demand": "vector",
+    "suppliers": "supplier",
+}
+
+# Fields that change the shape of the model and therefore always need a rebuild
+STRUCTURAL_FIELDS = {"months", "Product set", "Supplier set"}
+
+# Supplier rows: chromium, nickel, copper, maximum supply, cost
+SUPPLIER_ROW_LENGTH = 5
+
+
+def _frozen(array):
+    """Read-only view of an array: shared with its owner without copying, but cannot be changed through it"""
+    view = np.asarray(array).view()
+    view.flags.writeable = False
+    return view
+
+
+def _validate(field, value):
+    """Check a patch value against the kind of its field and return it in canonical form"""
+    group = field.split(".", 1)[0]
+    kind = SCENARIO_FIELDS.get(group)
+    if kind is None:
+        raise KeyError(f"Unknown scenario field: {field}")
+    if (group in ("demand", "suppliers")) != ("." in field):
+        raise KeyError(f"{field}: address nested entries one at a time, as 'demand.<product>' or 'suppliers.<name>'")
+
+    if kind == "count":
+        if int(value) != value or value <= 0:
+            raise ValueError(f"{field} must be a positive integer, got {value}")
+        return int(value)
+    if kind == "number":
+        if not isinstance(value, (int, float, np.number)):
+            raise ValueError(f"{field} must be a number, got {value!r}")
+        return value
+    if kind == "supplier":
+        row = tuple(value)
+        if len(row) != SUPPLIER_ROW_LENGTH:
+            raise ValueError(f"{field} needs {SUPPLIER_ROW_LENGTH} values (Cr, Ni, Cu, max supply, cost)")
+        return row
+
+    array = np.array(value, dtype=float)
+    if array.ndim != 1:
+        raise ValueError(f"{field} must be one-dimensional")
+    array.flags.writeable = False
+    return array
+
+
+def make_patch(changes):
+    """
+    Build a validated, read-only patch from {field: new value}.
+    Nested entries are addressed as 'demand.18_0' or 'suppliers.B'.
+    """
+    return MappingProxyType({field: _validate(field, value) for field, value in changes.items()})
+
+
+def materialize(base, patch):
+    """
+    Return the scenario dictionary base + patch. Unchanged arrays are shared with base as
+    read-only views (no copies); only the patched entries are new objects.
+    """
+    scenario = {}
+    for key, value in base.items():
+        if isinstance(value, dict):
+            scenario[key] = dict(value)
+        elif isinstance(value, np.ndarray):
+            scenario[key] = _frozen(value)
+        else:
+            scenario[key] = value
+
+    for key in ("demand", "suppliers"):
+        if key in scenario:
+            scenario[key] = {name: _frozen(v) if isinstance(v, np.ndarray) else tuple(v)
+                             for name, v in scenario[key].items()}
+
+    for field, value in patch.items():
+        if "." in field:
+            group, name = field.split(".", 1)
+            if name not in scenario[group]:
+                raise KeyError(f"{field}: base has no entry '{name}'")
+            scenario[group][name] = value
+        else:
+            scenario[field] = value
+
+    # Keep the demand table consistent with the horizon
+    for name, series in scenario.get("demand", {}).items():
+        if len(series) != scenario["months"]:
+            raise ValueError(f"demand.{name} has {len(series)} months, expected {scenario['months']}")
+    return scenario
+
+
+def _coefficient_updates(model, constr_family, var_name, value, months, products):
+    """Change the coefficient of one variable in the given constraint family for every month and product"""
+    for t in range(months):
+        for i in products:
+            constr = model.getConstrByName(f"{constr_family}[{i},{t}]")
+            if constr is not None:
+                model.chgCoeff(constr, model.getVarByName(var_name.format(i=i, t=t)), value)
+
+
+def apply_patch(model, base, patch):
+    """
+    Apply a patch to a model already built from base (model_b or model_e formulation) as a
+    minimal set of attribute and coefficient edits instead of a rebuild.
+    Relies on the variable (P, S, X, B, m) and constraint names given by the model builders.
+    """
+    structural = STRUCTURAL_FIELDS.intersection(patch)
+    if structural:
+        raise ValueError(f"Fields {sorted(structural)} change the model shape and need a rebuild")
+
+    model.update()
+    months = base["months"]
+    num_product = base["Product set"]
+    products = list(base["demand"])
+    suppliers = list(base["suppliers"])
+    all_products = range(num_product)
+    has_electrolysis = model.getVarByName("B[0]") is not None
+
+    for field, value in patch.items():
+        if field == "storage_costs":
+            for i in range(num_product):
+                for t in range(months):
+                    model.getVarByName(f"S[{i},{t}]").Obj = value[i]
+
+        elif field == "max_production":
+            for t in range(months):
+                model.getConstrByName(f"capacity[{t}]").RHS = value
+
+        elif field.startswith("demand."):
+            i = products.index(field.split(".", 1)[1])
+            for t in range(months):
+                model.getConstrByName(f"balance[{i},{t}]").RHS = value[t]
+
+        elif field.startswith("suppliers."):
+            j = suppliers.index(field.split(".", 1)[1])
+            chromium, nickel, copper, max_supply, cost = value
+            for t in range(months):
+                model.getConstrByName(f"supply[{j},{t}]").RHS = max_supply
+                for i in range(num_product):
+                    model.getVarByName(f"X[{i},{j},{t}]").Obj = cost
+            # Blend rows read 'ratio * P == sum(content * X)', so X enters with a negative sign
+            x_name = "X[{i},%d,{t}]" % j
+            _coefficient_updates(model, "chromium", x_name, -chromium, months, all_products)
+            _coefficient_updates(model, "nickel", x_name, -nickel, months, all_products)
+            _coefficient_updates(model, "copper", x_name, copper, months, all_products)
+
+        elif field in ("chromium_content_ratio", "nickel_content_ratio"):
+            family = field.split("_", 1)[0]
+            for i in range(num_product):
+                _coefficient_updates(model, family, "P[{i},{t}]", value[i], months, [i])
+                if has_electrolysis:
+                    _coefficient_updates(model, family, "m[{i},{t}]", -value[i], months, [i])
+
+        elif field == "copper_limit":
+            # Copper rows read 'sum(Cu * X) - m <= limit * (P - m)'
+            _coefficient_updates(model, "copper", "P[{i},{t}]", -value, months, all_products)
+            _coefficient_updates(model, "copper", "m[{i},{t}]", value - 1, months, all_products)
+
+        elif field == "electrolysis_fixed_cost":
+            for t in range(months):
+                model.getVarByName(f"B[{t}]").Obj = value
+
+        elif field == "electrolysis_unit_cost":
+            for i in range(num_product):
+                for t in range(months):
+                    model.getVarByName(f"m[{i},{t}]").Obj = value
+
+    model.update()
+    return model
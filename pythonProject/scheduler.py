@@ -0,0 +1,230 @@
+"""
+Core-aware scheduling of sweep workloads (experiment scenarios, copper-limit scans).
+
+Jobs are ordered longest-first by an estimated cost and started in worker processes while cores
+are free. A job that ran before (same scenario, see result_writer.scenario_id) is estimated by its
+own past runtimes; other jobs by model size times the runtime per variable of their family, which
+cannot tell jobs of the same shape apart, so the first run of a same-shape grid keeps its order. Every solve gets an
+explicit Threads value, so the threads of all running solves never exceed the core count:
+LPs always run single-threaded, MILPs get more threads once fewer jobs than cores are left.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Past runtimes per model family: {family: [[num_vars, num_int_vars, threads, seconds, instance], ...]}
+HISTORY_FILE = os.environ.get(
+    "STEEL_RUNTIME_HISTORY", os.path.join(os.path.dirname(os.path.abspath(__file__)), "runtime_history.json")
+)
+HISTORY_LENGTH = 5000
+
+# Seconds per variable used before any runtime of a family has been recorded
+DEFAULT_RATES = {"model_b": 2e-5, "model_e": 2e-4}
+
+# Most threads one solve may use: the small LPs do not profit from parallel solves at all
+MAX_THREADS = {"model_b": 1, "model_e": 4}
+
+# Model family of each job kind
+FAMILIES = {"experiment": "model_b", "copper": "model_e"}
+
+
+def experiment_jobs(scenarios):
+    """One job per scenario of d_test.run_experiments"""
+    return [{"id": k, "kind": "experiment", "payload": scenario} for k, scenario in enumerate(scenarios)]
+
+
+def copper_jobs(data, start=0.000, end=0.03, step=0.001, policy=None):
+    """One job per copper limit of model_e_exp.scan_copper_limits (policy: anytime TimeLimit/MIPGap)"""
+    return [{"id": k, "kind": "copper", "payload": (float(limit), data, policy)}
+            for k, limit in enumerate(np.arange(start, end + step, step))]
+
+
+def model_size(job):
+    """Number of variables and integer variables of the model a job builds, computed from its data"""
+    if job["kind"] == "experiment":
+        scenario = job["payload"]
+        months, num_product, num_supplier = scenario["months"], scenario["Product set"], scenario["Supplier set"]
+        return num_product * months * (2 + num_supplier), 0
+
+    data = job["payload"][1]
+    months, num_product, num_supplier = data[0], data[-2], data[-1]
+    return num_product * months * (3 + num_supplier) + months, months
+
+
+def load_history(path=None):
+    path = path or HISTORY_FILE
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_history(history, path=None):
+    path = path or HISTORY_FILE
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump({family: runs[-HISTORY_LENGTH:] for family, runs in history.items()}, file)
+    os.replace(tmp_path, path)
+
+
+def instance_key(job):
+    """Id of the instance a job solves (the same scenario gets the same id in every sweep)"""
+    from result_writer import scenario_id
+    return scenario_id(job["payload"] if job["kind"] == "experiment" else job["payload"][:2])
+
+
+def estimate_costs(jobs, history=None):
+    """
+    Estimated single-thread seconds per job: the median of its own past runtimes, or model size times
+    the median past seconds per variable of its family for instances not seen before
+    """
+    history = load_history() if history is None else history
+    rates = dict(DEFAULT_RATES)
+    seen = {}
+    for family, runs in history.items():
+        # Multi-threaded runs are scaled back to single-thread time (assuming perfect speed-up: an upper bound)
+        per_variable = [run[3] * run[2] / max(run[0], 1) for run in runs]
+        if per_variable:
+            rates[family] = float(np.median(per_variable))
+        for run in runs:
+            if len(run) > 4:
+                seen.setdefault(run[4], []).append(run[3] * run[2])
+
+    for job in jobs:
+        num_vars, num_int = model_size(job)
+        job["num_vars"], job["num_int"] = num_vars, num_int
+        job["instance"] = instance_key(job)
+        if job["instance"] in seen:
+            job["estimate"] = float(np.median(seen[job["instance"]]))
+        else:
+            job["estimate"] = rates[FAMILIES[job["kind"]]] * num_vars
+    return jobs
+
+
+def _run_job(kind, payload, threads):
+    """Solve one job in a worker process with the given number of threads (0: Gurobi default, all cores)"""
+    from solver_env import pin_params
+    pin_params({"Threads": threads})
+
+    start = time.perf_counter()
+    if kind == "experiment":
+        from d_test import iter_experiments
+        row = next(iter_experiments([payload], reuse_bases=False))
+    else:
+        from model_e_exp import solve_model_with_copper_limit, copper_limit_row
+        copper_limit, data, policy = payload
+        is_feasible, cost_breakdown = solve_model_with_copper_limit(copper_limit, data, policy)
+        row = copper_limit_row(copper_limit, cost_breakdown) if cost_breakdown else None
+    return row, time.perf_counter() - start
+
+
+def _children_cpu_time():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _report(layout, cores, timeline, makespan, cpu_time):
+    """Makespan, requested thread load and measured CPU utilization of one run"""
+    thread_seconds = sum(threads * (end - start) for _, threads, start, end in timeline)
+    return {
+        "layout": layout,
+        "cores": cores,
+        "jobs": len(timeline),
+        "makespan": makespan,
+        # Above 1.0 means more solver threads were requested than there are cores (oversubscription)
+        "thread_load": thread_seconds / (cores * makespan) if makespan > 0 else 0.0,
+        "cpu_utilization": cpu_time / (cores * makespan) if cpu_time is not None and makespan > 0 else None,
+    }
+
+
+def _threads_for(job, free, num_pending):
+    """LPs get one thread; MILPs share the free cores with the jobs still waiting"""
+    limit = MAX_THREADS[FAMILIES[job["kind"]]]
+    return max(1, min(limit, free, free // max(num_pending, 1)))
+
+
+def run_scheduled(jobs, cores=None, record=True):
+    """
+    Run the jobs longest-first with at most 'cores' solver threads busy at any time.
+    Returns the result rows in job order and a utilization report.
+    """
+    cores = cores or os.cpu_count()
+    history = load_history()
+    pending = sorted(estimate_costs(jobs, history), key=lambda job: job["estimate"], reverse=True)
+    results = {}
+    timeline = []
+    running = {}
+    free = cores
+
+    cpu_before = _children_cpu_time()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=cores) as executor:
+        while pending or running:
+            # Start jobs while cores are free
+            while pending and free > 0:
+                job = pending.pop(0)
+                threads = _threads_for(job, free, len(pending) + 1)
+                future = executor.submit(_run_job, job["kind"], job["payload"], threads)
+                running[future] = (job, threads, time.perf_counter())
+                free -= threads
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, threads, job_start = running.pop(future)
+                row, seconds = future.result()
+                results[job["id"]] = row
+                timeline.append((job["id"], threads, job_start - start, time.perf_counter() - start))
+                history.setdefault(FAMILIES[job["kind"]], []).append(
+                    [job["num_vars"], job["num_int"], threads, seconds, job["instance"]])
+                free += threads
+    makespan = time.perf_counter() - start
+    cpu_after = _children_cpu_time()
+
+    if record:
+        save_history(history)
+    cpu_time = None if cpu_before is None else cpu_after - cpu_before
+    return [results[job["id"]] for job in jobs], _report("scheduled", cores, timeline, makespan, cpu_time)
+
+
+def run_naive(jobs, cores=None):
+    """
+    Baseline layout: one process per core, jobs in submission order, every solve with Gurobi's
+    default Threads (all cores)
+    """
+    cores = cores or os.cpu_count()
+    timeline = []
+    cpu_before = _children_cpu_time()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=cores) as executor:
+        futures = [executor.submit(_run_job, job["kind"], job["payload"], 0) for job in jobs]
+        rows = []
+        for job, future in zip(jobs, futures):
+            row, seconds = future.result()
+            rows.append(row)
+            # Only the solve time is known per job; it ended at most now
+            end = time.perf_counter() - start
+            timeline.append((job["id"], cores, end - seconds, end))
+    makespan = time.perf_counter() - start
+    cpu_after = _children_cpu_time()
+    cpu_time = None if cpu_before is None else cpu_after - cpu_before
+    return rows, _report("naive", cores, timeline, makespan, cpu_time)
+
+
+def compare_with_naive(jobs, cores=None):
+    """Run the jobs with the naive and the scheduled layout and print both reports"""
+    _, naive = run_naive(jobs, cores)
+    rows, scheduled = run_scheduled(jobs, cores)
+    report = pd.DataFrame([naive, scheduled])
+    print(report.to_string(index=False, float_format="{:.3f}".format))
+    return rows, report
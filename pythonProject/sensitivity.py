@@ -0,0 +1,127 @@
+import re
+
+import numpy as np
+import pandas as pd
+from gurobipy import GRB
+
+# Constraint and variable names look like "capacity[3]" or "X[0,1,5]"
+NAME_PATTERN = re.compile(r"^(?P<family>[^\[]+)(?:\[(?P<index>[^\]]*)\])?$")
+
+
+def split_name(name):
+    """Split a Gurobi name such as 'supply[1,4]' into its family and integer index"""
+    match = NAME_PATTERN.match(name)
+    if match is None:
+        return name, ()
+    index = match.group("index")
+    if not index:
+        return match.group("family"), ()
+    return match.group("family"), tuple(int(k) if k.lstrip("-").isdigit() else k for k in index.split(","))
+
+
+def sensitivity_report(model):
+    """
+    Build tidy sensitivity tables for a solved model:
+    - constraints: shadow prices (Pi), slacks and RHS ranging (SARHSLow/SARHSUp)
+    - variables: values, reduced costs and objective ranging (SAObjLow/SAObjUp)
+    MIP models are reported through their fixed LP (integer decisions kept at their optimal values).
+    """
+    if model.status != GRB.OPTIMAL:
+        raise ValueError("Sensitivity information needs an optimal solution")
+
+    fixed = None
+    if model.IsMIP:
+        fixed = model.fixed()
+        fixed.setParam("OutputFlag", 0)
+        fixed.optimize()
+        model = fixed
+
+    constrs = model.getConstrs()
+    variables = model.getVars()
+
+    constr_names = model.getAttr("ConstrName", constrs)
+    constr_split = [split_name(name) for name in constr_names]
+    constraints = pd.DataFrame({
+        "Constraint": constr_names,
+        "Family": [family for family, _ in constr_split],
+        "Index": [index for _, index in constr_split],
+        "Sense": model.getAttr("Sense", constrs),
+        "RHS": model.getAttr("RHS", constrs),
+        "Slack": model.getAttr("Slack", constrs),
+        "Shadow Price": model.getAttr("Pi", constrs),
+        "RHS Low": model.getAttr("SARHSLow", constrs),
+        "RHS Up": model.getAttr("SARHSUp", constrs),
+    })
+
+    var_names = model.getAttr("VarName", variables)
+    var_split = [split_name(name) for name in var_names]
+    variables = pd.DataFrame({
+        "Variable": var_names,
+        "Family": [family for family, _ in var_split],
+        "Index": [index for _, index in var_split],
+        "Value": model.getAttr("X", variables),
+        "Reduced Cost": model.getAttr("RC", variables),
+        "Objective": model.getAttr("Obj", variables),
+        "Obj Low": model.getAttr("SAObjLow", variables),
+        "Obj Up": model.getAttr("SAObjUp", variables),
+    })
+
+    report = {
+        "objective": model.objVal,
+        "constraints": constraints.set_index("Constraint", drop=False),
+        "variables": variables.set_index("Variable", drop=False),
+    }
+    if fixed is not None:
+        fixed.dispose()
+    return report
+
+
+def _hundred_percent_ratio(current, new, low, up):
+    """Fraction of the allowed ranges used by simultaneous changes (valid while the sum is <= 1)"""
+    delta = new - current
+    allowed = np.where(delta >= 0, up - current, current - low)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(delta == 0, 0.0, np.abs(delta) / allowed)
+    return float(np.sum(ratio))
+
+
+def predict_objective_change(report, rhs=None, objective=None):
+    """
+    Predict the optimal objective after changing constraint right-hand sides (rhs) or objective
+    coefficients (objective), given as {name: new value}. Several changes are combined with the
+    100% rule, so the prediction is certified when 'valid' is True; otherwise a re-solve is needed.
+    """
+    if (rhs is None) == (objective is None):
+        raise ValueError("Give either rhs or objective changes, not both")
+
+    if rhs is not None:
+        table = report["constraints"].loc[list(rhs)]
+        new = np.array(list(rhs.values()), dtype=float)
+        current = table["RHS"].to_numpy()
+        change = float(np.dot(table["Shadow Price"].to_numpy(), new - current))
+        ratio = _hundred_percent_ratio(current, new, table["RHS Low"].to_numpy(), table["RHS Up"].to_numpy())
+    else:
+        table = report["variables"].loc[list(objective)]
+        new = np.array(list(objective.values()), dtype=float)
+        current = table["Objective"].to_numpy()
+        change = float(np.dot(table["Value"].to_numpy(), new - current))
+        ratio = _hundred_percent_ratio(current, new, table["Obj Low"].to_numpy(), table["Obj Up"].to_numpy())
+
+    return {
+        "objective": report["objective"] + change,
+        "change": change,
+        "range_used": ratio,
+        "valid": ratio <= 1.0,
+    }
+
+
+def print_sensitivity_report(report, families=("capacity", "supply", "chromium", "nickel", "copper")):
+    """Print shadow prices and ranging of the binding constraints and the nonzero variables"""
+    constraints = report["constraints"]
+    binding = constraints[constraints["Family"].isin(families) & (constraints["Shadow Price"].abs() > 1e-9)]
+    print("\nShadow Prices of Binding Constraints:")
+    print(binding.drop(columns=["Family", "Index"]).to_string(index=False))
+
+    variables = report["variables"]
+    print("\nObjective Ranging of Used Variables:")
+    print(variables[variables["Value"] > 1e-9].drop(columns=["Family", "Index"]).to_string(index=False))
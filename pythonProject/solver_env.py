@@ -0,0 +1,79 @@
+import os
+import threading
+
+import gurobipy as gp
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Parameters every environment starts with, so models do not have to set them again
+DEFAULT_PARAMS = {"OutputFlag": 0}
+
+# One environment per process, keyed by process id so forked workers create their own
+_envs = {}
+_lock = threading.Lock()
+
+# Parameters pinned for every model of this process (e.g. Threads set by the scheduler)
+_pinned = {}
+
+
+def _new_env(params=None):
+    """Start a Gurobi environment with the default parameters (quiet, no license banner)"""
+    env = gp.Env(empty=True)
+    for name, value in {**DEFAULT_PARAMS, **(params or {})}.items():
+        env.setParam(name, value)
+    env.start()
+    return env
+
+
+def get_env():
+    """The shared environment of the current process, created on first use"""
+    pid = os.getpid()
+    with _lock:
+        if pid not in _envs:
+            _envs[pid] = _new_env()
+        return _envs[pid]
+
+
+def new_model(name="Steel Production", verbose=False, env=None):
+    """
+    Model on the shared environment (or the given one). gurobipy models are context managers,
+    so 'with new_model() as model:' disposes the model when the block ends.
+    """
+    return _configure(gp.Model(name, env=env if env is not None else get_env()), verbose)
+
+
+def read_model(path, verbose=False, env=None):
+    """Model read from a file (MPS, LP, ...) on the shared environment, configured like new_model"""
+    return _configure(gp.read(path, env=env if env is not None else get_env()), verbose)
+
+
+def _configure(model, verbose):
+    if verbose:
+        model.setParam("OutputFlag", 1)
+    for param, value in _pinned.items():
+        model.setParam(param, value)
+    return model
+
+
+def pin_params(params):
+    """
+    Apply params to every model created from now on in this process. Pinned parameters take
+    precedence over the tuned parameter sets (see tuning.apply_tuned_params).
+    """
+    _pinned.clear()
+    _pinned.update(params)
+
+
+def pinned_params():
+    return dict(_pinned)
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process so far, in MB (ru_maxrss is in kB on Linux, bytes on macOS)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
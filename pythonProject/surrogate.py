@@ -0,0 +1,199 @@
+"""
+Value-function surrogate for what-if queries on model_b.
+
+The optimal cost V(theta, phi) of the LP min c(phi)'x s.t. A x (sense) b(theta), x >= 0, with
+    b(theta) = b0 + D theta    (right-hand side parameters, e.g. max_production)
+    c(phi)   = c0 + E phi      (objective parameters, e.g. the storage cost of every product)
+is convex piecewise linear in theta and concave piecewise linear in phi. Every solved point gives
+two certified pieces:
+- upper: its plan x_k stays feasible for every theta with A x_k (sense) b(theta), and then
+  V <= c(phi)'x_k, which is affine in phi (cutting planes of the concave side)
+- lower: its duals y_k stay dual feasible for every phi with c(phi) - A'y_k >= 0, and then
+  V >= b(theta)'y_k, which is affine in theta (subgradient cuts of the convex side)
+A query returns the best bounds of the applicable pieces in a few vectorized operations, and
+solves the LP (adding its pieces) only when the bounds are further apart than max_gap.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+from gurobipy import GRB
+
+import backends
+from data import get_supplier_data
+
+# Tolerance on constraint activities and reduced costs of stored solutions
+FEASIBILITY_TOL = 1e-7
+
+# Relative width of the bound interval up to which queries are answered without a solve
+DEFAULT_MAX_GAP = 1e-3
+
+
+def grid_parameterization(data):
+    """
+    Parameters of the experiment grid for one data dictionary: theta = [max_production] (the
+    RHS of every capacity row), phi = storage_costs (objective of S[i, t] for every month)
+    """
+    problem = backends.problem_b(get_supplier_data(data))
+    template = problem["template"]
+    capacity = template["rows"]["capacity"].ravel()
+    storage = template["index"]["S"]
+
+    D = np.zeros((template["num_rows"], 1))
+    D[capacity, 0] = 1.0
+    E = np.zeros((template["num_vars"], storage.shape[0]))
+    for i, columns in enumerate(storage):
+        E[columns, i] = 1.0
+
+    b0, c0 = problem["b"].copy(), problem["c"].copy()
+    b0[capacity] = 0.0
+    c0[storage.ravel()] = 0.0
+    return {"problem": problem, "b0": b0, "D": D, "c0": c0, "E": E,
+            "theta_names": ["max_production"], "phi_names": [f"storage_costs[{i}]" for i in range(storage.shape[0])]}
+
+
+class ValueSurrogate:
+    """Certified lower and upper envelopes of the optimal cost over (theta, phi), refined by solves"""
+
+    def __init__(self, parameterization, max_gap=DEFAULT_MAX_GAP, backend="gurobi"):
+        self.param = parameterization
+        self.max_gap = max_gap
+        self.backend = backend
+        problem = parameterization["problem"]
+        self.A = problem["A"]
+        self.sense = problem["sense"]
+
+        # Only rows and columns touched by a parameter matter when checking whether a piece applies
+        self.rhs_rows = np.flatnonzero(np.abs(parameterization["D"]).sum(axis=1))
+        self.obj_cols = np.flatnonzero(np.abs(parameterization["E"]).sum(axis=1))
+        self.D_rows = parameterization["D"][self.rhs_rows]
+        self.E_cols = parameterization["E"][self.obj_cols]
+
+        # Upper pieces: activity of the plan on the parameter rows, cost c0'x and slope E'x
+        self.upper_activity = np.empty((0, self.rhs_rows.size))
+        self.upper_const = np.empty(0)
+        self.upper_slope = np.empty((0, self.E_cols.shape[1]))
+        # Lower pieces: smallest objective on the parameter columns keeping y dual feasible,
+        # value b0'y and slope D'y
+        self.lower_threshold = np.empty((0, self.obj_cols.size))
+        self.lower_const = np.empty(0)
+        self.lower_slope = np.empty((0, self.D_rows.shape[1]))
+
+        self.solves = 0
+        self.solve_time = 0.0
+
+        # y = 0 is dual feasible while all costs are nonnegative: V >= 0
+        self.add_duals(np.zeros(len(self.sense)))
+
+    def add_plan(self, x):
+        """Upper piece of a primal feasible plan"""
+        x = np.asarray(x)
+        activity = (self.A[self.rhs_rows] @ x) - self.param["b0"][self.rhs_rows]
+        self.upper_activity = np.vstack([self.upper_activity, activity])
+        self.upper_const = np.append(self.upper_const, self.param["c0"] @ x)
+        self.upper_slope = np.vstack([self.upper_slope, self.param["E"].T @ x])
+
+    def add_duals(self, y):
+        """Lower piece of a dual solution (Gurobi signs: <= 0 on <= rows, >= 0 on >= rows)"""
+        y = np.asarray(y)
+        priced = self.A.T @ y - self.param["c0"]
+        # Unchanged columns must already price out, otherwise the piece is not a valid bound
+        fixed = np.setdiff1d(np.arange(len(priced)), self.obj_cols)
+        if np.any(priced[fixed] > FEASIBILITY_TOL * (1 + np.abs(self.param["c0"][fixed]))):
+            return False
+        self.lower_threshold = np.vstack([self.lower_threshold, priced[self.obj_cols]])
+        self.lower_const = np.append(self.lower_const, self.param["b0"] @ y)
+        self.lower_slope = np.vstack([self.lower_slope, self.param["D"].T @ y])
+        return True
+
+    def bounds(self, theta, phi):
+        """Certified (lower, upper) bounds on the optimal cost at (theta, phi)"""
+        theta, phi = np.atleast_1d(theta).astype(float), np.atleast_1d(phi).astype(float)
+        rhs = self.D_rows @ theta
+        slack = rhs - self.upper_activity
+        sense = self.sense[self.rhs_rows]
+        feasible = np.where(sense == GRB.LESS_EQUAL, slack >= -FEASIBILITY_TOL,
+                            np.where(sense == GRB.GREATER_EQUAL, slack <= FEASIBILITY_TOL,
+                                     np.abs(slack) <= FEASIBILITY_TOL)).all(axis=1)
+        upper = np.min(self.upper_const[feasible] + self.upper_slope[feasible] @ phi, initial=np.inf)
+
+        objective = self.E_cols @ phi
+        valid = (objective >= self.lower_threshold - FEASIBILITY_TOL).all(axis=1)
+        lower = np.max(self.lower_const[valid] + self.lower_slope[valid] @ theta, initial=-np.inf)
+        return lower, upper
+
+    def solve(self, theta, phi):
+        """Solve the LP at (theta, phi), add its pieces and return its optimal cost (inf if infeasible)"""
+        theta, phi = np.atleast_1d(theta).astype(float), np.atleast_1d(phi).astype(float)
+        problem = self.param["problem"]
+        rhs = self.param["b0"] + self.param["D"] @ theta
+        obj = self.param["c0"] + self.param["E"] @ phi
+        vectors = {**problem["vectors"], "rhs": rhs, "obj": obj}
+        start = time.perf_counter()
+        result = backends.solve(backends.matrix_problem(problem["template"], vectors), self.backend)
+        self.solve_time += time.perf_counter() - start
+        self.solves += 1
+        if not result["optimal"]:
+            return np.inf
+        self.add_plan(result["x"])
+        self.add_duals(result["duals"])
+        return result["objective"]
+
+    def query(self, theta, phi, max_gap=None):
+        """
+        Optimal cost at (theta, phi): from the bounds when their relative gap is at most max_gap,
+        otherwise from a solve. Returns value, lower, upper and whether a solve was needed.
+        """
+        max_gap = self.max_gap if max_gap is None else max_gap
+        lower, upper = self.bounds(theta, phi)
+        if np.isfinite(upper) and upper - lower <= max_gap * max(1.0, abs(upper)):
+            return {"value": 0.5 * (lower + upper), "lower": lower, "upper": upper, "solved": False}
+        value = self.solve(theta, phi)
+        return {"value": value, "lower": value, "upper": value, "solved": True}
+
+
+def evaluate_on_grid(data=None, num_training=20, max_gap=DEFAULT_MAX_GAP, seed=0):
+    """
+    Fit the surrogate on num_training random points of the experiment grid, answer every grid point
+    through query() and compare with exact solves. Prints and returns a summary.
+    """
+    from data import data_b, get_experimental_patches
+
+    data = data_b if data is None else data
+    surrogate = ValueSurrogate(grid_parameterization(data), max_gap)
+    points = [(np.array([patch["max_production"]]), np.asarray(patch["storage_costs"], dtype=float))
+              for patch in get_experimental_patches()]
+
+    rng = np.random.default_rng(seed)
+    for k in rng.choice(len(points), size=min(num_training, len(points)), replace=False):
+        surrogate.solve(*points[k])
+    training_solves = surrogate.solves
+
+    # Exact costs for the comparison (not counted as surrogate solves)
+    reference = ValueSurrogate(grid_parameterization(data))
+    exact = np.array([reference.solve(theta, phi) for theta, phi in points])
+
+    start = time.perf_counter()
+    answers = [surrogate.query(theta, phi) for theta, phi in points]
+    query_time = time.perf_counter() - start
+    answered = [answer for answer in answers if not answer["solved"]]
+
+    bound_time = time.perf_counter()
+    for theta, phi in points:
+        surrogate.bounds(theta, phi)
+    bound_time = (time.perf_counter() - bound_time) / len(points)
+
+    values = np.array([answer["value"] for answer in answers])
+    inside = all(answer["lower"] - 1e-6 <= value <= answer["upper"] + 1e-6 for answer, value in zip(answers, exact))
+    summary = {
+        "points": len(points),
+        "training solves": training_solves,
+        "query solves": surrogate.solves - training_solves,
+        "answered from bounds": len(answered),
+        "max relative error": float(np.max(np.abs(values - exact) / np.abs(exact))),
+        "bounds contain exact cost": inside,
+        "bound query [us]": 1e6 * bound_time,
+        "total query time [s]": query_time,
+    }
+    print(pd.Series(summary).to_string())
+    return summary
@@ -0,0 +1,277 @@
+"""
+Distributed sweeps through a work queue on a shared directory.
+
+The sweep directory holds:
+- sweep.json: the scenario grid and shard size, so every worker rebuilds the same scenario list
+- queue.db: SQLite table of shards (pending / running / done) with the owner and its last heartbeat
+- results/shard_<k>.csv: the rows of each finished shard, written with result_writer
+
+Any number of workers on any host that sees the directory run work(); a shard whose owner has not
+sent a heartbeat for stale_after seconds is claimed again by the next free worker. A worker writes
+to its own results/shard_<k>.csv.<worker>.tmp and renames it to the shard file when it finishes,
+in the same transaction that marks the shard done, so two owners never write the same file. A
+worker that cannot refresh its heartbeat (or finds its shard reclaimed) stops.
+"""
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from result_writer import ResultWriter, completed_ids, read_results, read_rows
+
+SPEC_FILE = "sweep.json"
+QUEUE_FILE = "queue.db"
+RESULTS_DIR = "results"
+
+# Seconds between heartbeats and without a heartbeat before a shard counts as abandoned
+HEARTBEAT_INTERVAL = 10
+STALE_AFTER = 60
+
+
+def build_scenarios(spec):
+    """
+    Scenario list of a sweep spec: {"grid": "experimental"} is data.experimental_scenarios, and
+    {"axes": {field: [values, ...]}} is the full factorial grid of patches over data_b
+    (fields as in scenarios.make_patch, e.g. "max_production", "storage_costs", "suppliers.B").
+    """
+    from data import data_b, get_experimental_scenarios
+    from scenarios import make_patch, materialize
+
+    if spec.get("grid") == "experimental":
+        return get_experimental_scenarios()
+
+    fields = list(spec["axes"])
+    return [materialize(data_b, make_patch(dict(zip(fields, values))))
+            for values in itertools.product(*(spec["axes"][field] for field in fields))]
+
+
+def _connect(directory):
+    # Autocommit mode; claims take the write lock explicitly with BEGIN IMMEDIATE
+    connection = sqlite3.connect(os.path.join(directory, QUEUE_FILE), timeout=60, isolation_level=None)
+    connection.execute("PRAGMA busy_timeout = 60000")
+    return connection
+
+
+def create_sweep(directory, spec, shard_size=25):
+    """Write the spec and a queue with one pending shard per shard_size scenarios"""
+    os.makedirs(os.path.join(directory, RESULTS_DIR), exist_ok=True)
+    num_scenarios = len(build_scenarios(spec))
+    with open(os.path.join(directory, SPEC_FILE), "w") as file:
+        json.dump({**spec, "shard_size": shard_size, "num_scenarios": num_scenarios}, file, indent=2)
+
+    connection = _connect(directory)
+    connection.execute("DROP TABLE IF EXISTS shards")
+    connection.execute("""CREATE TABLE shards (
+        id INTEGER PRIMARY KEY, start INTEGER, stop INTEGER, status TEXT,
+        worker TEXT, heartbeat REAL, attempts INTEGER DEFAULT 0)""")
+    connection.executemany(
+        "INSERT INTO shards (id, start, stop, status) VALUES (?, ?, ?, 'pending')",
+        [(k, start, min(start + shard_size, num_scenarios))
+         for k, start in enumerate(range(0, num_scenarios, shard_size))])
+    connection.close()
+    return num_scenarios
+
+
+def _claim(connection, worker, stale_after):
+    """Atomically take a pending shard, or a running one whose owner stopped sending heartbeats"""
+    now = time.time()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        row = connection.execute(
+            "SELECT id, start, stop FROM shards WHERE status = 'pending' "
+            "OR (status = 'running' AND heartbeat < ?) ORDER BY id LIMIT 1", (now - stale_after,)).fetchone()
+        if row is not None:
+            connection.execute(
+                "UPDATE shards SET status = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1 "
+                "WHERE id = ?", (worker, now, row[0]))
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    return row
+
+
+def _heartbeat(directory, shard_id, worker, stop, lost, interval, stale_after):
+    """
+    Refresh the heartbeat of a shard until stop is set (own connection: runs in a thread). Failed
+    updates are retried every interval; lost is set when the shard was reclaimed by another worker
+    or no heartbeat got through for stale_after / 2 seconds.
+    """
+    connection = None
+    last_beat = time.time()
+    while not stop.wait(interval):
+        try:
+            if connection is None:
+                connection = _connect(directory)
+            cursor = connection.execute("UPDATE shards SET heartbeat = ? WHERE id = ? AND worker = ?",
+                                        (time.time(), shard_id, worker))
+            if cursor.rowcount == 0:
+                lost.set()
+                break
+            last_beat = time.time()
+        except sqlite3.Error as error:
+            print(f"[{worker}] heartbeat of shard {shard_id} failed: {error}")
+            if connection is not None:
+                connection.close()
+                connection = None
+            if time.time() - last_beat > stale_after / 2:
+                lost.set()
+                break
+    if connection is not None:
+        connection.close()
+
+
+def shard_path(directory, shard_id):
+    return os.path.join(directory, RESULTS_DIR, f"shard_{shard_id:05d}.csv")
+
+
+def _temp_path(directory, shard_id, worker):
+    return f"{shard_path(directory, shard_id)}.{worker}.tmp"
+
+
+def _start_shard(directory, shard_id, worker):
+    """
+    Temporary file of this worker for a shard, holding the rows that earlier (dead) owners of the
+    shard already wrote to theirs
+    """
+    path = _temp_path(directory, shard_id, worker)
+    with ResultWriter(path, resume=True) as writer:
+        done = completed_ids(path)
+        for other in glob.glob(glob.escape(shard_path(directory, shard_id)) + ".*.tmp"):
+            if other == path:
+                continue
+            for row in read_rows(other):
+                if row["Scenario"] not in done:
+                    done.add(row["Scenario"])
+                    writer.write(row)
+    return path
+
+
+def _finish_shard(connection, directory, shard_id, worker, path):
+    """Rename the temporary file to the shard file and mark the shard done, if this worker still owns it"""
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = connection.execute(
+            "UPDATE shards SET status = 'done', heartbeat = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time(), shard_id, worker))
+        owned = cursor.rowcount == 1
+        if owned:
+            os.replace(path, shard_path(directory, shard_id))
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    if owned:
+        for other in glob.glob(glob.escape(shard_path(directory, shard_id)) + ".*.tmp"):
+            try:
+                os.remove(other)
+            except FileNotFoundError:
+                pass
+    return owned
+
+
+def work(directory, worker=None, heartbeat_interval=HEARTBEAT_INTERVAL, stale_after=STALE_AFTER,
+         reuse_bases=True, poll_interval=2):
+    """
+    Claim and solve shards until every shard is done. Rows of a shard that a dead worker already
+    wrote are kept and only its missing scenarios are solved. Returns the number of shards solved.
+    """
+    from d_test import iter_experiments
+
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    with open(os.path.join(directory, SPEC_FILE)) as file:
+        spec = json.load(file)
+    scenarios = build_scenarios(spec)
+    connection = _connect(directory)
+    solved = 0
+
+    while True:
+        shard = _claim(connection, worker, stale_after)
+        if shard is None:
+            remaining = connection.execute("SELECT COUNT(*) FROM shards WHERE status != 'done'").fetchone()[0]
+            if remaining == 0:
+                break
+            # Other workers still hold shards; wait in case one of them dies
+            time.sleep(poll_interval)
+            continue
+
+        shard_id, start, stop = shard
+        print(f"[{worker}] shard {shard_id}: scenarios {start}-{stop - 1}")
+        stop_heartbeat, lost = threading.Event(), threading.Event()
+        beat = threading.Thread(target=_heartbeat, args=(directory, shard_id, worker, stop_heartbeat, lost,
+                                                         heartbeat_interval, stale_after), daemon=True)
+        beat.start()
+        try:
+            path = _start_shard(directory, shard_id, worker)
+            rows = iter_experiments(scenarios[start:stop], reuse_bases, completed_ids(path))
+            with ResultWriter(path, resume=True) as writer:
+                for row in rows:
+                    if lost.is_set():
+                        break
+                    writer.write(row)
+        finally:
+            stop_heartbeat.set()
+            beat.join()
+
+        if lost.is_set():
+            # Another worker may own the shard by now; its rows so far stay in the temporary file
+            print(f"[{worker}] lost shard {shard_id} (heartbeat failed or shard reclaimed), stopping")
+            break
+        # Only the current owner may finish the shard (it may have been reclaimed meanwhile)
+        if _finish_shard(connection, directory, shard_id, worker, path):
+            solved += 1
+        else:
+            print(f"[{worker}] shard {shard_id} was reclaimed by another worker, result discarded")
+
+    connection.close()
+    return solved
+
+
+def status(directory):
+    """Number of shards per status"""
+    connection = _connect(directory)
+    counts = dict(connection.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall())
+    connection.close()
+    return counts
+
+
+def merge_results(directory, output=None):
+    """Concatenate the shard files in scenario order (one row per scenario id) and optionally save them"""
+    with open(os.path.join(directory, SPEC_FILE)) as file:
+        spec = json.load(file)
+    num_shards = -(-spec["num_scenarios"] // spec["shard_size"])
+    frames = [read_results(shard_path(directory, k)) for k in range(num_shards)]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    results = pd.concat(frames, ignore_index=True)
+    results = results.drop_duplicates(subset="Scenario", keep="first").reset_index(drop=True)
+    if output is not None:
+        if output.endswith(".xlsx"):
+            results.to_excel(output, index=False)
+        else:
+            results.to_csv(output, index=False)
+    return results
+
+
+def _local_worker(directory, kwargs):
+    work(directory, **kwargs)
+
+
+def run_local(directory, num_workers=4, **kwargs):
+    """Run num_workers worker processes on this machine and wait for them (local test of the queue)"""
+    processes = [multiprocessing.Process(target=_local_worker, args=(directory, kwargs))
+                 for _ in range(num_workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return status(directory)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules of the project are flat in pythonProject/ (run as python -m cli from there)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
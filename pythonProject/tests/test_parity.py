@@ -0,0 +1,78 @@
+"""
+Objective parity of the model builds and solver backends on every scenario of data.py.
+
+The expected objectives are those of the original gurobipy models (d_test.create_model and
+model_e.solve_model_with_copper_limit before the template rewrite); None marks an infeasible scenario.
+"""
+import numpy as np
+import pytest
+
+import backends
+import data
+from model_template import build_model_b, build_model_e
+
+EXPECTED = {
+    "data_b": 9646.776415571288,
+    "data_exp": 185.5813953488372,
+    "data_c1": 17148.277996422177,
+    "data_c2": 8489.829222011384,
+    "data_c3": None,
+    "data_c4": None,
+    "data_c5": 8005.889282103135,
+    "data_c6": 9515.34883720931,
+    "data_c7": 185.5813953488372,
+    "data_e": 9646.776415571288,
+    "data_e, copper 0.0": 11067.915542906661,
+    "data_e, copper 0.01": 10984.609586937222,
+    "data_e, copper 0.02": 10514.234828002453,
+    "data_e, copper 0.03": 9646.776415571283,
+    "data_e, copper 0.1": 9646.776415571283,
+}
+
+INSTANCES = backends.parity_instances()
+
+
+def _problem(kind, args):
+    return backends.problem_b(*args) if kind == "model_b" else backends.problem_e(*args)
+
+
+def _assert_expected(name, objective):
+    if EXPECTED[name] is None:
+        assert objective is None
+    else:
+        assert objective == pytest.approx(EXPECTED[name], rel=backends.PARITY_TOLERANCE)
+
+
+def test_every_data_scenario_is_checked():
+    scenarios = [name for name, value in vars(data).items()
+                 if name.startswith("data_") and isinstance(value, dict) and "suppliers" in value]
+    names = {name for name, _, _ in INSTANCES}
+    assert set(scenarios) <= names
+    assert names == set(EXPECTED)
+
+
+@pytest.mark.parametrize("name, kind, args", INSTANCES, ids=[name for name, _, _ in INSTANCES])
+def test_backends_agree(name, kind, args):
+    results = {backend: backends.solve(_problem(kind, args), backend) for backend in ("gurobi", "highs")}
+    assert backends.objectives_agree(kind, results["gurobi"], results["highs"])
+    for result in results.values():
+        _assert_expected(name, result["objective"] if result["optimal"] else None)
+
+
+@pytest.mark.parametrize("name, kind, args", INSTANCES, ids=[name for name, _, _ in INSTANCES])
+def test_gurobi_model_matches_expected(name, kind, args):
+    model, _ = build_model_b(*args) if kind == "model_b" else build_model_e(*args)
+    with model:
+        model.Params.OutputFlag = 0
+        model.optimize()
+        _assert_expected(name, model.ObjVal if model.SolCount else None)
+
+
+def test_presolve_keeps_objective():
+    for name, kind, args in INSTANCES:
+        full = backends.solve(_problem(kind, args), "highs")
+        presolved = backends.solve(backends.problem_b(*args, presolve=True) if kind == "model_b"
+                                   else backends.problem_e(*args, presolve=True), "highs")
+        assert backends.objectives_agree(kind, full, presolved), name
+        if presolved["x"] is not None:
+            assert np.isfinite(presolved["x"]).all()
@@ -0,0 +1,260 @@
+"""
+Hierarchical time aggregation of model_b / model_e for long horizons: solve coarse, then refine.
+
+The coarse model has one period per bucket of consecutive months (e.g. quarters): demand, capacity
+and supplies are summed over the bucket, and the inventory carried from one bucket to the next
+costs the storage cost of every month of the bucket. Summing only relaxes the monthly rows, so the
+coarse model is feasible whenever the monthly one is.
+
+Its inventories at the bucket ends are the boundary conditions of the refinement: every bucket is a
+monthly model of its own, starting from the coarse inventory of the previous bucket (taken off the
+demand of its first month) and ending at the coarse inventory of its own end (fixed bounds on its
+last S). The buckets are independent and are solved in parallel processes; the concatenated plan
+is feasible for the monolithic model and costs the sum of the bucket objectives. A bucket that
+cannot reach its boundary inventories is merged with its neighbour, dropping the boundary between
+them. Most such failures are demand peaks early in a bucket that need more stock than the coarse
+plan carried, so the coarse model also requires the total stock entering each bucket to cover the
+largest excess of cumulative demand over capacity within it (valid for every monthly plan).
+
+Planning latency is the coarse solve (a model of months / bucket periods) plus, for every round of
+refinement (the first one and one per round of merges), its slowest range: the time with one worker
+per range. It grows with the number of merge rounds. For model_b the monolithic LP is small enough
+that HiGHS solves it faster than the hierarchical scheme (about 0.03s against 0.15s at 96 months);
+the scheme pays off for model_e, whose monolithic MILP is slow (4.7s against 2.0s at 96 months).
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from gurobipy import GRB
+
+import backends
+from model_template import compile_template, scenario_vectors
+
+# Months per coarse period (quarters)
+DEFAULT_BUCKET = 3
+
+
+def _per_month(params, months):
+    """Capacity per month and supply per supplier and month"""
+    capacity = np.broadcast_to(np.asarray(params["max_production"], dtype=float), (months,))
+    max_supply = np.asarray(params["max_supply"], dtype=float)
+    supply = max_supply if max_supply.ndim == 2 else np.repeat(max_supply[:, None], months, axis=1)
+    return capacity, supply
+
+
+def buckets(months, size=DEFAULT_BUCKET):
+    """(start, stop) month ranges of the coarse periods; the last one may be shorter"""
+    return [(start, min(start + size, months)) for start in range(0, months, size)]
+
+
+def _problem(params, electrolysis=False):
+    """Matrix problem of template parameters; the horizon is given by the demand"""
+    num_product, months = np.shape(params["demand"])
+    template = compile_template(num_product, len(params["costs"]), months, electrolysis)
+    return backends.matrix_problem(template, scenario_vectors(template, params))
+
+
+def coarse_params(params, ranges):
+    """Template parameters of the aggregated model, one period per (start, stop) range"""
+    months = np.shape(params["demand"])[1]
+    capacity, supply = _per_month(params, months)
+    demand = np.asarray(params["demand"], dtype=float)
+    coarse = {**params,
+              "demand": np.column_stack([demand[:, start:stop].sum(axis=1) for start, stop in ranges]),
+              "max_production": np.array([capacity[start:stop].sum() for start, stop in ranges]),
+              "max_supply": np.column_stack([supply[:, start:stop].sum(axis=1) for start, stop in ranges])}
+    coarse.pop("lb", None)
+    coarse.pop("ub", None)
+    return coarse
+
+
+def peak_stock(params, ranges):
+    """
+    Least total inventory entering every range: the largest excess of cumulative demand over
+    cumulative capacity within the range (0 if production can always keep up)
+    """
+    months = np.shape(params["demand"])[1]
+    capacity, _ = _per_month(params, months)
+    excess = np.asarray(params["demand"], dtype=float).sum(axis=0) - capacity
+    return np.array([max(0.0, np.cumsum(excess[start:stop]).max()) for start, stop in ranges])
+
+
+def coarse_problem(params, ranges, electrolysis=False):
+    """
+    Matrix problem of the aggregated model; inventory costs the storage of every month of its period.
+    Rows sum_i S[i, q-1] >= peak_stock[q] carry the stock the monthly peaks of period q need.
+    """
+    problem = _problem(coarse_params(params, ranges), electrolysis)
+    S = problem["template"]["index"]["S"]
+    problem["c"][S] *= np.array([stop - start for start, stop in ranges], dtype=float)[None, :]
+
+    need = peak_stock(params, ranges)[1:]
+    cut = sp.csr_matrix((np.ones(S[:, :-1].size), (np.broadcast_to(np.arange(len(need)), S[:, :-1].shape).ravel(),
+                                                   S[:, :-1].ravel())), shape=(len(need), problem["A"].shape[1]))
+    problem["A"] = sp.vstack([problem["A"], cut], format="csr")
+    problem["sense"] = np.concatenate([problem["sense"], np.full(len(need), GRB.GREATER_EQUAL)])
+    problem["b"] = np.concatenate([problem["b"], need])
+    return problem
+
+
+def bucket_params(params, start, stop, initial, final):
+    """
+    Monthly template parameters of months start..stop-1, starting with inventory initial and
+    ending with inventory final (per product)
+    """
+    months = np.shape(params["demand"])[1]
+    capacity, supply = _per_month(params, months)
+    demand = np.array(params["demand"], dtype=float)[:, start:stop]
+    demand[:, 0] -= initial
+    bounds = {}
+    for name, default in (("lb", 0.0), ("ub", np.inf)):
+        overrides = {family: np.asarray(array)[..., start:stop] for family, array in (params.get(name) or {}).items()}
+        S = np.array(overrides.get("S", np.full(demand.shape, default)), dtype=float)
+        S[:, -1] = final
+        bounds[name] = {**overrides, "S": S}
+    return {**params, "demand": demand, "max_production": capacity[start:stop],
+            "max_supply": supply[:, start:stop], **bounds}
+
+
+def _solve_bucket(job):
+    """Solve one monthly bucket (runs in a worker process)"""
+    params, electrolysis, backend, policy = job
+    start = time.perf_counter()
+    problem = _problem(params, electrolysis)
+    result = backends.solve(problem, backend, policy)
+    plan = backends.plan_arrays(problem, result["x"]) if result["x"] is not None else None
+    return {"status": result["status"], "optimal": result["optimal"], "objective": result["objective"],
+            "plan": plan, "time": time.perf_counter() - start}
+
+
+def refine(params, inventory, ranges, electrolysis=False, backend="highs", policy=None, executor=None):
+    """
+    Solve every range as a monthly model between the boundary inventories (inventory[:, k] at the end
+    of range k). Infeasible ranges are merged with a neighbour and solved again.
+    Returns the solved ranges ({(start, stop): result}, in month order), the number of merges and the
+    slowest solve time of every round.
+    """
+    num_product = inventory.shape[0]
+    ends = {stop: inventory[:, k] for k, (_, stop) in enumerate(ranges)}
+    ends[0] = np.zeros(num_product)
+    segments = list(ranges)
+    solved, pending, merges, rounds = {}, list(ranges), 0, []
+    while pending:
+        jobs = [(bucket_params(params, start, stop, ends[start], ends[stop]), electrolysis, backend, policy)
+                for start, stop in pending]
+        results = executor.map(_solve_bucket, jobs) if executor is not None else map(_solve_bucket, jobs)
+        results = list(results)
+        solved.update(zip(pending, results))
+        rounds.append(max(result["time"] for result in results))
+        pending = []
+        for segment in [segment for segment in segments if not solved[segment]["optimal"]]:
+            if segment not in segments:
+                continue
+            if len(segments) == 1:
+                return {segment: solved[segment]}, merges, rounds
+            # Merge with the previous range, which can produce the missing stock (the next one for the first range)
+            k = segments.index(segment)
+            first, second = (segments[k - 1], segments[k]) if k > 0 else (segments[k], segments[k + 1])
+            merged = (first[0], second[1])
+            segments[segments.index(first):segments.index(second) + 1] = [merged]
+            pending = [other for other in pending if other not in (first, second)] + [merged]
+            merges += 1
+        for segment in list(solved):
+            if segment not in segments:
+                del solved[segment]
+    return {segment: solved[segment] for segment in segments}, merges, rounds
+
+
+def hierarchical_solve(params, electrolysis=False, bucket=DEFAULT_BUCKET, backend="highs", policy=None, workers=None):
+    """
+    Coarse-then-refine solve of template parameters (model_e if electrolysis). Returns status,
+    objective of the monthly plan, coarse objective, the plan (P, S, X (, B, m) over the whole horizon),
+    the solved month ranges, the number of merges and the times (coarse, refinement wall time, and the
+    refinement latency: the sum over the rounds of their slowest range).
+    """
+    months = np.shape(params["demand"])[1]
+    ranges = buckets(months, bucket)
+
+    start = time.perf_counter()
+    problem = coarse_problem(params, ranges, electrolysis)
+    coarse = backends.solve(problem, backend, policy)
+    coarse_time = time.perf_counter() - start
+    if coarse["x"] is None:
+        return {"status": coarse["status"], "objective": None, "coarse objective": None, "plan": None}
+    inventory = backends.plan_arrays(problem, coarse["x"])["S"]
+
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(ranges))) if workers > 1 and len(ranges) > 1 else None
+    try:
+        segments, merges, rounds = refine(params, inventory, ranges, electrolysis, backend, policy, executor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    refine_time = time.perf_counter() - start
+
+    results = list(segments.values())
+    summary = {"coarse objective": coarse["objective"], "segments": list(segments), "merges": merges,
+               "coarse time": coarse_time, "refine time": refine_time,
+               "refine latency": sum(rounds)}
+    if not all(result["optimal"] for result in results):
+        return {"status": results[0]["status"], "objective": None, "plan": None, **summary}
+
+    plan = {family: np.concatenate([result["plan"][family] for result in results], axis=-1)
+            for family in results[0]["plan"]}
+    return {"status": "OPTIMAL", "objective": sum(result["objective"] for result in results), "plan": plan,
+            **summary}
+
+
+def long_horizon_params(months, base=None, electrolysis=False, seed=0):
+    """Template parameters over months months: the demand of base repeated with +-20% noise per month"""
+    from data import data_b, data_e, get_supplier_data, get_supplier_data_e
+    from model_template import params_b, params_e
+
+    if electrolysis:
+        data = get_supplier_data_e(data_e if base is None else base)
+        params = {**params_e(data[8], data), "big_m": backends.BIG_M}
+    else:
+        params = params_b(get_supplier_data(data_b if base is None else base))
+    base_demand = np.asarray(params["demand"], dtype=float)
+    rng = np.random.default_rng(seed)
+    demand = np.tile(base_demand, (1, -(-months // base_demand.shape[1])))[:, :months]
+    demand = np.round(demand * rng.uniform(0.8, 1.2, size=demand.shape))
+
+    max_production = np.asarray(params["max_production"], dtype=float)
+    max_supply = np.asarray(params["max_supply"], dtype=float)
+    if max_production.ndim:
+        max_production = np.resize(max_production, months)
+    if max_supply.ndim == 2:
+        max_supply = np.tile(max_supply, (1, -(-months // max_supply.shape[1])))[:, :months]
+    return {**params, "demand": demand, "max_production": max_production, "max_supply": max_supply}
+
+
+def compare(horizons=(12, 24, 48, 96), electrolysis=False, bucket=DEFAULT_BUCKET, backend="highs", workers=None,
+            seed=0, full=True):
+    """
+    Hierarchical solves over growing horizons, optionally against the monolithic model.
+    Prints and returns a table of costs, gaps and times.
+    """
+    rows = []
+    for months in horizons:
+        params = long_horizon_params(months, electrolysis=electrolysis, seed=seed)
+        result = hierarchical_solve(params, electrolysis, bucket, backend, workers=workers)
+        row = {"months": months, "hierarchical": result["objective"], "merges": result.get("merges"),
+               "coarse [s]": result.get("coarse time"), "refine [s]": result.get("refine time"),
+               "latency [s]": result.get("coarse time", 0.0) + result.get("refine latency", 0.0)}
+        if full:
+            start = time.perf_counter()
+            reference = backends.solve(_problem(params, electrolysis), backend)
+            row["monolithic"] = reference["objective"]
+            row["monolithic [s]"] = time.perf_counter() - start
+            if reference["optimal"] and result["objective"] is not None:
+                row["gap"] = (result["objective"] - reference["objective"]) / max(1.0, abs(reference["objective"]))
+        rows.append(row)
+    table = pd.DataFrame(rows)
+    print(table.to_string(index=False))
+    return table
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import random
+
+import numpy as np
+
+from solver_env import pinned_params
+
+logger = logging.getLogger(__name__)
+
+# Stored parameter sets: {"<family>/<size class>": {"Method": 1, ...}}. Tuning writes them to
+# STEEL_TUNED_PARAMS, or to the default file below; solves only apply them when STEEL_TUNED_PARAMS
+# is set, since sets tuned on one machine do not carry over to others
+DEFAULT_PARAMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tuned_params.json")
+
+# Size classes by number of variables
+SIZE_CLASSES = [("small", 1_000), ("medium", 100_000), ("large", float("inf"))]
+
+# Values tried per parameter; the MIP-only parameters are not searched for LPs
+SEARCH_SPACE = {
+    "lp": {
+        "Method": [-1, 0, 1, 2],
+        "Presolve": [-1, 0, 1, 2],
+        "Threads": [0, 1],
+    },
+    "mip": {
+        "Method": [-1, 0, 1],
+        "Presolve": [-1, 0, 1, 2],
+        "Threads": [0, 1],
+        "MIPFocus": [0, 1, 2, 3],
+        "Cuts": [-1, 0, 1, 2],
+        "Heuristics": [0.0, 0.05, 0.2],
+    },
+}
+
+# Loaded parameter sets per file: path -> (modification time, parameter sets)
+_cache = {}
+
+
+def params_file():
+    return os.environ.get("STEEL_TUNED_PARAMS") or DEFAULT_PARAMS_FILE
+
+
+def is_enabled():
+    return bool(os.environ.get("STEEL_TUNED_PARAMS"))
+
+
+def model_family(model):
+    """Model family of a built model: 'model_e' (electrolysis MILP) or 'model_b' (blending LP)"""
+    model.update()
+    return "model_e" if model.IsMIP else "model_b"
+
+
+def size_class(model):
+    model.update()
+    for name, limit in SIZE_CLASSES:
+        if model.NumVars < limit:
+            return name
+    return SIZE_CLASSES[-1][0]
+
+
+def tuning_key(model):
+    return f"{model_family(model)}/{size_class(model)}"
+
+
+def load_params(path=None):
+    """All stored parameter sets (re-read only when the file changes)"""
+    path = path or params_file()
+    if not os.path.exists(path):
+        return {}
+    mtime = os.path.getmtime(path)
+    if path not in _cache or _cache[path][0] != mtime:
+        with open(path) as file:
+            _cache[path] = (mtime, json.load(file))
+    return _cache[path][1]
+
+
+def save_params(key, params, path=None):
+    """Store the parameter set of one family/size class, keeping the others"""
+    path = path or params_file()
+    stored = dict(load_params(path))
+    stored[key] = params
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(stored, file, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def apply_tuned_params(model, path=None):
+    """
+    Set the stored parameters of the model's family and size class (nothing if none are stored, or
+    if no path is given and STEEL_TUNED_PARAMS is not set).
+    Parameters pinned with solver_env.pin_params are left as they are.
+    """
+    if path is None and not is_enabled():
+        return None
+    params = load_params(path).get(tuning_key(model))
+    if params:
+        pinned = pinned_params()
+        for name, value in params.items():
+            if name not in pinned:
+                model.setParam(name, value)
+    return params
+
+
+def _defaults(model, names):
+    """Gurobi's default value of every parameter"""
+    return {name: model.getParamInfo(name)[5] for name in names}
+
+
+def _candidates(space, defaults, num_trials, seed):
+    """Gurobi defaults first, then num_trials - 1 distinct random combinations of the search space"""
+    names = list(space)
+    grid_size = int(np.prod([len(space[name]) for name in names]))
+    rng = random.Random(seed)
+    seen = {tuple(defaults[name] for name in names)}
+    candidates = [{}]
+    while len(candidates) < min(num_trials, grid_size):
+        values = tuple(rng.choice(space[name]) for name in names)
+        if values not in seen:
+            seen.add(values)
+            candidates.append(dict(zip(names, values)))
+    return candidates
+
+
+def _solve_time(model, params, repeats):
+    """Total runtime of cold solves of the model with the given parameters, and the objective found"""
+    total = 0.0
+    for _ in range(repeats):
+        model.resetParams()
+        model.setParam("OutputFlag", 0)
+        for name, value in params.items():
+            model.setParam(name, value)
+        model.reset()
+        model.optimize()
+        total += model.Runtime
+    return total, model.ObjVal if model.SolCount else None
+
+
+def _same_objectives(objectives, reference, tolerance):
+    return all((a is None and b is None) or
+               (a is not None and b is not None and abs(a - b) <= tolerance * max(1.0, abs(b)))
+               for a, b in zip(objectives, reference))
+
+
+def tune(models, num_trials=30, repeats=3, seed=0, tolerance=1e-9, min_speedup=0.05):
+    """
+    Random search over SEARCH_SPACE for a list of models of one family and size class.
+    Every candidate solves every model cold; the candidate with the lowest total runtime wins.
+    Candidates that end at a different objective than the defaults on any model (e.g. another
+    solution within the MIP gap) are rejected, so tuning never changes results.
+    The defaults are kept unless the winner is at least min_speedup faster (timing noise on small models).
+    Returns (best parameters, best total runtime, default total runtime).
+    """
+    space = SEARCH_SPACE["mip" if models[0].IsMIP else "lp"]
+    results = []
+    reference = None
+    for params in _candidates(space, _defaults(models[0], space), num_trials, seed):
+        runs = [_solve_time(model, params, repeats) for model in models]
+        total = sum(runtime for runtime, _ in runs)
+        objectives = [objective for _, objective in runs]
+        if reference is None:
+            reference = objectives
+        elif not _same_objectives(objectives, reference, tolerance):
+            logger.info("%s: rejected, objective differs from defaults", params)
+            continue
+        results.append((total, params))
+        logger.info("%s: %.4fs", params or "defaults", total)
+
+    default_time = results[0][0]
+    best_time, best_params = min(results, key=lambda result: result[0])
+    if best_time > (1 - min_speedup) * default_time:
+        best_time, best_params = default_time, {}
+    return best_params, best_time, default_time
+
+
+def sample_instances(family, num_instances=10, seed=0):
+    """Representative models of a family: the data.py cases and a random sample of the generated grids"""
+    rng = random.Random(seed)
+    if family == "model_b":
+        import data
+        from d_test import create_model
+        scenarios = [data.data_b] + [getattr(data, f"data_c{k}") for k in range(1, 8)]
+        grid = data.get_experimental_scenarios()
+        scenarios += rng.sample(grid, min(num_instances, len(grid)))
+        return [create_model(scenario)[0] for scenario in scenarios]
+
+    from model_e import data_e, get_supplier_data_e, build_model
+    from scenarios import make_patch, materialize
+    base = get_supplier_data_e(data_e)
+    instances = [build_model(limit, base)[0] for limit in (0.0, 0.01, 0.03, 0.1)]
+    for _ in range(num_instances):
+        # Copper limits and storage costs around the data_e case
+        variant = get_supplier_data_e(materialize(data_e, make_patch({
+            "storage_costs": np.array(data_e["storage_costs"]) * rng.choice([0.1, 0.5, 1.0, 2.0, 5.0]),
+        })))
+        instances.append(build_model(rng.uniform(0.0, 0.05), variant)[0])
+    return instances
+
+
+def tune_family(family, num_instances=10, num_trials=30, repeats=3, seed=0, path=None):
+    """Tune one family on sampled instances, store the winner per size class and print the speed-up"""
+    models = sample_instances(family, num_instances, seed)
+    by_class = {}
+    for model in models:
+        by_class.setdefault(tuning_key(model), []).append(model)
+
+    stored = {}
+    for key, group in by_class.items():
+        best_params, best_time, default_time = tune(group, num_trials, repeats, seed)
+        save_params(key, best_params, path)
+        stored[key] = best_params
+        print(f"{key}: {len(group)} instances, defaults {default_time:.4f}s, "
+              f"tuned {best_time:.4f}s with {best_params or 'defaults'}")
+
+    for model in models:
+        model.dispose()
+    return stored
@@ -0,0 +1,281 @@
+import hashlib
+import logging
+import os
+import time
+
+import numpy as np
+from gurobipy import GRB
+
+import tuning
+
+logger = logging.getLogger(__name__)
+
+# The store is used when STEEL_WARM_START_DIR is set to a directory (or with enabled=True, in the
+# default directory below)
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "warm_starts")
+
+# Entries not used for MAX_AGE_DAYS are evicted, then the least recently used ones above MAX_SIZE_MB
+MAX_AGE_DAYS = 30
+MAX_SIZE_MB = 256
+
+# Seconds between eviction passes of one process
+EVICT_INTERVAL = 60
+_last_eviction = {}
+
+# In-memory index per model structure: structure key -> (parameter vectors, entry files, directory mtime)
+_index = {}
+
+# Hit statistics for the current process. The time saved by a hit is the mean runtime of the misses
+# of the same structure so far minus the runtime of the hit (hits before any miss are not counted).
+_stats = {"solves": 0, "hits": 0, "time_saved": 0.0, "timed_hits": 0}
+
+# Runtimes of the misses per structure key: [count, total seconds]
+_miss_runtimes = {}
+
+
+def default_store_dir():
+    return os.environ.get("STEEL_WARM_START_DIR") or DEFAULT_STORE_DIR
+
+
+def is_enabled():
+    return bool(os.environ.get("STEEL_WARM_START_DIR"))
+
+
+def parameter_vector(params):
+    """
+    Flatten a data dictionary, data tuple or scalar into one numeric vector.
+    Dictionary values are visited in key order so the same data always gives the same vector.
+    """
+    values = []
+
+    def collect(value):
+        if isinstance(value, dict):
+            for key in sorted(value, key=str):
+                collect(value[key])
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                collect(item)
+        elif isinstance(value, np.ndarray):
+            values.extend(np.asarray(value, dtype=float).ravel().tolist())
+        elif isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            values.append(float(value))
+
+    collect(params)
+    return np.array(values, dtype=float)
+
+
+def structure_key(model):
+    """
+    Key identifying the structure of a model: size, integrality and variable names
+    """
+    model.update()
+    digest = hashlib.sha1()
+    digest.update(f"{model.ModelName}|{model.NumVars}|{model.NumConstrs}|{model.NumIntVars}".encode())
+    for name in model.getAttr("VarName", model.getVars()):
+        digest.update(name.encode())
+    return digest.hexdigest()[:16]
+
+
+def _load_index(store_dir, skey):
+    """
+    Parameter vectors of all stored solutions for one structure. The directory is scanned again
+    when it changed (entries saved or evicted by any process); only new entries are read.
+    """
+    cache_key = (store_dir, skey)
+    directory = os.path.join(store_dir, skey)
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+        mtime = None
+    params, files, indexed_mtime = _index.get(cache_key, ([], [], None))
+    if mtime is not None and mtime != indexed_mtime:
+        known = dict(zip(files, params))
+        params, files = [], []
+        for file_name in sorted(os.listdir(directory)):
+            if not file_name.endswith(".npz") or ".tmp" in file_name:
+                continue
+            path = os.path.join(directory, file_name)
+            if path not in known:
+                try:
+                    with np.load(path) as entry:
+                        known[path] = entry["params"]
+                except (OSError, ValueError, KeyError):
+                    logger.warning("Skipping unreadable warm start entry %s", path)
+                    continue
+            params.append(known[path])
+            files.append(path)
+    _index[cache_key] = (params, files, mtime)
+    return params, files
+
+
+def find_closest(store_dir, skey, params):
+    """
+    Return the path of the stored solution whose parameter vector is closest to params
+    (relative Euclidean distance), together with that distance
+    """
+    stored_params, files = _load_index(store_dir, skey)
+    candidates = [k for k, p in enumerate(stored_params) if p.shape == params.shape]
+    if not candidates:
+        return None, float("inf")
+
+    matrix = np.vstack([stored_params[k] for k in candidates])
+    scale = np.linalg.norm(params) + 1e-12
+    distances = np.linalg.norm(matrix - params, axis=1) / scale
+    best = int(np.argmin(distances))
+    return files[candidates[best]], float(distances[best])
+
+
+def load_warm_start(model, params, store_dir=None, skey=None):
+    """
+    Load the closest stored solution into the model as MIP start or LP basis.
+    Returns the loaded entry (dict) or None if the store has nothing usable.
+    """
+    store_dir = store_dir or default_store_dir()
+    skey = skey or structure_key(model)
+    path, distance = find_closest(store_dir, skey, params)
+    if path is None:
+        return None
+
+    try:
+        with np.load(path) as stored:
+            entry = {key: stored[key] for key in stored.files}
+        os.utime(path)  # mark as recently used for the eviction
+    except (OSError, ValueError):
+        return None  # evicted by another process meanwhile
+    entry["distance"] = distance
+
+    variables = model.getVars()
+    if model.IsMIP:
+        model.setAttr("Start", variables, entry["x"].tolist())
+    elif entry["vbasis"].size == model.NumVars and entry["cbasis"].size == model.NumConstrs:
+        model.setAttr("VBasis", variables, entry["vbasis"].astype(int).tolist())
+        model.setAttr("CBasis", model.getConstrs(), entry["cbasis"].astype(int).tolist())
+    else:
+        return None
+    return entry
+
+
+def save_warm_start(model, params, store_dir=None, skey=None):
+    """
+    Store the current solution (variable values and, for LPs, the basis) keyed by model structure
+    and parameter vector
+    """
+    if model.SolCount == 0:
+        return None
+
+    store_dir = store_dir or default_store_dir()
+    skey = skey or structure_key(model)
+    directory = os.path.join(store_dir, skey)
+    os.makedirs(directory, exist_ok=True)
+
+    variables = model.getVars()
+    x = np.array(model.getAttr("X", variables))
+    if model.IsMIP:
+        vbasis = cbasis = np.empty(0, dtype=np.int8)
+    else:
+        vbasis = np.array(model.getAttr("VBasis", variables), dtype=np.int8)
+        cbasis = np.array(model.getAttr("CBasis", model.getConstrs()), dtype=np.int8)
+
+    path = os.path.join(directory, hashlib.sha1(params.tobytes()).hexdigest()[:16] + ".npz")
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, params=params, x=x, vbasis=vbasis, cbasis=cbasis)
+    os.replace(tmp_path, path)
+    _evict_now_and_then(store_dir)
+    return path
+
+
+def _evict_now_and_then(store_dir):
+    now = time.time()
+    if now - _last_eviction.get(store_dir, 0) >= EVICT_INTERVAL:
+        _last_eviction[store_dir] = now
+        evict(store_dir)
+
+
+def evict(store_dir=None, max_age_days=MAX_AGE_DAYS, max_size_mb=MAX_SIZE_MB):
+    """
+    Remove entries not used for max_age_days, then the least recently used ones until the store
+    is below max_size_mb. Returns the number of removed entries.
+    """
+    store_dir = store_dir or default_store_dir()
+    if not os.path.isdir(store_dir):
+        return 0
+    entries = []
+    for skey in os.listdir(store_dir):
+        directory = os.path.join(store_dir, skey)
+        if not os.path.isdir(directory):
+            continue
+        for file_name in os.listdir(directory):
+            path = os.path.join(directory, file_name)
+            try:
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError:
+                continue  # removed by another process meanwhile
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for used, size, path in entries:
+        if used >= cutoff and total <= max_size_mb * 1024 * 1024:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+
+def optimize(model, params, store_dir=None, enabled=None):
+    """
+    Optimize the model starting from the closest stored solution and store the result afterwards.
+    params can be any data dictionary/tuple describing the instance. The store is only used when
+    enabled (default: when STEEL_WARM_START_DIR is set); otherwise this is a plain optimize().
+    Tuned solver parameters stored for the model's family and size class are applied first.
+    """
+    tuning.apply_tuned_params(model)
+    if not (is_enabled() if enabled is None else enabled):
+        model.optimize()
+        return model
+
+    params = parameter_vector(params)
+    skey = structure_key(model)
+    entry = load_warm_start(model, params, store_dir, skey)
+    model.optimize()
+
+    _stats["solves"] += 1
+    misses = _miss_runtimes.setdefault(skey, [0, 0.0])
+    if entry is not None:
+        _stats["hits"] += 1
+        if misses[0]:
+            cold_runtime = misses[1] / misses[0]
+            _stats["time_saved"] += cold_runtime - model.Runtime
+            _stats["timed_hits"] += 1
+            logger.info("Warm start hit (distance %.4f): %.4fs, mean miss %.4fs",
+                        entry["distance"], model.Runtime, cold_runtime)
+        else:
+            logger.info("Warm start hit (distance %.4f): %.4fs, no miss to compare with",
+                        entry["distance"], model.Runtime)
+    else:
+        misses[0] += 1
+        misses[1] += model.Runtime
+        logger.info("Warm start miss: %.4fs", model.Runtime)
+
+    if model.status == GRB.OPTIMAL:
+        save_warm_start(model, params, store_dir, skey)
+
+    logger.info("Warm start hit rate %.1f%% (%d/%d), time saved %.2fs over %d hits",
+                100.0 * _stats["hits"] / _stats["solves"], _stats["hits"], _stats["solves"],
+                _stats["time_saved"], _stats["timed_hits"])
+    return model
+
+
+def warm_start_stats():
+    """
+    Return hit count, solve count, hit rate and estimated time saved (over timed_hits hits, against
+    the mean miss runtime of the same structure) of the store in this process
+    """
+    stats = dict(_stats)
+    stats["hit_rate"] = stats["hits"] / stats["solves"] if stats["solves"] else 0.0
+    return stats